@@ -16,6 +16,7 @@
 """The types for the api endpoint results."""
 from typing import TypedDict
 
+from app.system.auth import SessionCacheStats
 from app.system.autotag.autotag import TagClusterEntry
 from app.system.deepdive.collection import DocumentObj, SegmentStats
 from app.system.smind.api import QueueStat
@@ -29,6 +30,10 @@ UserResponse = TypedDict('UserResponse', {
 })
 """Provides information about the currently logged in user: the uuid and
 display name."""
+SessionEvictResponse = TypedDict('SessionEvictResponse', {
+    "evicted": int,
+})
+"""The number of sessions removed from the session cache."""
 VersionResponse = TypedDict('VersionResponse', {
     "app_name": str,
     "app_commit": str,
@@ -51,6 +56,7 @@ StatsResponse = TypedDict('StatsResponse', {
     "vecdbs": list[VecDBStat],
     "queues": list[QueueStat],
     "process_queue": ProcessQueueStats,
+    "sessions": SessionCacheStats,
 })
 """Statistics about the current state of the app. """
 URLInspectResponse = TypedDict('URLInspectResponse', {
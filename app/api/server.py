@@ -25,7 +25,12 @@ from collections.abc import Callable
 from typing import Any, cast, TypedDict
 
 from qdrant_client import QdrantClient
-from quick_server import create_server, MiddlewareF, QuickServer
+from quick_server import (
+    create_server,
+    MiddlewareF,
+    PreventDefaultResponse,
+    QuickServer,
+)
 from quick_server import QuickServerRequestHandler as QSRH
 from quick_server import ReqArgs, ReqNext, Response
 from redipy import Redis
@@ -48,6 +53,7 @@ from app.api.response_types import (
     FulltextResponse,
     HeartbeatResponse,
     RequeueResponse,
+    SessionEvictResponse,
     Snippy,
     SnippyResponse,
     StatsResponse,
@@ -60,7 +66,13 @@ from app.api.response_types import (
     UserResponse,
     VersionResponse,
 )
-from app.misc.env import envload_bool, envload_int, envload_path, envload_str
+from app.misc.env import (
+    envload_bool,
+    envload_float,
+    envload_int,
+    envload_path,
+    envload_str,
+)
 from app.misc.util import (
     CHUNK_PADDING,
     CHUNK_SIZE,
@@ -72,7 +84,13 @@ from app.misc.util import (
     to_bool,
 )
 from app.misc.version import get_version
-from app.system.auth import get_session, is_valid_token, SessionInfo
+from app.system.auth import (
+    evict_session,
+    get_session,
+    get_session_cache_stats,
+    is_valid_token,
+    SessionInfo,
+)
 from app.system.autotag.autotag import (
     get_main_ids_for_tag,
     get_tag_cluster_id,
@@ -97,10 +115,10 @@ from app.system.deepdive.collection import (
     segment_stats,
     set_options,
 )
-from app.system.deepdive.diver import maybe_diver_thread
+from app.system.deepdive.diver import maybe_diver_thread, set_diver_inflight
 from app.system.language.langdetect import LangResponse
 from app.system.language.pipeline import extract_language
-from app.system.location.forwardgeo import OpenCageFormat
+from app.system.location.forwardgeo import OpenCageFormat, set_geo_limits
 from app.system.location.pipeline import extract_locations, extract_opencage
 from app.system.location.response import (
     DEFAULT_MAX_REQUESTS,
@@ -113,15 +131,20 @@ from app.system.prep.fulltext import (
     AllDocsFn,
     create_all_docs,
     create_full_text,
+    create_full_texts,
     create_is_remove,
-    create_status_date_type,
+    create_is_removes,
+    create_status_date_types,
     create_tag_fn,
+    create_tags_fn,
     create_url_title,
-    FullTextFn,
-    IsRemoveFn,
-    StatusDateTypeFn,
+    create_url_titles,
+    FullTextsFn,
+    IsRemovesFn,
+    StatusDateTypesFn,
     TagFn,
-    UrlTitleFn,
+    TagsFn,
+    UrlTitlesFn,
 )
 from app.system.prep.snippify import snippify_text
 from app.system.smind.adder import register_adder
@@ -140,6 +163,7 @@ from app.system.smind.search import (
     vec_clear,
     vec_filter,
     vec_search,
+    vec_search_cursor,
 )
 from app.system.smind.vec import (
     build_db_name,
@@ -160,6 +184,7 @@ from app.system.workqueues.queue import (
     maybe_process_thread,
     process_queue_info,
     requeue_errors,
+    set_process_workers,
 )
 
 
@@ -250,11 +275,13 @@ def add_vec_features(
         graph_embed: GraphProfile,
         ner_graphs: dict[LanguageStr, GraphProfile],
         get_all_docs: AllDocsFn,
-        doc_is_remove: IsRemoveFn,
-        get_full_text: FullTextFn,
-        get_url_title: UrlTitleFn,
+        doc_is_removes: IsRemovesFn,
+        get_full_texts: FullTextsFn,
+        get_url_titles: UrlTitlesFn,
         get_tag: TagFn,
-        get_status_date_type: StatusDateTypeFn,
+        get_tags: TagsFn,
+        get_status_date_types: StatusDateTypesFn,
+        precompute_short_snippets: bool,
         maybe_session: MiddlewareF,
         verify_readonly: MiddlewareF,
         verify_input: MiddlewareF,
@@ -278,14 +305,17 @@ def add_vec_features(
         ner_graphs (dict[LanguageStr, GraphProfile]): The NER models for each
             language.
         get_all_docs (AllDocsFn): Function to get all docs.
-        doc_is_remove (IsRemoveFn): Function to check whether a doc exists.
-        get_full_text (FullTextFn): Function to get fulltext of a doc.
-        get_url_title (UrlTitleFn): Function to get url and title of a doc.
+        doc_is_removes (IsRemovesFn): Function to check whether docs exist.
+        get_full_texts (FullTextsFn): Function to get fulltexts of docs.
+        get_url_titles (UrlTitlesFn): Function to get urls and titles of docs.
         get_tag (TagFn): Function to get "tag" of doc (in this case it is
             specifically the country of the lab that published the doc if the
             country is known).
-        get_status_date_type (StatusDateTypeFn): Function to get meta data of
-            a doc.
+        get_tags (TagsFn): Function to get the "tags" of docs.
+        get_status_date_types (StatusDateTypesFn): Function to get meta data
+            of docs.
+        precompute_short_snippets (bool): Whether to compute short snippet
+            embeddings when adding documents.
         maybe_session (MiddlewareF): Middleware to check for an optional
             session cookie.
         verify_readonly (MiddlewareF): Middleware to guarantee that no write
@@ -344,6 +374,7 @@ def add_vec_features(
             set_main_articles(
                 db,
                 vec_db,
+                qdrant_cache=qdrant_cache,
                 articles=articles_main,
                 articles_graph=graph_embed,
                 vec_search_fn=vec_search)
@@ -492,7 +523,15 @@ def add_vec_features(
                         filter.
                     "vecdb": The vector database.
                     "offset": The offset of the returned results. Defaults to
-                        0.
+                        0. Ignored if "cursor" is set.
+                    "cursor": If present, the results are paged via cursors
+                        and the response contains a "cursor" field to
+                        retrieve the next page (`null` if there are no more
+                        results). Use `null` or an empty string to retrieve
+                        the first page. Unlike with "offset", documents
+                        added while paging do not cause results of the
+                        previous page to repeat. Cursors expire after an
+                        hour.
                     "limit": The maximum number of returned results.
                     "hit_limit": The maximum number of hit snippets generated
                         per result. Defaults to 1.
@@ -521,10 +560,31 @@ def add_vec_features(
         short_snippets = bool(args.get("short_snippets", True))
         order_by: MetaKey = "date"  # FIXME: order_by
         articles = get_articles(args.get("vecdb", "main"))
+        if "cursor" in args:
+            cursor = args["cursor"]
+            if cursor is not None and not isinstance(cursor, str):
+                raise PreventDefaultResponse(
+                    400, "cursor must be a string or null")
+            return vec_search_cursor(
+                db,
+                vec_db,
+                input_str,
+                qdrant_cache=qdrant_cache,
+                articles=articles,
+                articles_graph=graph_embed,
+                filters=filters,
+                order_by=order_by,
+                cursor=cursor,
+                limit=limit,
+                hit_limit=hit_limit,
+                score_threshold=score_threshold,
+                short_snippets=short_snippets,
+                no_log=False)
         return vec_search(
             db,
             vec_db,
             input_str,
+            qdrant_cache=qdrant_cache,
             articles=articles,
             articles_graph=graph_embed,
             filters=filters,
@@ -679,11 +739,13 @@ def add_vec_features(
             ner_graphs=ner_graphs,
             get_articles=get_articles,
             get_all_docs=get_all_docs,
-            doc_is_remove=doc_is_remove,
-            get_full_text=get_full_text,
-            get_url_title=get_url_title,
+            doc_is_removes=doc_is_removes,
+            get_full_texts=get_full_texts,
+            get_url_titles=get_url_titles,
             get_tag=get_tag,
-            get_status_date_type=get_status_date_type)
+            get_tags=get_tags,
+            get_status_date_types=get_status_date_types,
+            precompute_short_snippets=precompute_short_snippets)
 
         @server.json_post(f"{prefix}/queue/requeue")
         @server.middleware(verify_write)
@@ -832,7 +894,8 @@ def add_vec_features(
                 doc_id=doc_id,
                 url=url,
                 title=title,
-                meta_obj=meta_obj)
+                meta_obj=meta_obj,
+                precompute_short_snippets=precompute_short_snippets)
 
         @server.json_post(f"{prefix}/build_index")
         @server.middleware(verify_write)
@@ -968,6 +1031,7 @@ def add_vec_features(
                 db,
                 vec_db,
                 input_str,
+                qdrant_cache=qdrant_cache,
                 articles=articles,
                 articles_graph=graph_embed,
                 filters=filters,
@@ -1079,6 +1143,7 @@ def setup(
 
     get_all_docs = create_all_docs(platforms, blogs)
     doc_is_remove = create_is_remove(platforms, blogs)
+    doc_is_removes = create_is_removes(platforms, blogs)
     get_full_text = create_full_text(
         platforms,
         blogs,
@@ -1089,10 +1154,22 @@ def setup(
         blogs,
         get_full_text=get_full_text,
         ignore_unpublished=True)
+    get_full_texts = create_full_texts(
+        platforms,
+        blogs,
+        combine_title=True,
+        ignore_unpublished=True)
+    get_url_titles = create_url_titles(
+        platforms,
+        blogs,
+        get_full_texts=get_full_texts,
+        ignore_unpublished=True)
     get_tag = create_tag_fn(platforms, blogs, ignore_unpublished=True)
-    get_status_date_type = create_status_date_type(
+    get_tags = create_tags_fn(platforms, blogs, ignore_unpublished=True)
+    get_status_date_types = create_status_date_types(
         platforms, blogs, ignore_unpublished=True)
     if graph_llama is not None:
+        set_diver_inflight(envload_int("DIVER_INFLIGHT", default=2))
 
         def _maybe_start_dive() -> None:
             maybe_diver_thread(
@@ -1117,11 +1194,15 @@ def setup(
         "en": load_graph(config, smind, "graph_ner_en.json"),
         "xx": load_graph(config, smind, "graph_ner_xx.json"),
     }
+    set_geo_limits(
+        workers=envload_int("GEOCODE_WORKERS", default=4),
+        rate=envload_float("GEOCODE_RATE", default=1.0))
 
     qdrant_cache = get_redis(
         smind_config, redis_name="rcache", overwrite_prefix="qdrant")
     process_queue_redis = get_redis(
         smind_config, redis_name="rmain", overwrite_prefix="embed_add")
+    set_process_workers(envload_int("PROCESS_WORKERS", default=1))
 
     write_token = config["write_token"]
     tanuki_token = config["tanuki"]  # the nuke key
@@ -1334,11 +1415,14 @@ def setup(
             graph_embed=graph_embed,
             ner_graphs=ner_graphs,
             get_all_docs=get_all_docs,
-            doc_is_remove=doc_is_remove,
-            get_full_text=get_full_text,
-            get_url_title=get_url_title,
+            doc_is_removes=doc_is_removes,
+            get_full_texts=get_full_texts,
+            get_url_titles=get_url_titles,
             get_tag=get_tag,
-            get_status_date_type=get_status_date_type,
+            get_tags=get_tags,
+            get_status_date_types=get_status_date_types,
+            precompute_short_snippets=envload_bool(
+                "PRECOMPUTE_SHORT_SNIPPETS", default=False),
             maybe_session=maybe_session,
             verify_readonly=verify_readonly,
             verify_input=verify_input,
@@ -1464,6 +1548,7 @@ def setup(
             "vecdbs": vecdbs,
             "queues": get_queue_stats(smind),
             "process_queue": process_queue_info(process_queue_redis),
+            "sessions": get_session_cache_stats(),
         }
 
     @server.json_post(f"{prefix}/tags/clusters")
@@ -1595,6 +1680,7 @@ def setup(
             global_db=login_db,
             platforms=platforms,
             process_queue_redis=process_queue_redis,
+            embed_cache=qdrant_cache,
             articles_graph=graph_embed,
             graph_tags=graph_tags,
             get_all_docs=get_all_docs,
@@ -1628,7 +1714,13 @@ def setup(
                         "cluster_args": Arguments provided to the clustering
                             algorithm. By default `distance_threshold` is set
                             so it needs to be set to `null` if you want to
-                            specify `n_clusters`.
+                            specify `n_clusters`. Large tag groups are
+                            clustered in two stages (mini-batch k-means
+                            followed by agglomerative clustering of the
+                            centroids). `method` can be set to
+                            `agglomerative` or `two_stage` to choose the
+                            method explicitly and `coarse_clusters` sets the
+                            number of centroids of the first stage.
                             See https://scikit-learn.org/stable/modules/generated/sklearn.cluster.AgglomerativeClustering.html  # noqa # pylint: disable=line-too-long
                             for an explanation of each argument.
 
@@ -1649,6 +1741,42 @@ def setup(
                 "enqueued": True,
             }
 
+        # *** session ***
+
+        @server.json_post(f"{prefix}/session/evict")
+        @server.middleware(verify_write)
+        def _post_session_evict(
+                _req: QSRH, rargs: ReqArgs) -> SessionEvictResponse:
+            """
+            The `/api/session/evict` endpoint removes a session from the
+            session cache. Sessions are cached for a short time so this
+            endpoint should be called whenever a session changes (e.g., the
+            user logs out or the rights of the user change) to make the
+            change effective immediately.
+
+            @api
+            @token
+            @write_token
+
+            Args:
+                _req (QSRH): The request.
+                rargs (ReqArgs): The arguments.
+                    POST
+                        "session": The value of the session cookie. If `null`
+                            all sessions are removed from the cache.
+
+            Returns:
+                SessionEvictResponse: The number of removed sessions.
+            """
+            args = rargs["post"]
+            session_str = args.get("session")
+            if session_str is not None and not isinstance(session_str, str):
+                raise PreventDefaultResponse(
+                    400, "session must be a string or null")
+            return {
+                "evicted": evict_session(session_str),
+            }
+
         # *** location ***
 
         @server.json_get(f"{prefix}/geoforward")
@@ -1971,6 +2099,21 @@ def setup(
         """
         url_title, error_msg = get_url_title(
             main_id, is_logged_in=is_logged_in)
+        return as_title_response(url_title, error_msg)
+
+    def as_title_response(
+            url_title: tuple[str, str] | None,
+            error_msg: str | None) -> TitleResponse:
+        """
+        Converts a url and title result into a response.
+
+        Args:
+            url_title (tuple[str, str] | None): The url and title or None.
+            error_msg (str | None): The error if any.
+
+        Returns:
+            TitleResponse: Document information if available.
+        """
         if url_title is None:
             return {
                 "url": None,
@@ -2035,8 +2178,9 @@ def setup(
         main_ids: list[str] = args["main_ids"]
         is_logged_in = session is not None
         info: list[TitleResponse] = [
-            get_doc_info(main_id, is_logged_in=is_logged_in)
-            for main_id in main_ids
+            as_title_response(url_title, error_msg)
+            for url_title, error_msg in get_url_titles(
+                main_ids, is_logged_in=is_logged_in)
         ]
         return {
             "info": info,
@@ -55,15 +55,23 @@ EnvStr = Literal[
 """Environment variables representing a string."""
 EnvInt = Literal[
     "BLOGS_DB_PORT",
+    "DIVER_INFLIGHT",
+    "GEOCODE_WORKERS",
     "LOGIN_DB_PORT",
     "PORT",
+    "PROCESS_WORKERS",
     "QDRANT_GRPC_PORT",
     "QDRANT_REST_PORT",
 ]
 """Environment variables representing an integer."""
+EnvFloat = Literal[
+    "GEOCODE_RATE",
+]
+"""Environment variables representing a float."""
 EnvBool = Literal[
     "NO_QDRANT",
     "HAS_LLAMA",
+    "PRECOMPUTE_SHORT_SNIPPETS",
 ]
 """Environment variables representing a boolean value (true, false, 0, 1)."""
 
@@ -122,6 +130,21 @@ def envload_int(key: EnvInt, *, default: int | None = None) -> int:
     return int(_envload(key, f"{default}"))
 
 
+def envload_float(key: EnvFloat, *, default: float | None = None) -> float:
+    """
+    Loads a float environment variable.
+
+    Args:
+        key (EnvFloat): The variable name.
+        default (float | None, optional): The default value. If None, the
+            environment variable is mandatory. Defaults to None.
+
+    Returns:
+        float: The value.
+    """
+    return float(_envload(key, f"{default}"))
+
+
 def envload_bool(key: EnvBool, *, default: bool | None = None) -> bool:
     """
     Loads a boolean environment variable (0, 1, true, false).
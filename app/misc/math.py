@@ -37,13 +37,35 @@ def dot_order_np(
     return list(np.argsort(dots))[::-1]
 
 
+def top_k_np(scores: np.ndarray, count: int) -> np.ndarray:
+    """
+    Computes the indices of the `count` highest scores in descending order.
+    Only the top elements are sorted.
+
+    Args:
+        scores (np.ndarray): The scores (1 dimensional).
+        count (int): The number of indices to return.
+
+    Returns:
+        np.ndarray: Up to `count` indices into the scores array.
+    """
+    if count <= 0:
+        return np.zeros((0,), dtype=np.int64)
+    if count < scores.shape[0]:
+        ixs = np.argpartition(-scores, count - 1)[:count]
+    else:
+        ixs = np.arange(scores.shape[0])
+    return ixs[np.argsort(-scores[ixs], kind="stable")]
+
+
 def dot_order(
         embed: list[float],
         sembeds: list[tuple[tuple[int, str], list[float]]],
         hit_limit: int) -> dict[int, list[str]]:
     """
     Orders a list of text snippets according to their dot proximity of a
-    reference embedding.
+    reference embedding. All candidates are scored with a single matrix
+    multiplication.
 
     Args:
         embed (list[float]): The reference embedding.
@@ -57,24 +79,21 @@ def dot_order(
         dict[int, list[str]]: A mapping of the position in the overall result
             to the ordered list of snippets.
     """
-    mat_ref = np.array([embed])  # 1 x len(embed)
-
-    def dot_hit(group: list[tuple[str, list[float]]]) -> list[str]:
-        cand_embeds = np.array([
-            sembed
-            for (_, sembed) in group
-        ])  # len(group) x len(embed)
-        ixs = dot_order_np(mat_ref, cand_embeds)
-        return [group[ix][0] for ix in ixs[:hit_limit]]
-
-    lookup: dict[int, list[tuple[str, list[float]]]] = {}
-    for ((pos, txt), cur_embed) in sembeds:
-        cur: list[tuple[str, list[float]]] | None = lookup.get(pos)
-        if cur is None:
-            cur = []
-            lookup[pos] = cur
-        cur.append((txt, cur_embed))
-    return {
-        pos: dot_hit(cur_group)
-        for (pos, cur_group) in lookup.items()
-    }
+    if not sembeds:
+        return {}
+    mat_ref = np.asarray(embed, dtype=np.float32)  # len(embed)
+    cand_embeds = np.array([
+        sembed
+        for (_, sembed) in sembeds
+    ], dtype=np.float32)  # len(sembeds) x len(embed)
+    dots = cand_embeds @ mat_ref  # len(sembeds)
+    positions = np.array([pos for ((pos, _), _) in sembeds])
+    order = np.argsort(positions, kind="stable")
+    group_pos, group_starts = np.unique(positions[order], return_index=True)
+    res: dict[int, list[str]] = {}
+    for pos, group in zip(group_pos, np.split(order, group_starts[1:])):
+        res[int(pos)] = [
+            sembeds[group[ix]][0][1]
+            for ix in top_k_np(dots[group], hit_limit)
+        ]
+    return res
@@ -14,6 +14,9 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """Functions for user authentication."""
+import collections
+import threading
+import time
 import uuid
 from typing import TypedDict
 from urllib.parse import unquote
@@ -28,6 +31,12 @@ from app.system.db.db import DBConnector
 
 NOT_A_UUID = ""
 """String that is not a UUID."""
+SESSION_TTL = 60.0
+"""Time in seconds a valid session is cached."""
+SESSION_NEGATIVE_TTL = 10.0
+"""Time in seconds an invalid session is cached."""
+SESSION_CACHE_SIZE = 10000
+"""The maximum number of cached sessions."""
 
 
 def parse_token(config: Config, token: str) -> dict[str, str] | None:
@@ -92,10 +101,92 @@ SessionInfo = TypedDict('SessionInfo', {
 """Session cookie user information."""
 
 
+SessionCacheStats = TypedDict('SessionCacheStats', {
+    "size": int,
+    "hits": int,
+    "negative_hits": int,
+    "misses": int,
+    "evictions": int,
+})
+"""Statistics of the session cache. `hits` counts valid sessions from the
+cache, `negative_hits` counts invalid sessions from the cache, and `evictions`
+counts explicitly removed sessions."""
+
+
+SESSION_LOCK = threading.Lock()
+"""Lock for the session cache."""
+SESSION_CACHE: collections.OrderedDict[
+    str, tuple[float, SessionInfo | None]] = collections.OrderedDict()
+"""Cached sessions by session id. The values are the expiration time and the
+session information or None if the session is invalid."""
+SESSION_STATS: collections.Counter[str] = collections.Counter()
+"""Session cache statistics."""
+
+
+def parse_session_id(session_str: str) -> str:
+    """
+    Parse the session id from a session cookie.
+
+    Args:
+        session_str (str): The session string obtained from the cookie.
+
+    Returns:
+        str: The session id.
+    """
+    session_str = unquote(session_str).removeprefix("s:")
+    eos = session_str.find(".")
+    if eos >= 0:
+        session_str = session_str[:eos]
+    return session_str
+
+
+def evict_session(session_str: str | None) -> int:
+    """
+    Removes a session from the session cache. This should be called when a
+    session changes (e.g., the user logs out or the rights change).
+
+    Args:
+        session_str (str | None): The session string obtained from the cookie
+            or None to clear the full session cache.
+
+    Returns:
+        int: The number of removed sessions.
+    """
+    with SESSION_LOCK:
+        if session_str is None:
+            res = len(SESSION_CACHE)
+            SESSION_CACHE.clear()
+        elif SESSION_CACHE.pop(parse_session_id(session_str), None) is None:
+            res = 0
+        else:
+            res = 1
+        SESSION_STATS["evictions"] += res
+        return res
+
+
+def get_session_cache_stats() -> SessionCacheStats:
+    """
+    Retrieves statistics of the session cache.
+
+    Returns:
+        SessionCacheStats: The statistics.
+    """
+    with SESSION_LOCK:
+        return {
+            "size": len(SESSION_CACHE),
+            "hits": SESSION_STATS["hits"],
+            "negative_hits": SESSION_STATS["negative_hits"],
+            "misses": SESSION_STATS["misses"],
+            "evictions": SESSION_STATS["evictions"],
+        }
+
+
 def get_session(
         platform_db: DBConnector, session_str: str) -> SessionInfo | None:
     """
     Parse a session string from a cookie and retrieve user session information.
+    Results are cached for a short time (see `SESSION_TTL` and
+    `SESSION_NEGATIVE_TTL`).
 
     Args:
         platform_db (DBConnector): The login database connector.
@@ -105,13 +196,46 @@ def get_session(
         SessionInfo | None: The session information or None if the session is
             invalid.
     """
-    session_str = unquote(session_str).removeprefix("s:")
-    eos = session_str.find(".")
-    if eos >= 0:
-        session_str = session_str[:eos]
+    sid = parse_session_id(session_str)
+    now = time.monotonic()
+    with SESSION_LOCK:
+        cached = SESSION_CACHE.get(sid)
+        if cached is not None:
+            expire, info = cached
+            if expire > now:
+                SESSION_CACHE.move_to_end(sid)
+                if info is None:
+                    SESSION_STATS["negative_hits"] += 1
+                else:
+                    SESSION_STATS["hits"] += 1
+                return info
+            SESSION_CACHE.pop(sid, None)
+        SESSION_STATS["misses"] += 1
+    info = read_session(platform_db, sid)
+    ttl = SESSION_TTL if info is not None else SESSION_NEGATIVE_TTL
+    with SESSION_LOCK:
+        SESSION_CACHE[sid] = (time.monotonic() + ttl, info)
+        SESSION_CACHE.move_to_end(sid)
+        while len(SESSION_CACHE) > SESSION_CACHE_SIZE:
+            SESSION_CACHE.popitem(last=False)
+    return info
+
+
+def read_session(platform_db: DBConnector, sid: str) -> SessionInfo | None:
+    """
+    Retrieve user session information from the login database.
+
+    Args:
+        platform_db (DBConnector): The login database connector.
+        sid (str): The session id.
+
+    Returns:
+        SessionInfo | None: The session information or None if the session is
+            invalid.
+    """
     with platform_db.get_session() as session:
         stmt = sa.select(SessionTable.sess)
-        stmt = stmt.where(SessionTable.sid == session_str)
+        stmt = stmt.where(SessionTable.sid == sid)
         obj = session.execute(stmt).scalar_one_or_none()
         if obj is None:
             return None
@@ -453,10 +453,39 @@ def get_tags_for_main_id(
             TagNamesTable.tag_group_to.is_(None),
             TagNamesTable.tag_group_to > tag_group),
         TagNamesTable.keyword == TagClusterMember.keyword,
-        TagClusterMember.tag_cluster == TagCluster.id))
+        TagClusterMember.tag_cluster == TagCluster.id,
+        TagCluster.tag_group == tag_group))
     return {row.name for row in session.execute(stmt)}
 
 
+def get_tags_for_tag_group(
+        session: Session, tag_group: int) -> dict[str, set[str]]:
+    """
+    Retrieve the cluster representatives of all documents of the given tag
+    group with a single query.
+
+    Args:
+        session (Session): The database session.
+        tag_group (int): The tag group.
+
+    Returns:
+        dict[str, set[str]]: Mapping of main id to cluster representatives.
+            Documents without tags are omitted.
+    """
+    stmt = sa.select(TagNamesTable.main_id, TagCluster.name).where(sa.and_(
+        TagNamesTable.tag_group_from <= tag_group,
+        sa.or_(
+            TagNamesTable.tag_group_to.is_(None),
+            TagNamesTable.tag_group_to > tag_group),
+        TagNamesTable.keyword == TagClusterMember.keyword,
+        TagClusterMember.tag_cluster == TagCluster.id,
+        TagCluster.tag_group == tag_group))
+    res: dict[str, set[str]] = {}
+    for row in session.execute(stmt):
+        res.setdefault(row.main_id, set()).add(row.name)
+    return res
+
+
 def get_tag_cluster_id(session: Session, tag_group: int, tag: str) -> int:
     """
     Get the cluster id for the given cluster representative.
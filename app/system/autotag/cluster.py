@@ -19,8 +19,12 @@ from typing import Literal, Protocol, TypedDict
 
 import numpy as np
 from redipy import Redis
+from scattermind.system.base import TaskId
 from scattermind.system.torch_util import tensor_to_str
-from sklearn.cluster import AgglomerativeClustering  # type: ignore
+from sklearn.cluster import (  # type: ignore
+    AgglomerativeClustering,
+    MiniBatchKMeans,
+)
 from sklearn.preprocessing import normalize  # type: ignore
 
 from app.misc.math import dot_order_np
@@ -42,7 +46,7 @@ from app.system.autotag.autotag import (
     get_keywords,
     get_tag_group,
     get_tag_group_cluster_args,
-    get_tags_for_main_id,
+    get_tags_for_tag_group,
     is_ready,
     is_updating_tag_group,
     remove_tag_member,
@@ -52,7 +56,8 @@ from app.system.autotag.platform import fill_in_everything, process_main_ids
 from app.system.db.db import DBConnector
 from app.system.prep.fulltext import AllDocsFn, FullTextFn, IsRemoveFn
 from app.system.prep.snippify import snippify_text
-from app.system.smind.api import get_text_results_immediate, GraphProfile
+from app.system.smind.api import GraphProfile
+from app.system.smind.cache import cached_embeds
 from app.system.workqueues.queue import ProcessEnqueue, register_process_queue
 
 
@@ -114,6 +119,17 @@ BATCH_SIZE = 20
 """How many documents to auto-tag in one step."""
 TOP_K = 10
 """How many raw keywords to generate per document."""
+KEYWORD_BATCH = 1000
+"""How many keywords to embed in one step."""
+CLUSTER_DIRECT_MAX = 5000
+"""The maximum number of keywords for which agglomerative clustering is
+performed directly. Larger tag groups are clustered in two stages."""
+CLUSTER_COARSE_SIZE = 50
+"""The average number of keywords per coarse cluster in the first stage of a
+two stage clustering."""
+CLUSTER_COARSE_MAX = 2000
+"""The maximum number of coarse clusters in the first stage of a two stage
+clustering. This bounds the memory of the agglomerative second stage."""
 
 
 def register_tagger(
@@ -122,6 +138,7 @@ def register_tagger(
         global_db: DBConnector,
         platforms: dict[str, DBConnector],
         process_queue_redis: Redis,
+        embed_cache: Redis,
         articles_graph: GraphProfile,
         graph_tags: GraphProfile,
         get_all_docs: AllDocsFn,
@@ -135,6 +152,7 @@ def register_tagger(
         global_db (DBConnector): The login database connector.
         platforms (dict[str, DBConnector]): The platform database connectors.
         process_queue_redis (Redis): The processing queue redis.
+        embed_cache (Redis): The cache for keyword embeddings.
         articles_graph (GraphProfile): Model to create document embeddings.
         graph_tags (GraphProfile): Model to create document keywords.
         get_all_docs (AllDocsFn): Retrieves all documents (as main ids) for
@@ -220,6 +238,7 @@ def register_tagger(
                 db,
                 entry["tag_group"],
                 process_queue_redis=process_queue_redis,
+                embed_cache=embed_cache,
                 articles_graph=articles_graph,
                 process_enqueue=process_enqueue)
         if entry["stage"] == "platform":
@@ -235,7 +254,9 @@ def register_tagger(
         "tagger",
         tagger_payload_to_json,
         tagger_payload_from_json,
-        tagger_compute)
+        tagger_compute,
+        max_workers=1,
+        exclusive=True)
 
     def tagger_processor(
             *,
@@ -277,62 +298,96 @@ def tag_doc(
     Returns:
         tuple[set[str] | None, str | None]: Set of keywords or error.
     """
-    full_text, error_ft = get_full_text(main_id)
-    if full_text is None:
-        return None, error_ft
+    return tag_docs(
+        [main_id],
+        graph_tags=graph_tags,
+        get_full_text=get_full_text,
+        top_k=top_k)[main_id]
+
+
+def tag_docs(
+        main_ids: list[str],
+        *,
+        graph_tags: GraphProfile,
+        get_full_text: FullTextFn,
+        top_k: int) -> dict[str, tuple[set[str] | None, str | None]]:
+    """
+    Creates auto-tags for multiple documents. The snippets of all documents
+    are sent to the model together so they can be processed in batches.
+
+    Args:
+        main_ids (list[str]): The document main ids.
+        graph_tags (GraphProfile): Model for extracting document keywords.
+        get_full_text (FullTextFn): Retrieve the full text of a document via
+            main id.
+        top_k (int): How many keywords to generate per document.
+
+    Returns:
+        dict[str, tuple[set[str] | None, str | None]]: Set of keywords or error
+            for each main id.
+    """
     smind = graph_tags.get_api()
     ns = graph_tags.get_ns()
     input_field = only(graph_tags.get_input_fields())
-    success = True
-    error_msg = ""
-    kwords: collections.defaultdict[str, float] = \
-        collections.defaultdict(lambda: 0.0)
-    for (snippet, _) in snippify_text(
-            full_text,
-            chunk_size=CHUNK_SIZE,
-            chunk_padding=CHUNK_PADDING):
-        if not success:
-            break
-        tasks = [
-            smind.enqueue_task(
+    res: dict[str, tuple[set[str] | None, str | None]] = {}
+    errors: dict[str, str] = {}
+    kwords: dict[str, collections.defaultdict[str, float]] = {}
+    lookup: dict[TaskId, str] = {}
+    for main_id in main_ids:
+        if main_id in res or main_id in kwords:
+            continue
+        full_text, error_ft = get_full_text(main_id)
+        if full_text is None:
+            res[main_id] = (None, error_ft)
+            continue
+        kwords[main_id] = collections.defaultdict(lambda: 0.0)
+        for (snippet, _) in snippify_text(
+                full_text,
+                chunk_size=CHUNK_SIZE,
+                chunk_padding=CHUNK_PADDING):
+            task_id = smind.enqueue_task(
                 ns,
                 {
-                    input_field: text,
+                    input_field: snippet,
                 })
-            for text in [snippet]
-        ]
-        for tid, resp in smind.wait_for(tasks, timeout=300, auto_clear=True):
-            if resp["error"] is not None:
-                error = resp["error"]
-                error_msg = (
-                    f"{error_msg}\n{error['code']} ({error['ctx']}): "
-                    f"{error['message']}\n{NL.join(error['traceback'])}")
-                success = False
-                continue
-            result = resp["result"]
-            if result is None:
-                error_msg = f"{error_msg}\nmissing result for {tid}"
-                success = False
-                continue
-            keywords = tensor_to_str(result["tags"]).strip().split(",")
-            if not keywords or (len(keywords) == 1 and not keywords[0]):
-                continue
-            scores = list(result["scores"].cpu().tolist())
-            if len(keywords) != len(scores):
-                error_msg = (
-                    f"{error_msg}\nkeywords and scores mismatch: "
-                    f"{keywords=} {scores=}")
-                success = False
-                continue
-            for keyword, score in zip(keywords, scores):
-                kwords[keyword] += score
-    if not success:
-        return None, error_msg
-    top_kwords = sorted(
-        kwords.items(),
-        key=lambda wordscore: wordscore[1],
-        reverse=True)[:top_k]
-    return {kword for (kword, _) in top_kwords}, None
+            lookup[task_id] = main_id
+    tasks = list(lookup.keys())
+    for tid, resp in smind.wait_for(tasks, timeout=300, auto_clear=True):
+        main_id = lookup[tid]
+        error_msg = errors.get(main_id, "")
+        if resp["error"] is not None:
+            error = resp["error"]
+            errors[main_id] = (
+                f"{error_msg}\n{error['code']} ({error['ctx']}): "
+                f"{error['message']}\n{NL.join(error['traceback'])}")
+            continue
+        result = resp["result"]
+        if result is None:
+            errors[main_id] = f"{error_msg}\nmissing result for {tid}"
+            continue
+        keywords = tensor_to_str(result["tags"]).strip().split(",")
+        if not keywords or (len(keywords) == 1 and not keywords[0]):
+            continue
+        scores = list(result["scores"].cpu().tolist())
+        if len(keywords) != len(scores):
+            errors[main_id] = (
+                f"{error_msg}\nkeywords and scores mismatch: "
+                f"{keywords=} {scores=}")
+            continue
+        doc_kwords = kwords[main_id]
+        for keyword, score in zip(keywords, scores):
+            doc_kwords[keyword] += score
+    for main_id, doc_kwords in kwords.items():
+        doc_error = errors.get(main_id)
+        if doc_error is not None:
+            res[main_id] = (None, doc_error)
+            continue
+        top_kwords = sorted(
+            doc_kwords.items(),
+            key=lambda wordscore: wordscore[1],
+            reverse=True)[:top_k]
+        res[main_id] = ({kword for (kword, _) in top_kwords}, None)
+    return res
 
 
 def tagger_init(
@@ -436,6 +491,7 @@ def tagger_tag(
     with db.get_session() as session:
         processing_count = 0
         tag_groups: set[int] = set()
+        pending: list[tuple[str, int]] = []
         for elem in list(get_incomplete(session)):
             main_id = elem["main_id"]
             tag_group = elem["tag_group"]
@@ -446,11 +502,16 @@ def tagger_tag(
             if is_remove:
                 remove_tag_member(session, tag_group, main_id)
                 continue
-            keywords, error = tag_doc(
-                main_id,
-                graph_tags=graph_tags,
-                get_full_text=get_full_text,
-                top_k=TOP_K)
+            pending.append((main_id, tag_group))
+            if len(pending) >= batch_size:
+                break
+        doc_keywords = tag_docs(
+            [main_id for (main_id, _) in pending],
+            graph_tags=graph_tags,
+            get_full_text=get_full_text,
+            top_k=TOP_K)
+        for main_id, tag_group in pending:
+            keywords, error = doc_keywords[main_id]
             if keywords is None:
                 errors.append(
                     "error while processing "
@@ -464,8 +525,6 @@ def tagger_tag(
                     list(keywords))
             tag_groups.add(tag_group)
             processing_count += 1
-            if processing_count >= batch_size:
-                break
         if processing_count > 0:
             process_enqueue(
                 process_queue_redis,
@@ -486,11 +545,114 @@ def tagger_tag(
     return f"finished {processing_count}"
 
 
+def get_keyword_embeds(
+        embed_cache: Redis,
+        keywords: list[str],
+        *,
+        graph_profile: GraphProfile,
+        ) -> tuple[list[str], np.ndarray]:
+    """
+    Computes the normalized embeddings of keywords. Keywords are embedded in
+    large batches and the embeddings are cached in redis so they can be
+    reused across tag groups. The in-process cache is skipped as the keywords
+    would only evict the embeddings of recent queries.
+
+    Args:
+        embed_cache (Redis): The embedding cache.
+        keywords (list[str]): The keywords.
+        graph_profile (GraphProfile): The embedding model.
+
+    Returns:
+        tuple[list[str], np.ndarray]: The keywords that could be embedded and
+            their normalized embeddings (keywords x dim).
+    """
+    final_kw: list[str] = []
+    embeds: list[list[float]] = []
+    for ix in range(0, len(keywords), KEYWORD_BATCH):
+        batch = keywords[ix:ix + KEYWORD_BATCH]
+        batch_embeds = cached_embeds(
+            embed_cache, batch, graph_profile=graph_profile, use_lru=False)
+        for keyword, embed in zip(batch, batch_embeds):
+            if embed is None:
+                continue
+            final_kw.append(keyword)
+            embeds.append(embed)
+    return final_kw, normalize(np.array(embeds, dtype=np.float32))
+
+
+def cluster_embeds(embeds: np.ndarray, cluster_args: dict) -> list[list[int]]:
+    """
+    Clusters normalized embeddings. Small inputs are clustered directly via
+    agglomerative clustering. For large inputs the embeddings are first
+    grouped into coarse clusters via mini-batch k-means and the coarse
+    centroids are then clustered via agglomerative clustering. This keeps the
+    memory bounded regardless of the number of embeddings.
+
+    Args:
+        embeds (np.ndarray): The normalized embeddings (rows x dim).
+        cluster_args (dict): Arguments for the agglomerative clustering.
+            `method` can be set to `agglomerative` or `two_stage` to force
+            the clustering method. `coarse_clusters` sets the number of coarse
+            clusters for the two stage clustering.
+
+    Returns:
+        list[list[int]]: The row indices of each cluster.
+    """
+    kwargs = {
+        "n_clusters": None,
+        "distance_threshold": 0.75,
+        "metric": "cosine",
+        "linkage": "average",
+        **cluster_args,
+    }
+    method = kwargs.pop("method", None)
+    coarse_clusters = kwargs.pop("coarse_clusters", None)
+    rows = embeds.shape[0]
+    if method is None:
+        method = (
+            "agglomerative" if rows <= CLUSTER_DIRECT_MAX else "two_stage")
+    if coarse_clusters is None:
+        coarse_clusters = min(
+            CLUSTER_COARSE_MAX, max(2, rows // CLUSTER_COARSE_SIZE))
+    if kwargs["n_clusters"] is not None:
+        coarse_clusters = max(coarse_clusters, kwargs["n_clusters"])
+    if method == "two_stage" and coarse_clusters < rows:
+        kmeans = MiniBatchKMeans(
+            n_clusters=coarse_clusters,
+            batch_size=4096,
+            n_init=1,
+            random_state=0)
+        coarse_labels = kmeans.fit_predict(embeds)
+        used, coarse_labels = np.unique(coarse_labels, return_inverse=True)
+        if len(used) < 2:
+            # NOTE: agglomerative clustering needs at least two samples so
+            # if k-means collapsed everything into one coarse cluster we
+            # return it as is
+            labels = np.zeros(rows, dtype=np.int64)
+        else:
+            centroids = normalize(kmeans.cluster_centers_[used])
+            cmodel = AgglomerativeClustering(**kwargs)
+            cmodel.fit(centroids)
+            labels = cmodel.labels_[coarse_labels]
+    elif method in ("agglomerative", "two_stage"):
+        cmodel = AgglomerativeClustering(**kwargs)
+        cmodel.fit(embeds)
+        labels = cmodel.labels_
+    else:
+        raise ValueError(f"unknown clustering {method=}")
+    ckwords: collections.defaultdict[int, list[int]] = \
+        collections.defaultdict(list)
+    for kw_ix, cluster_id in enumerate(labels):
+        ckwords[int(cluster_id)].append(kw_ix)
+    return list(ckwords.values())
+
+
 def tagger_cluster(
         db: DBConnector,
         tag_group: int,
         *,
         process_queue_redis: Redis,
+        embed_cache: Redis,
         articles_graph: GraphProfile,
         process_enqueue: ProcessEnqueue[TaggerPayload]) -> str:
     """
@@ -500,6 +662,7 @@ def tagger_cluster(
         db (DBConnector): The database connector.
         tag_group (int): The tag group.
         process_queue_redis (Redis): The processing queue redis.
+        embed_cache (Redis): The cache for keyword embeddings.
         articles_graph (GraphProfile): Model for document embeddings.
         process_enqueue (ProcessEnqueue[TaggerPayload]): Enqueues the next
             step.
@@ -512,40 +675,10 @@ def tagger_cluster(
         with db.get_session() as session:
             keywords = sorted(get_keywords(session, tag_group))
             cluster_args = get_tag_group_cluster_args(session, tag_group)
-        all_embeds: list[list[float] | None] = []
-        for keyword in keywords:
-            cur_embeds = get_text_results_immediate(
-                [keyword],
-                graph_profile=articles_graph,
-                output_sample=[1.0])
-            all_embeds.extend(cur_embeds)
-        final_kw: list[str] = []
-        embeds: list[list[float]] = []
-        for keyword, embed in zip(keywords, all_embeds):
-            if embed is None:
-                continue
-            final_kw.append(keyword)
-            embeds.append(embed)
-        final_embeds = normalize(embeds)
+        final_kw, final_embeds = get_keyword_embeds(
+            embed_cache, keywords, graph_profile=articles_graph)
         return final_kw, final_embeds, cluster_args
 
-    def do_cluster(embeds: np.ndarray, cluster_args: dict) -> list[list[int]]:
-        kwargs = {
-            "n_clusters": None,
-            "distance_threshold": 0.75,
-            "metric": "cosine",
-            "linkage": "average",
-            **cluster_args,
-        }
-        cmodel = AgglomerativeClustering(**kwargs)
-        cmodel.fit(embeds)
-        labels = cmodel.labels_
-        ckwords: collections.defaultdict[str, list[int]] = \
-            collections.defaultdict(list)
-        for kw_ix, cluster_id in enumerate(labels):
-            ckwords[cluster_id].append(kw_ix)
-        return list(ckwords.values())
-
     def centroid(all_embeds: np.ndarray, cluster: list[int]) -> int:
         cembeds = all_embeds[cluster, :]  # len(cluster) x dim
         cvec = normalize(cembeds.sum(axis=0).reshape((1, -1)))  # 1 x dim
@@ -553,7 +686,7 @@ def tagger_cluster(
         return cluster[ixs[0]]
 
     kws, kwembeds, cluster_args = get_embeds()
-    clusters = do_cluster(kwembeds, cluster_args)
+    clusters = cluster_embeds(kwembeds, cluster_args)
     representatives: list[int] = [
         centroid(kwembeds, cluster)
         for cluster in clusters
@@ -611,15 +744,19 @@ def tagger_update_platform(
         all_main_ids.extend(get_all_docs(base))
 
     with db.get_session() as session:
-        def get_main_id_keywords(main_id: str) -> set[str]:
-            return get_tags_for_main_id(session, tag_group, main_id)
+        tags = get_tags_for_tag_group(session, tag_group)
+
+    def get_main_id_keywords(main_id: str) -> set[str]:
+        return tags.get(main_id, set())
 
-        all_tags, kwords = process_main_ids(
-            all_main_ids,
-            platforms=all_platforms,
-            get_keywords=get_main_id_keywords)
+    all_tags, kwords = process_main_ids(
+        all_main_ids,
+        platforms=all_platforms,
+        get_keywords=get_main_id_keywords)
 
-    fill_in_everything(global_db, platforms, all_tags=all_tags, kwords=kwords)
+    inserts, deletes = fill_in_everything(
+        global_db, platforms, all_tags=all_tags, kwords=kwords)
     return (
         f"updated all platforms ({all_platforms}) with tag group {tag_group}: "
-        f"main_ids={len(all_main_ids)} all_tags={len(all_tags)}")
+        f"main_ids={len(all_main_ids)} all_tags={len(all_tags)} "
+        f"{inserts=} {deletes=}")
@@ -26,81 +26,150 @@ from app.system.prep.fulltext import get_base_doc
 
 TAG_AI_TYPE = "auto_thematic"
 """The tag type used for auto tags."""
+SYNC_BATCH = 1000
+"""The number of rows to insert or delete in one statement when syncing
+tags."""
 
 
-def clear_global_tags(session: Session) -> None:
+def get_tag_key(keyword: str) -> str:
     """
-    Clears all auto tags from the login tag table.
+    Computes the key of a tag. Tag names in the login tag table are case
+    insensitive.
 
     Args:
-        session (Session): The login database session.
-    """
-    stmt = sa.delete(GlobalTagsTable).where(
-        GlobalTagsTable.type == TAG_AI_TYPE)
-    session.execute(stmt)
-
+        keyword (str): The tag.
 
-def clear_platform_tags(session: Session) -> None:
-    """
-    Clears all auto tags from a platform tagging table.
-
-    Args:
-        session (Session): The platform database session.
+    Returns:
+        str: The key.
     """
-    stmt = sa.delete(PlatformTaggingTable).where(
-        PlatformTaggingTable.type == TAG_AI_TYPE)
-    session.execute(stmt)
+    return keyword.lower()
 
 
-def fill_global_tags(session: Session, all_tags: set[str]) -> dict[str, int]:
+def sync_global_tags(
+        session: Session,
+        all_tags: set[str]) -> tuple[dict[str, int], set[int]]:
     """
-    Fills the login tag table with all tags and returns the tag id mapping.
+    Adds missing tags to the login tag table and returns the tag id mapping.
+    Existing tags are kept.
 
     Args:
         session (Session): The login database session.
         all_tags (set[str]): All tags.
 
+    Raises:
+        ValueError: If a tag could not be added.
+
     Returns:
-        dict[str, int]: A mapping from tag to tag id.
+        tuple[dict[str, int], set[int]]: A mapping from tag to tag id and the
+            ids of auto tags that are not used anymore. Use
+            `remove_global_tags` to remove them once no platform references
+            them anymore.
     """
+    stmt = sa.select(GlobalTagsTable.id, GlobalTagsTable.name).where(
+        GlobalTagsTable.type == TAG_AI_TYPE)
+    existing: dict[str, int] = {
+        get_tag_key(f"{row.name}"): int(row.id)
+        for row in session.execute(stmt)
+    }
+    missing: dict[str, str] = {}
+    for keyword in sorted(all_tags):
+        key = get_tag_key(keyword)
+        if key not in existing:
+            missing.setdefault(key, keyword)
+    missing_tags = list(missing.values())
+    for ix in range(0, len(missing_tags), SYNC_BATCH):
+        ins_stmt = sa.insert(GlobalTagsTable).values([
+            {
+                "name": keyword,
+                "contributor": None,
+                "language": "en",  # FIXME be smarter than this
+                "label": None,
+                "type": TAG_AI_TYPE,
+                "key": None,
+                "description": None,
+            }
+            for keyword in missing_tags[ix:ix + SYNC_BATCH]
+        ])
+        ins_stmt = ins_stmt.returning(GlobalTagsTable.id, GlobalTagsTable.name)
+        for row in session.execute(ins_stmt):
+            existing[get_tag_key(f"{row.name}")] = int(row.id)
     res: dict[str, int] = {}
     for keyword in all_tags:
-        stmt = sa.insert(GlobalTagsTable).values(
-            name=keyword,
-            contributor=None,
-            language="en",  # FIXME be smarter than this
-            label=None,
-            type=TAG_AI_TYPE,
-            key=None,
-            description=None)
-        stmt = stmt.returning(GlobalTagsTable.id)
-        row_id = session.execute(stmt).scalar()
+        row_id = existing.get(get_tag_key(keyword))
         if row_id is None:
             raise ValueError(f"error adding {keyword=} to global tag table")
-        res[keyword] = int(row_id)
-    return res
+        res[keyword] = row_id
+    keep = set(res.values())
+    stale = {row_id for row_id in existing.values() if row_id not in keep}
+    return res, stale
 
 
-def add_pad_tags(
+def remove_global_tags(session: Session, tag_ids: set[int]) -> None:
+    """
+    Removes auto tags from the login tag table.
+
+    Args:
+        session (Session): The login database session.
+        tag_ids (set[int]): The tag ids to remove.
+    """
+    ids = sorted(tag_ids)
+    for ix in range(0, len(ids), SYNC_BATCH):
+        stmt = sa.delete(GlobalTagsTable).where(sa.and_(
+            GlobalTagsTable.type == TAG_AI_TYPE,
+            GlobalTagsTable.id.in_(ids[ix:ix + SYNC_BATCH])))
+        session.execute(stmt)
+
+
+def sync_platform_tags(
         session: Session,
-        pad_id: int,
-        keywords: set[str],
-        lookup: dict[str, int]) -> None:
+        kws: dict[int, set[str]],
+        lookup: dict[str, int]) -> tuple[int, int]:
     """
-    Adds tags to the platform tagging table for a given pad.
+    Updates the auto tags of a platform tagging table to match the given
+    tags. Only the differences to the current state are written.
 
     Args:
         session (Session): The platform database session.
-        pad_id (int): The pad id.
-        keywords (set[str]): The tags to add.
+        kws (dict[int, set[str]]): Mapping of pad id to tag set.
         lookup (dict[str, int]): The tag id lookup.
+
+    Returns:
+        tuple[int, int]: The number of inserted and deleted rows.
     """
-    for keyword in keywords:
-        stmt = sa.insert(PlatformTaggingTable).values(
-            pad=pad_id,
-            tag_id=lookup[keyword],
-            type=TAG_AI_TYPE)
-        session.execute(stmt)
+    target: set[tuple[int, int]] = {
+        (pad_id, lookup[keyword])
+        for pad_id, pad_kws in kws.items()
+        for keyword in pad_kws
+    }
+    stmt = sa.select(
+        PlatformTaggingTable.id,
+        PlatformTaggingTable.pad,
+        PlatformTaggingTable.tag_id).where(
+            PlatformTaggingTable.type == TAG_AI_TYPE)
+    current: dict[tuple[int, int], int] = {
+        (int(row.pad), int(row.tag_id)): int(row.id)
+        for row in session.execute(stmt)
+    }
+    deletes = sorted(
+        row_id
+        for pad_tag, row_id in current.items()
+        if pad_tag not in target)
+    inserts = sorted(pad_tag for pad_tag in target if pad_tag not in current)
+    for ix in range(0, len(deletes), SYNC_BATCH):
+        del_stmt = sa.delete(PlatformTaggingTable).where(
+            PlatformTaggingTable.id.in_(deletes[ix:ix + SYNC_BATCH]))
+        session.execute(del_stmt)
+    for ix in range(0, len(inserts), SYNC_BATCH):
+        ins_stmt = sa.insert(PlatformTaggingTable).values([
+            {
+                "pad": pad_id,
+                "tag_id": tag_id,
+                "type": TAG_AI_TYPE,
+            }
+            for (pad_id, tag_id) in inserts[ix:ix + SYNC_BATCH]
+        ])
+        session.execute(ins_stmt)
+    return len(inserts), len(deletes)
 
 
 def process_main_ids(
@@ -146,9 +215,12 @@ def fill_in_everything(
         *,
         all_tags: set[str],
         kwords: dict[str, dict[int, set[str]]],
-        ) -> None:
+        ) -> tuple[int, int]:
     """
-    Fills in all tags to the login tag table and the platforms' tagging tables.
+    Brings the login tag table and the platforms' tagging tables up to date
+    with the given tags. Only the differences to the current state are
+    written and each platform is updated within a single transaction so the
+    tags stay visible during the update.
 
     Args:
         global_db (DBConnector): The login database connector.
@@ -156,13 +228,22 @@ def fill_in_everything(
         all_tags (set[str]): All tags.
         kwords (dict[str, dict[int, set[str]]]): Mapping from base to pad id to
             tag set.
+
+    Returns:
+        tuple[int, int]: The total number of inserted and deleted rows of the
+            platforms' tagging tables.
     """
     with global_db.get_session() as g_session:
-        clear_global_tags(g_session)
-        lookup = fill_global_tags(g_session, all_tags)
+        lookup, stale = sync_global_tags(g_session, all_tags)
+    total_inserts = 0
+    total_deletes = 0
     for base, p_db in platforms.items():
         kws = kwords.get(base, {})
         with p_db.get_session() as p_session:
-            clear_platform_tags(p_session)
-            for pad_id, pad_kws in kws.items():
-                add_pad_tags(p_session, pad_id, pad_kws, lookup)
+            inserts, deletes = sync_platform_tags(p_session, kws, lookup)
+        total_inserts += inserts
+        total_deletes += deletes
+    if stale:
+        with global_db.get_session() as g_session:
+            remove_global_tags(g_session, stale)
+    return total_inserts, total_deletes
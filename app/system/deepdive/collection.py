@@ -121,6 +121,16 @@ SegmentObj = TypedDict('SegmentObj', {
 """Full segment information."""
 
 
+SegmentResult = TypedDict('SegmentResult', {
+    "seg_id": int,
+    "verify": VerifyResult | None,
+    "deep_dive": DeepDiveResult | None,
+    "error": str | None,
+})
+"""Result of processing a segment. Exactly one of `verify`, `deep_dive`, or
+`error` is set."""
+
+
 SegmentStats = TypedDict('SegmentStats', {
     "deep_dive": int,
     "is_valid": bool | None,
@@ -971,62 +981,54 @@ def get_segments(
         }
 
 
-def set_verify_segment(
-        db: DBConnector,
-        seg_id: int,
-        is_valid: bool,
-        reason: str) -> None:
+def set_segment_results(
+        db: DBConnector, results: list[SegmentResult]) -> None:
     """
-    Sets the verification result of a segment.
+    Sets the results of multiple segments at once.
 
     Args:
         db (DBConnector): The database connector.
-        seg_id (int): The segment id.
-        is_valid (bool): Whether the segment is valid.
-        reason (str): The reason.
+        results (list[SegmentResult]): The results.
     """
+    verifies = []
+    deep_dives = []
+    errors = []
+    for result in results:
+        if result["verify"] is not None:
+            verifies.append({
+                "b_seg_id": result["seg_id"],
+                "b_is_valid": result["verify"]["is_hit"],
+                "b_reason": result["verify"]["reason"],
+            })
+        elif result["deep_dive"] is not None:
+            deep_dives.append({
+                "b_seg_id": result["seg_id"],
+                "b_result": result["deep_dive"],
+            })
+        elif result["error"] is not None:
+            errors.append({
+                "b_seg_id": result["seg_id"],
+                "b_error": result["error"],
+            })
+    table = DeepDiveSegment.__table__
     with db.get_session() as session:
-        stmt = sa.update(DeepDiveSegment)
-        stmt = stmt.where(DeepDiveSegment.id == seg_id)
-        stmt = stmt.values(
-            verify_reason=reason,
-            is_valid=is_valid)
-        session.execute(stmt)
-
-
-def set_deep_dive_segment(
-        db: DBConnector,
-        seg_id: int,
-        deep_dive: DeepDiveResult) -> None:
-    """
-    Sets the category result of a segment.
-
-    Args:
-        db (DBConnector): The database connector.
-        seg_id (int): The segment id.
-        deep_dive (DeepDiveResult): The result.
-    """
-    with db.get_session() as session:
-        stmt = sa.update(DeepDiveSegment)
-        stmt = stmt.where(DeepDiveSegment.id == seg_id)
-        stmt = stmt.values(deep_dive_result=deep_dive)
-        session.execute(stmt)
-
-
-def set_error_segment(db: DBConnector, seg_id: int, error: str) -> None:
-    """
-    Set the error for a segment.
-
-    Args:
-        db (DBConnector): The database connector.
-        seg_id (int): The segment id.
-        error (str): The error.
-    """
-    with db.get_session() as session:
-        stmt = sa.update(DeepDiveSegment)
-        stmt = stmt.where(DeepDiveSegment.id == seg_id)
-        stmt = stmt.values(error=error)
-        session.execute(stmt)
+        if verifies:
+            vstmt = sa.update(table)
+            vstmt = vstmt.where(table.c.id == sa.bindparam("b_seg_id"))
+            vstmt = vstmt.values(
+                verify_reason=sa.bindparam("b_reason"),
+                is_valid=sa.bindparam("b_is_valid"))
+            session.execute(vstmt, verifies)
+        if deep_dives:
+            dstmt = sa.update(table)
+            dstmt = dstmt.where(table.c.id == sa.bindparam("b_seg_id"))
+            dstmt = dstmt.values(deep_dive_result=sa.bindparam("b_result"))
+            session.execute(dstmt, deep_dives)
+        if errors:
+            estmt = sa.update(table)
+            estmt = estmt.where(table.c.id == sa.bindparam("b_seg_id"))
+            estmt = estmt.values(error=sa.bindparam("b_error"))
+            session.execute(estmt, errors)
 
 
 def remove_segments(
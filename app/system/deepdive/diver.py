@@ -14,16 +14,22 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """The LLM powered deep dive queue."""
+import collections
 import json
 import re
 import threading
 import time
 import traceback
-from typing import Literal
+from typing import Literal, TypedDict
 
 from scattermind.api.api import ScattermindAPI
+from scattermind.system.base import TaskId
 from scattermind.system.names import GNamespace
-from scattermind.system.response import TASK_COMPLETE
+from scattermind.system.response import (
+    TASK_COMPLETE,
+    TASK_STATUS_INIT,
+    TASK_STATUS_WAIT,
+)
 from scattermind.system.torch_util import tensor_to_str
 
 from app.misc.util import get_json_error_str, get_time_str, retry_err, to_bool
@@ -38,12 +44,12 @@ from app.system.deepdive.collection import (
     get_deep_dive_prompt_info,
     get_documents_in_queue,
     get_segments_in_queue,
-    set_deep_dive_segment,
+    SegmentObj,
+    SegmentResult,
     set_error,
-    set_error_segment,
+    set_segment_results,
     set_tag,
     set_url_title,
-    set_verify_segment,
     VerifyResult,
 )
 from app.system.prep.clean import normalize_text
@@ -196,6 +202,94 @@ def process_pending(
 
 LLM_TIMEOUT = 300
 """Maximum processing time for the LLM in seconds."""
+DIVER_INFLIGHT = 2
+"""The maximum number of segments that are processed by the LLM at the same
+time."""
+DIVER_MAX_QUEUE = 4
+"""No new segments are sent to the LLM while its queues contain at least this
+many tasks."""
+DIVER_BACKOFF = 5.0
+"""Time in seconds to wait if the LLM queues are full and no segment of the
+diver is being processed."""
+DIVER_WRITE_BATCH = 8
+"""The number of segment results that are written to the database at once."""
+DIVER_WRITE_INTERVAL = 30.0
+"""The maximum time in seconds segment results are held back before they are
+written to the database."""
+DIVER_STATUS_POLL = 5.0
+"""Time in seconds between checks whether queued segments have started
+processing."""
+
+
+SegmentTask = TypedDict('SegmentTask', {
+    "segment": SegmentObj,
+    "prompt_info": DeepDivePromptInfo,
+    "categories": list[str],
+    "is_verify": bool,
+    "started": bool,
+    "deadline": float,
+})
+"""A segment that is being processed by the LLM. The deadline of a segment
+that is still waiting in the LLM queue covers all segments ahead of it. Once
+the LLM starts processing the segment the deadline is reset to
+`LLM_TIMEOUT`."""
+
+
+def set_diver_inflight(inflight: int) -> None:
+    """
+    Sets the maximum number of segments that are processed by the LLM at the
+    same time. The maximum LLM queue length is raised accordingly.
+
+    Args:
+        inflight (int): The number of segments.
+    """
+    global DIVER_INFLIGHT  # pylint: disable=global-statement
+    global DIVER_MAX_QUEUE  # pylint: disable=global-statement
+
+    DIVER_INFLIGHT = max(1, inflight)
+    DIVER_MAX_QUEUE = max(DIVER_MAX_QUEUE, 2 * DIVER_INFLIGHT)
+
+
+def get_llm_queue_length(smind: ScattermindAPI, ns: GNamespace) -> int:
+    """
+    Computes the number of tasks waiting in the LLM queues.
+
+    Args:
+        smind (ScattermindAPI): The scattermind api.
+        ns (GNamespace): The model namespace.
+
+    Returns:
+        int: The number of waiting tasks.
+    """
+    return sum(
+        queue_counts["queue_length"]
+        for queue_counts in smind.get_queue_stats(ns))
+
+
+def update_started(
+        smind: ScattermindAPI, inflight: dict[TaskId, SegmentTask]) -> bool:
+    """
+    Checks whether queued segments have started processing. The deadline of
+    a segment is reset to `LLM_TIMEOUT` when it leaves the queue.
+
+    Args:
+        smind (ScattermindAPI): The scattermind api.
+        inflight (dict[TaskId, SegmentTask]): The segments sent to the LLM.
+
+    Returns:
+        bool: Whether any segment is still waiting in the queue.
+    """
+    is_queued = False
+    for task_id, seg_task in inflight.items():
+        if seg_task["started"]:
+            continue
+        status = smind.get_status(task_id)
+        if status in (TASK_STATUS_INIT, TASK_STATUS_WAIT):
+            is_queued = True
+            continue
+        seg_task["started"] = True
+        seg_task["deadline"] = time.monotonic() + LLM_TIMEOUT
+    return is_queued
 
 
 def process_segments(
@@ -204,7 +298,10 @@ def process_segments(
         graph_llama: GraphProfile,
         ) -> int:
     """
-    Processes pending segments.
+    Processes pending segments. Multiple segments are processed by the LLM at
+    the same time (see `DIVER_INFLIGHT`) and results are handled as they
+    arrive. No new segments are sent to the LLM while its queues are full
+    (see `DIVER_MAX_QUEUE`). Results are written to the database in batches.
 
     Args:
         db (DBConnector): The database connector.
@@ -215,15 +312,9 @@ def process_segments(
         int: The number of processed segments.
     """
     segments = list(retry_err(get_segments_in_queue, db))
+    if not segments:
+        return 0
     ns = graph_llama.get_ns()
-    for queue_counts in smind.get_queue_stats(ns):
-        queue_length = queue_counts["queue_length"]
-        sleep_time = LLM_TIMEOUT // 2 * queue_length
-        if queue_length > 0 and sleep_time > 0:
-            log_diver(
-                "current queue: "
-                f"{queue_counts['name']}={queue_length} sleep={sleep_time}s")
-            time.sleep(sleep_time)
     prompt_ids = {
         prompt_id
         for segment in segments
@@ -231,25 +322,40 @@ def process_segments(
     }
     with db.get_session() as session:
         prompt_infos = get_deep_dive_prompt_info(session, prompt_ids)
+    results: list[SegmentResult] = []
+    last_write = time.monotonic()
+
+    def flush() -> None:
+        nonlocal last_write
+
+        if results:
+            retry_err(set_segment_results, db, list(results))
+            results.clear()
+        last_write = time.monotonic()
+
+    def add_result(result: SegmentResult) -> None:
+        results.append(result)
+        if (
+                len(results) >= DIVER_WRITE_BATCH
+                or time.monotonic() - last_write >= DIVER_WRITE_INTERVAL):
+            flush()
+
+    pending: collections.deque[SegmentTask] = collections.deque()
     for segment in segments:
-        seg_id = segment["id"]
-        main_id = segment["main_id"]
-        page = segment["page"]
-        full_text = segment["content"]
         is_verify = segment["is_valid"] is None
         prompt_id = (
             segment["verify_id"] if is_verify else segment["categories_id"])
-        prompt_info = prompt_infos[prompt_id]
         category_prompt_info = prompt_infos[segment["categories_id"]]
         categories = category_prompt_info["categories"]
         assert categories is not None
         if not is_verify and segment["is_valid"] is False:
-            log_diver(f"processing segment {main_id}@{page}: skip invalid")
-            retry_err(
-                set_deep_dive_segment,
-                db,
-                seg_id,
-                {
+            log_diver(
+                f"processing segment {segment['main_id']}@{segment['page']}: "
+                "skip invalid")
+            add_result({
+                "seg_id": segment["id"],
+                "verify": None,
+                "deep_dive": {
                     "reason": (
                         "Segment did not pass filter! "
                         "No interpretation performed!"),
@@ -257,109 +363,178 @@ def process_segments(
                         cat: 0
                         for cat in categories
                     },
-                })
+                },
+                "error": None,
+            })
             continue
-        log_diver(
-            f"processing segment {main_id}@{page} ({seg_id}): "
-            f"llm ({prompt_info['name']}) size={len(full_text)}")
-        llm_out, llm_error = llm_response(smind, ns, full_text, prompt_info)
-        if llm_out is not None:
-            error_msg = (
-                f"ERROR: could not interpret model output:\n{llm_out}")
-            if is_verify:
-                vres, verror = interpret_verify(llm_out)
-                if vres is None:
-                    verror = (
-                        ""
-                        if verror is None
-                        else f"\nSTACKTRACE: {verror}")
-                    retry_err(
-                        set_error_segment,
-                        db,
-                        seg_id,
-                        f"{error_msg}{verror}")
-                else:
-                    retry_err(
-                        set_verify_segment,
-                        db,
-                        seg_id,
-                        vres["is_hit"],
-                        vres["reason"])
-            else:
-                ddres, derror = interpret_deep_dive(llm_out, categories)
-                if ddres is None:
-                    derror = (
-                        ""
-                        if derror is None
-                        else f"\nSTACKTRACE: {derror}")
-                    retry_err(
-                        set_error_segment,
-                        db,
-                        seg_id,
-                        f"{error_msg}{derror}")
-                else:
-                    retry_err(set_deep_dive_segment, db, seg_id, ddres)
-        elif llm_error == "timeout":
-            log_diver(
-                f"processing segment {main_id}@{page}: "
-                f"llm timed out ({prompt_info['name']})")
-            retry_err(
-                set_error_segment,
-                db,
-                seg_id,
-                f"llm timed out for {main_id}@{page}")
-        elif llm_error == "missing":
-            log_diver(
-                f"processing segment {main_id}@{page}: "
-                f"llm error ({prompt_info['name']})")
-            retry_err(
-                set_error_segment,
-                db,
-                seg_id,
-                f"error in task: {llm_out}")
-        else:
-            raise ValueError(f"unexpected error: {llm_out=} {llm_error=}")
+        pending.append({
+            "segment": segment,
+            "prompt_info": prompt_infos[prompt_id],
+            "categories": categories,
+            "is_verify": is_verify,
+            "started": False,
+            "deadline": 0.0,
+        })
+    inflight: dict[TaskId, SegmentTask] = {}
+    try:
+        while pending or inflight:
+            if pending and len(inflight) < DIVER_INFLIGHT:
+                queue_length = get_llm_queue_length(smind, ns)
+                while (
+                        pending
+                        and len(inflight) < DIVER_INFLIGHT
+                        and queue_length < DIVER_MAX_QUEUE):
+                    seg_task = pending.popleft()
+                    segment = seg_task["segment"]
+                    prompt_info = seg_task["prompt_info"]
+                    log_diver(
+                        "processing segment "
+                        f"{segment['main_id']}@{segment['page']} "
+                        f"({segment['id']}): llm ({prompt_info['name']}) "
+                        f"size={len(segment['content'])}")
+                    task_id = enqueue_llm(
+                        smind, ns, segment["content"], prompt_info)
+                    seg_task["deadline"] = (
+                        time.monotonic() + LLM_TIMEOUT * (len(inflight) + 1))
+                    inflight[task_id] = seg_task
+                    queue_length += 1
+            if not inflight:
+                log_diver(
+                    f"llm queue full: waiting {DIVER_BACKOFF}s "
+                    f"pending={len(pending)}")
+                flush()
+                time.sleep(DIVER_BACKOFF)
+                continue
+            is_queued = update_started(smind, inflight)
+            timeout = min(
+                seg_task["deadline"] for seg_task in inflight.values())
+            timeout = timeout - time.monotonic()
+            if is_queued:
+                timeout = min(timeout, DIVER_STATUS_POLL)
+            timeout = max(0.1, timeout)
+            for task_id, result in smind.wait_for(
+                    list(inflight), timeout=timeout):
+                if result["status"] in TASK_COMPLETE:
+                    seg_task = inflight.pop(task_id)
+                    res = result["result"]
+                    smind.clear_task(task_id)
+                    if res is None:
+                        add_result(
+                            get_segment_result(seg_task, None, "missing"))
+                    else:
+                        add_result(get_segment_result(
+                            seg_task, tensor_to_str(res["response"]), "okay"))
+                break
+            now = time.monotonic()
+            timed_out = [
+                task_id
+                for task_id, seg_task in inflight.items()
+                if seg_task["deadline"] <= now
+            ]
+            for task_id in timed_out:
+                seg_task = inflight.pop(task_id)
+                smind.clear_task(task_id)
+                add_result(get_segment_result(seg_task, None, "timeout"))
+    finally:
+        for task_id in inflight:
+            smind.clear_task(task_id)
+        flush()
     return len(segments)
 
 
-def llm_response(
+def get_segment_result(
+        seg_task: SegmentTask,
+        llm_out: str | None,
+        llm_error: Literal["timeout", "missing", "okay"]) -> SegmentResult:
+    """
+    Interprets the LLM response for a segment.
+
+    Args:
+        seg_task (SegmentTask): The segment.
+        llm_out (str | None): The LLM response.
+        llm_error (Literal["timeout", "missing", "okay"]): Whether the
+            processing went well.
+
+    Returns:
+        SegmentResult: The result to write to the database.
+    """
+    segment = seg_task["segment"]
+    seg_id = segment["id"]
+    main_id = segment["main_id"]
+    page = segment["page"]
+    prompt_info = seg_task["prompt_info"]
+
+    def as_error(error: str) -> SegmentResult:
+        return {
+            "seg_id": seg_id,
+            "verify": None,
+            "deep_dive": None,
+            "error": error,
+        }
+
+    if llm_out is not None:
+        error_msg = f"ERROR: could not interpret model output:\n{llm_out}"
+        if seg_task["is_verify"]:
+            vres, verror = interpret_verify(llm_out)
+            if vres is None:
+                verror = "" if verror is None else f"\nSTACKTRACE: {verror}"
+                return as_error(f"{error_msg}{verror}")
+            return {
+                "seg_id": seg_id,
+                "verify": vres,
+                "deep_dive": None,
+                "error": None,
+            }
+        ddres, derror = interpret_deep_dive(llm_out, seg_task["categories"])
+        if ddres is None:
+            derror = "" if derror is None else f"\nSTACKTRACE: {derror}"
+            return as_error(f"{error_msg}{derror}")
+        return {
+            "seg_id": seg_id,
+            "verify": None,
+            "deep_dive": ddres,
+            "error": None,
+        }
+    if llm_error == "timeout":
+        log_diver(
+            f"processing segment {main_id}@{page}: "
+            f"llm timed out ({prompt_info['name']})")
+        return as_error(f"llm timed out for {main_id}@{page}")
+    if llm_error == "missing":
+        log_diver(
+            f"processing segment {main_id}@{page}: "
+            f"llm error ({prompt_info['name']})")
+        return as_error(f"error in task: {llm_out}")
+    raise ValueError(f"unexpected error: {llm_out=} {llm_error=}")
+
+
+def enqueue_llm(
         smind: ScattermindAPI,
         ns: GNamespace,
         full_text: str,
-        prompt_info: DeepDivePromptInfo,
-        ) -> tuple[str | None, Literal["timeout", "missing", "okay"]]:
+        prompt_info: DeepDivePromptInfo) -> TaskId:
     """
-    Queries the LLM.
+    Sends a segment to the LLM.
 
     Args:
         smind (ScattermindAPI): The scattermind api.
         ns (GNamespace): The model namespace.
-        full_text (str): The full text of the document.
+        full_text (str): The full text of the segment.
         prompt_info (DeepDivePromptInfo): The system prompts.
 
     Returns:
-        tuple[str | None, Literal["timeout", "missing", "okay"]]: The result or
-            None and an indicator on whether the processing went well.
+        TaskId: The LLM task.
     """
     post_prompt = prompt_info["post_prompt"]
     if post_prompt is None:
         post_prompt = " "
-    task_id = smind.enqueue_task(
+    return smind.enqueue_task(
         ns,
         {
             "prompt": full_text,
             "main_prompt": prompt_info["main_prompt"],
             "post_prompt": post_prompt,
         })
-    for _, result in smind.wait_for(
-            [task_id], timeout=LLM_TIMEOUT, auto_clear=True):
-        if result["status"] not in TASK_COMPLETE:
-            return (None, "timeout")
-        res = result["result"]
-        if res is None:
-            return (None, "missing")
-        return (tensor_to_str(res["response"]), "okay")
-    return (None, "missing")
 
 
 LP = r"{"
@@ -14,25 +14,44 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """Detecting the language of a text."""
+import atexit
 import collections
-import random
+import multiprocessing
+import os
+import threading
 from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
 from typing import TypedDict
 
 import langdetect  # type: ignore
-from langdetect import detect_langs
+from langdetect import detect_langs, DetectorFactory
 
+from app.misc.lru import LRU
+from app.misc.util import get_text_hash
 from app.system.stats import LengthCounter
 
 
+DetectorFactory.seed = 0  # NOTE: makes language detection deterministic
+
+
 MAX_PROCESSING_SIZE = 1000
 """The maximum snippet size to process."""
 NUM_PROBES = 10
-"""The number of probes to generate for a document."""
+"""The maximum number of probes to generate for a document."""
+MIN_PROBES = 3
+"""The number of probes that need to agree on the top language to stop
+probing early."""
+LANG_BATCH_MIN = 8
+"""The minimum number of uncached texts to use the process pool in batch
+mode."""
+LANG_PROCESSES = min(4, os.cpu_count() or 1)
+"""The number of processes used in batch mode."""
 
 
 LangTuple = tuple[str, float]
 """Language tuple. Iso language and score."""
+ProbeSpan = tuple[int, int]
+"""The start and end position of a probe in the full text."""
 
 
 LangCandidate = TypedDict('LangCandidate', {
@@ -50,13 +69,20 @@ LangResponse = TypedDict('LangResponse', {
 """Response for language extraction."""
 
 
-def get_raw_lang(text: str, lnc: LengthCounter) -> Iterable[LangTuple]:
+LANG_LRU: LRU[str, tuple[LangResponse, list[ProbeSpan]]] = LRU(10000)
+"""In-process cache of language results by text hash."""
+LANG_LOCK = threading.Lock()
+"""Lock for creating the process pool."""
+LANG_POOL: ProcessPoolExecutor | None = None
+"""The process pool for batch mode."""
+
+
+def get_raw_lang(text: str) -> Iterable[LangTuple]:
     """
     Gets the languages of a text snippet.
 
     Args:
         text (str): The text snippet.
-        lnc (LengthCounter): The length counter.
 
     Raises:
         ValueError: If the text is too long.
@@ -67,58 +93,92 @@ def get_raw_lang(text: str, lnc: LengthCounter) -> Iterable[LangTuple]:
     if len(text) > MAX_PROCESSING_SIZE:
         raise ValueError(f"text too long {len(text)} > {MAX_PROCESSING_SIZE}")
     try:
-        for res in detect_langs(lnc(text)):
+        for res in detect_langs(text):
             yield (f"{res.lang}", float(res.prob))
     except langdetect.lang_detect_exception.LangDetectException:
         pass
 
 
-def probe(
-        text: str,
-        rng: random.Random | None,
-        lnc: LengthCounter) -> Iterable[LangTuple]:
+def get_probe_span(text: str, pos: int) -> ProbeSpan:
     """
-    Generate a language probe for the text.
+    Computes the span of a probe starting at the given position. The probe
+    ends at a word boundary if possible.
 
     Args:
         text (str): The full text.
-        rng (random.Random | None): Random number generator.
-        lnc (LengthCounter): The length counter.
+        pos (int): The start position.
 
-    Yields:
-        LangTuple: The language tuples.
+    Returns:
+        ProbeSpan: The span of the probe.
     """
-    pos = 0
-    if rng is not None:
-        pos = rng.randint(0, max(0, len(text) - MAX_PROCESSING_SIZE))
     probe_text = text[pos:pos + MAX_PROCESSING_SIZE + 1]
     if len(probe_text) > MAX_PROCESSING_SIZE:
         rpos = min(probe_text.rfind(" "), MAX_PROCESSING_SIZE)
-        probe_text = probe_text[:rpos]
-    yield from get_raw_lang(probe_text, lnc)
+        if rpos < 0:
+            rpos = MAX_PROCESSING_SIZE
+        return (pos, pos + rpos)
+    return (pos, pos + len(probe_text))
 
 
-def get_lang(text: str, lnc: LengthCounter) -> LangResponse:
+def get_probe_spans(text: str) -> list[ProbeSpan]:
     """
-    Get the language of the given text.
+    Computes the probes of a text. The probes are evenly spread across the
+    text. They are ordered so that any prefix of the probes covers the text
+    as evenly as possible (start, end, middle, quarters, etc.).
 
     Args:
         text (str): The full text.
-        lnc (LengthCounter): The length counter.
 
     Returns:
-        LangResponse: The language result.
+        list[ProbeSpan]: The probe spans.
+    """
+    max_pos = max(0, len(text) - MAX_PROCESSING_SIZE)
+    count = min(NUM_PROBES, max_pos // MAX_PROCESSING_SIZE + 2)
+    if max_pos == 0 or count < 2:
+        return [get_probe_span(text, 0)]
+    stratum = max_pos / (count - 1)
+    order = [0, count - 1]
+    step = count - 1
+    while len(order) < count:
+        step = max(1, step // 2)
+        order.extend(
+            ix
+            for ix in range(0, count, step)
+            if ix not in order)
+    return [get_probe_span(text, int(ix * stratum)) for ix in order]
+
+
+def detect_lang(text: str) -> tuple[LangResponse, list[ProbeSpan]]:
+    """
+    Detects the language of the given text. Probing stops early if the first
+    probes agree on the top language.
+
+    Args:
+        text (str): The full text.
+
+    Returns:
+        tuple[LangResponse, list[ProbeSpan]]: The language result and the
+            spans of the probes that were processed.
     """
-    rng = random.Random()
     res: collections.defaultdict[str, float] = \
         collections.defaultdict(lambda: 0.0)
     counts: collections.Counter[str] = collections.Counter()
     total = 0
-    for _ in range(NUM_PROBES):
-        for lang, score in probe(text, rng, lnc):
+    tops: set[str] = set()
+    spans: list[ProbeSpan] = []
+    for span in get_probe_spans(text):
+        start, end = span
+        spans.append(span)
+        top: str | None = None
+        for lang, score in get_raw_lang(text[start:end]):
             res[lang] += score
             counts[lang] += 1
             total += 1
+            if top is None:
+                top = lang
+        tops.add(f"{top}")
+        if len(spans) >= MIN_PROBES and len(tops) == 1:
+            break
     return {
         "languages": sorted(
             (
@@ -131,4 +191,102 @@ def get_lang(text: str, lnc: LengthCounter) -> LangResponse:
             ),
             key=lambda entry: entry["score"],
             reverse=True),
-    }
+    }, spans
+
+
+def count_probes(
+        text: str, spans: list[ProbeSpan], lnc: LengthCounter) -> None:
+    """
+    Adds the processed probes to the length counter.
+
+    Args:
+        text (str): The full text.
+        spans (list[ProbeSpan]): The spans of the processed probes.
+        lnc (LengthCounter): The length counter.
+    """
+    for start, end in spans:
+        lnc(text[start:end])
+
+
+def get_lang(text: str, lnc: LengthCounter) -> LangResponse:
+    """
+    Get the language of the given text. Results are cached.
+
+    Args:
+        text (str): The full text.
+        lnc (LengthCounter): The length counter.
+
+    Returns:
+        LangResponse: The language result.
+    """
+    return get_langs([text], lnc)[0]
+
+
+def get_lang_pool() -> ProcessPoolExecutor:
+    """
+    Gets the process pool for batch mode.
+
+    Returns:
+        ProcessPoolExecutor: The process pool.
+    """
+    global LANG_POOL  # pylint: disable=global-statement
+
+    with LANG_LOCK:
+        if LANG_POOL is None:
+            # NOTE: forking a multi-threaded process can deadlock the child
+            LANG_POOL = ProcessPoolExecutor(
+                max_workers=LANG_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(shutdown_lang_pool)
+        return LANG_POOL
+
+
+def shutdown_lang_pool() -> None:
+    """Shuts down the process pool for batch mode if it exists."""
+    global LANG_POOL  # pylint: disable=global-statement
+
+    with LANG_LOCK:
+        pool = LANG_POOL
+        LANG_POOL = None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def get_langs(texts: list[str], lnc: LengthCounter) -> list[LangResponse]:
+    """
+    Get the languages of multiple texts. Results are cached. If enough texts
+    are not cached they are processed in parallel in a process pool.
+
+    Args:
+        texts (list[str]): The full texts.
+        lnc (LengthCounter): The length counter.
+
+    Returns:
+        list[LangResponse]: The language result for each text.
+    """
+    keys = [get_text_hash(text) for text in texts]
+    res: dict[str, tuple[LangResponse, list[ProbeSpan]]] = {}
+    missing: dict[str, str] = {}
+    for key, text in zip(keys, texts):
+        if key in res or key in missing:
+            continue
+        cached = LANG_LRU.get(key)
+        if cached is None:
+            missing[key] = text
+        else:
+            res[key] = cached
+    if missing:
+        miss_keys = list(missing.keys())
+        miss_texts = [missing[key] for key in miss_keys]
+        if len(miss_texts) >= LANG_BATCH_MIN and LANG_PROCESSES > 1:
+            results = list(get_lang_pool().map(
+                detect_lang,
+                miss_texts,
+                chunksize=max(1, len(miss_texts) // (LANG_PROCESSES * 4))))
+        else:
+            results = [detect_lang(text) for text in miss_texts]
+        for key, text, result in zip(miss_keys, miss_texts, results):
+            count_probes(text, result[1], lnc)
+            res[key] = result
+            LANG_LRU.set(key, result)
+    return [res[key][0] for key in keys]
@@ -18,7 +18,7 @@ from uuid import UUID
 
 from app.system.db.base import LocationUsers
 from app.system.db.db import DBConnector
-from app.system.language.langdetect import get_lang, LangResponse
+from app.system.language.langdetect import get_langs, LangResponse
 from app.system.stats import create_length_counter
 
 
@@ -35,19 +35,38 @@ def extract_language(
     Returns:
         LangResponse: The language results.
     """
+    return extract_languages(db, [text], user)[0]
+
+
+def extract_languages(
+        db: DBConnector, texts: list[str], user: UUID) -> list[LangResponse]:
+    """
+    Extracts the languages of multiple texts for a user and keeps track of the
+    overall api usage.
+
+    Args:
+        db (DBConnector): The database connector.
+        texts (list[str]): The full texts.
+        user (UUID): The user uuid.
+
+    Returns:
+        list[LangResponse]: The language results for each text.
+    """
+    if not texts:
+        return []
     lnc, lnr = create_length_counter()
-    res = get_lang(text, lnc)
+    res = get_langs(texts, lnc)
     with db.get_session() as session:
         total_length = lnr()
         stmt = db.upsert(LocationUsers).values(
             userid=user,
-            language_count=1,
+            language_count=len(texts),
             language_length=total_length)
         stmt = stmt.on_conflict_do_update(
             index_elements=[LocationUsers.userid],
             set_={
                 LocationUsers.language_count:
-                    LocationUsers.language_count + 1,
+                    LocationUsers.language_count + len(texts),
                 LocationUsers.language_length:
                     LocationUsers.language_length + total_length,
             })
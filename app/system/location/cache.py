@@ -14,18 +14,99 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """Caching location results."""
+import atexit
 import collections
+import threading
 
 import sqlalchemy as sa
 
+from app.misc.lru import LRU
 from app.system.db.base import LocationCache, LocationEntries
 from app.system.db.db import DBConnector
 from app.system.location.response import GeoResponse, GeoResult
 
 
+GEO_LRU: LRU[str, GeoResult] = LRU(10000)
+"""In-process cache of geo results that are stored in the database. Only
+results with the status `cache_hit` or `cache_never` are kept."""
+ACCESS_FLUSH_INTERVAL = 10.0
+"""The time in seconds access counts are buffered before they are written to
+the database."""
+
+
+ACCESS_LOCK = threading.Lock()
+"""Lock for the buffered access counts."""
+ACCESS_PENDING: collections.Counter[str] = collections.Counter()
+"""Buffered access counts of each query."""
+ACCESS_TIMER: threading.Timer | None = None
+"""The pending access count flush."""
+ACCESS_AT_EXIT = False
+"""Whether buffered access counts are written to the database when the
+process exits. The flush timer is a daemon thread and would not run."""
+
+
+def flush_geo_access(db: DBConnector) -> None:
+    """
+    Writes buffered access counts to the database.
+
+    Args:
+        db (DBConnector): The database connector.
+    """
+    global ACCESS_TIMER  # pylint: disable=global-statement
+
+    with ACCESS_LOCK:
+        if ACCESS_TIMER is not None:
+            ACCESS_TIMER.cancel()
+            ACCESS_TIMER = None
+        pending = dict(ACCESS_PENDING)
+        ACCESS_PENDING.clear()
+    if not pending:
+        return
+    by_count: collections.defaultdict[int, list[str]] = \
+        collections.defaultdict(list)
+    for query, count in pending.items():
+        by_count[count].append(query)
+    with db.get_session() as session:
+        for count, queries in sorted(by_count.items()):
+            stmt = sa.update(LocationCache)
+            stmt = stmt.where(LocationCache.query.in_(sorted(queries)))
+            stmt = stmt.values(
+                access_last=sa.func.now(),  # pylint: disable=not-callable
+                access_count=LocationCache.access_count + count)
+            session.execute(stmt)
+
+
+def add_geo_access(db: DBConnector, queries: list[str]) -> None:
+    """
+    Buffers access count increments for the given queries. The counts are
+    written to the database asynchronously and when the process exits.
+
+    Args:
+        db (DBConnector): The database connector.
+        queries (list[str]): The accessed queries.
+    """
+    global ACCESS_TIMER  # pylint: disable=global-statement
+    global ACCESS_AT_EXIT  # pylint: disable=global-statement
+
+    if not queries:
+        return
+    with ACCESS_LOCK:
+        ACCESS_PENDING.update(queries)
+        if not ACCESS_AT_EXIT:
+            atexit.register(flush_geo_access, db)
+            ACCESS_AT_EXIT = True
+        if ACCESS_TIMER is None:
+            timer = threading.Timer(
+                ACCESS_FLUSH_INTERVAL, flush_geo_access, args=(db,))
+            timer.daemon = True
+            ACCESS_TIMER = timer
+            timer.start()
+
+
 def read_geo_cache(db: DBConnector, queries: set[str]) -> dict[str, GeoResult]:
     """
-    Reads previously cached results for the given queries.
+    Reads previously cached results for the given queries. Results are
+    looked up in an in-process cache first and in the database second.
 
     Args:
         db (DBConnector): The database connector.
@@ -35,57 +116,67 @@ def read_geo_cache(db: DBConnector, queries: set[str]) -> dict[str, GeoResult]:
         dict[str, GeoResult]: Mapping the queries to their cached results. If
             a query was not cached its key won't appear in the dictionary.
     """
-    qins = sorted(query.strip() for query in queries)
+    qins = sorted({query.strip() for query in queries})
     res: dict[str, GeoResult] = {}
+    db_qins: list[str] = []
+    for qin in qins:
+        cres = GEO_LRU.get(qin)
+        if cres is None:
+            db_qins.append(qin)
+        else:
+            res[qin] = cres
     id_map: dict[int, str] = {}
     query_ids: set[int] = set()
     skip: set[int] = set()
     resps: collections.defaultdict[int, dict[int, GeoResponse]] = \
         collections.defaultdict(dict)
-    with db.get_session() as session:
-        stmt = sa.update(LocationCache)
-        stmt = stmt.where(LocationCache.query.in_(qins))
-        stmt = stmt.returning(
-            LocationCache.query, LocationCache.id, LocationCache.no_cache)
-        stmt = stmt.values(
-            access_last=sa.func.now(),  # pylint: disable=not-callable
-            access_count=LocationCache.access_count + 1)
-        for row in session.execute(stmt):
-            row_id = int(row.id)
-            id_map[row_id] = row.query.strip()
-            if row.no_cache:
-                skip.add(row_id)
-            else:
-                query_ids.add(row_id)
-        qids = sorted(query_ids)
-        estmt = sa.select(
-            LocationEntries.location_id,
-            LocationEntries.pos,
-            LocationEntries.lat,
-            LocationEntries.lng,
-            LocationEntries.formatted,
-            LocationEntries.country,
-            LocationEntries.confidence)
-        estmt = estmt.where(LocationEntries.location_id.in_(qids))
-        for row in session.execute(estmt):
-            row_id = int(row.location_id)
-            pos = int(row.pos)
-            resps[row_id][pos] = {
-                "lat": float(row.lat),
-                "lng": float(row.lng),
-                "formatted": f"{row.formatted}",
-                "country": f"{row.country}",
-                "relevance": 1.0 / (float(row.pos) + 1.0),
-            }
+    if db_qins:
+        with db.get_session() as session:
+            stmt = sa.select(
+                LocationCache.query, LocationCache.id, LocationCache.no_cache)
+            stmt = stmt.where(LocationCache.query.in_(db_qins))
+            for row in session.execute(stmt):
+                row_id = int(row.id)
+                id_map[row_id] = row.query.strip()
+                if row.no_cache:
+                    skip.add(row_id)
+                else:
+                    query_ids.add(row_id)
+            if query_ids:
+                qids = sorted(query_ids)
+                estmt = sa.select(
+                    LocationEntries.location_id,
+                    LocationEntries.pos,
+                    LocationEntries.lat,
+                    LocationEntries.lng,
+                    LocationEntries.formatted,
+                    LocationEntries.country,
+                    LocationEntries.confidence)
+                estmt = estmt.where(LocationEntries.location_id.in_(qids))
+                for row in session.execute(estmt):
+                    row_id = int(row.location_id)
+                    pos = int(row.pos)
+                    resps[row_id][pos] = {
+                        "lat": float(row.lat),
+                        "lng": float(row.lng),
+                        "formatted": f"{row.formatted}",
+                        "country": f"{row.country}",
+                        "relevance": 1.0 / (float(row.pos) + 1.0),
+                    }
     for skip_id in skip:
-        res[id_map[skip_id]] = (None, "cache_never")
+        never_res: GeoResult = (None, "cache_never")
+        res[id_map[skip_id]] = never_res
+        GEO_LRU.set(id_map[skip_id], never_res)
     for (resp_id, resp) in resps.items():
         resp_arr = [
             elem
             for (_, elem)
             in sorted(resp.items(), key=lambda item: item[0])
         ]
-        res[id_map[resp_id]] = (resp_arr, "cache_hit")
+        hit_res: GeoResult = (resp_arr, "cache_hit")
+        res[id_map[resp_id]] = hit_res
+        GEO_LRU.set(id_map[resp_id], hit_res)
+    add_geo_access(db, [qin for qin in qins if qin in res])
     for qin in qins:
         if qin not in res:
             res[qin] = (None, "cache_miss")
@@ -94,39 +185,64 @@ def read_geo_cache(db: DBConnector, queries: set[str]) -> dict[str, GeoResult]:
 
 def write_geo_cache(db: DBConnector, results: dict[str, GeoResult]) -> None:
     """
-    Writes query results to the cache.
+    Writes query results to the cache. All results are written with one
+    statement per table.
 
     Args:
         db (DBConnector): The database connector.
         results (dict[str, GeoResult]): The results.
     """
+    writes: dict[str, list[GeoResponse]] = {}
+    for res_query, result in results.items():
+        if result[0] is None:
+            continue
+        if result[1] in ("cache_never", "cache_hit"):
+            continue
+        if result[1] != "ok":
+            continue
+        writes[res_query.strip()] = result[0]
+    if not writes:
+        return
     with db.get_session() as session:
-        for res_query, result in results.items():
-            if result[0] is None:
-                continue
-            if result[1] in ("cache_never", "cache_hit"):
-                continue
-            if result[1] != "ok":
-                continue
-            res_arr = result[0]
-            cstmt = db.upsert(LocationCache).values(
-                query=res_query,
-                no_cache=False)
-            cstmt = cstmt.returning(LocationCache.id)
-            lid = session.execute(cstmt).scalar()
+        cstmt = db.upsert(LocationCache).values([
+            {
+                "query": res_query,
+                "no_cache": False,
+            }
+            for res_query in sorted(writes.keys())
+        ])
+        cstmt = cstmt.on_conflict_do_update(
+            index_elements=[LocationCache.query],
+            set_={
+                # NOTE: no-op update so existing ids get returned as well
+                LocationCache.query: cstmt.excluded.query,
+            })
+        cstmt = cstmt.returning(LocationCache.query, LocationCache.id)
+        lids: dict[str, int] = {
+            row.query: int(row.id)
+            for row in session.execute(cstmt)
+        }
+        entries = []
+        for res_query, res_arr in writes.items():
+            lid = lids.get(res_query)
             if lid is None:
                 raise ValueError(f"error while inserting: {res_query}")
             for (pos, res) in enumerate(res_arr):
                 country = res["country"]
                 if len(country) > 4:
                     country = f"{country[:4]}?"
-                stmt = db.upsert(LocationEntries).values(
-                    location_id=lid,
-                    pos=pos,
-                    lat=res["lat"],
-                    lng=res["lng"],
-                    formatted=res["formatted"],
-                    country=country,
-                    confidence=res["relevance"])  # NOTE: not really needed
-                stmt = stmt.on_conflict_do_nothing()
-                session.execute(stmt)
+                entries.append({
+                    "location_id": lid,
+                    "pos": pos,
+                    "lat": res["lat"],
+                    "lng": res["lng"],
+                    "formatted": res["formatted"],
+                    "country": country,
+                    "confidence": res["relevance"],  # NOTE: not really needed
+                })
+        if entries:
+            stmt = db.upsert(LocationEntries).values(entries)
+            stmt = stmt.on_conflict_do_nothing()
+            session.execute(stmt)
+    for res_query, res_arr in writes.items():
+        GEO_LRU.set(res_query, (res_arr, "cache_hit"))
@@ -14,9 +14,12 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """Forward geolocation lookup."""
+import threading
 import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import cast, TypedDict
+from typing import Any, cast, Protocol, TypedDict
 
 from opencage.geocoder import (  # type: ignore
     OpenCageGeocode,
@@ -27,8 +30,31 @@ from app.system.config import get_config
 from app.system.location.response import GeoResponse, GeoResult
 
 
-GEOCODER: OpenCageGeocode | None = None
+class Geocoder(Protocol):  # pylint: disable=too-few-public-methods
+    """A forward geocoder. This is the interface of `OpenCageGeocode` used
+    for lookups."""
+    def geocode(self, query: str) -> list[Any] | None:
+        """
+        Looks up the query.
+
+        Args:
+            query (str): The query.
+
+        Raises:
+            RateLimitExceededError: If the rate limit has been reached.
+
+        Returns:
+            list[Any] | None: The results in OpenCage format.
+        """
+        raise NotImplementedError()
+
+
+GEOCODER: Geocoder | None = None
 """The OpenCage api."""
+GEO_WORKERS = 4
+"""The number of geocoding requests performed in parallel."""
+GEO_RATE = 1.0
+"""The maximum number of geocoding requests per second."""
 
 
 OpenCageGeometry = TypedDict('OpenCageGeometry', {
@@ -59,12 +85,26 @@ OpenCageFormat = TypedDict('OpenCageFormat', {
 """OpenCage result list."""
 
 
-def get_geo() -> OpenCageGeocode:
+def set_geo(geocoder: Geocoder | None) -> None:
+    """
+    Sets the geocoder. This can be used to use a stand-in geocoder for
+    testing.
+
+    Args:
+        geocoder (Geocoder | None): The geocoder. If None, the OpenCage api
+            is used.
+    """
+    global GEOCODER  # pylint: disable=global-statement
+
+    GEOCODER = geocoder
+
+
+def get_geo() -> Geocoder:
     """
     Get the OpenCage api.
 
     Returns:
-        OpenCageGeocode: The api object.
+        Geocoder: The api object.
     """
     global GEOCODER  # pylint: disable=global-statement
 
@@ -78,9 +118,90 @@ EXCEEDED_FOR_TODAY: datetime | None = None
 """Date of exceeding the quota. None if the quota is fine."""
 
 
+class RateLimiter:
+    """A thread-safe token bucket rate limiter."""
+    def __init__(self, rate: float, burst: float = 1.0) -> None:
+        """
+        Creates a rate limiter.
+
+        Args:
+            rate (float): The number of tokens per second.
+            burst (float, optional): The maximum number of tokens that can
+                accumulate. Defaults to 1.0.
+        """
+        self._lock = threading.Lock()
+        self._rate = rate
+        self._burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+
+    def set_rate(self, rate: float) -> None:
+        """
+        Changes the rate.
+
+        Args:
+            rate (float): The number of tokens per second.
+        """
+        with self._lock:
+            self._rate = rate
+
+    def pause(self, seconds: float) -> None:
+        """
+        Prevents any tokens from being handed out for the given time. This is
+        used when the remote reports that the rate limit has been reached.
+
+        Args:
+            seconds (float): The time in seconds.
+        """
+        with self._lock:
+            self._tokens = min(self._tokens, -seconds * self._rate)
+            self._last = time.monotonic()
+
+    def acquire(self) -> None:
+        """
+        Takes one token. Waits until a token is available.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self._burst,
+                    self._tokens + (now - self._last) * self._rate)
+                self._last = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self._rate
+            time.sleep(wait)
+
+
+RATE_LIMITER = RateLimiter(GEO_RATE)
+"""The rate limiter for all geocoding requests of the process."""
+
+
+def is_exceeded_for_today() -> bool:
+    """
+    Whether the quota for the day has been reached.
+
+    Returns:
+        bool: True, if no requests should be made.
+    """
+    # pylint: disable=global-statement
+    global EXCEEDED_FOR_TODAY
+
+    eft = EXCEEDED_FOR_TODAY
+    if eft is None:
+        return False
+    cur_time = datetime.now(eft.tzinfo)
+    if cur_time < eft:
+        return True
+    EXCEEDED_FOR_TODAY = None
+    return False
+
+
 def geo_result(query: str) -> GeoResult:
     """
-    Query the OpenCage database.
+    Query the OpenCage database. Requests are rate limited.
 
     Args:
         query (str): The query.
@@ -91,16 +212,14 @@ def geo_result(query: str) -> GeoResult:
     # pylint: disable=global-statement
     global EXCEEDED_FOR_TODAY
 
-    eft = EXCEEDED_FOR_TODAY
-    if eft is not None:
-        cur_time = datetime.now(eft.tzinfo)
-        if cur_time < eft:
-            return (None, "ratelimit")
-        EXCEEDED_FOR_TODAY = None
-
     tries = 10
     while tries > 0:
         tries -= 1
+        if is_exceeded_for_today():
+            break
+        RATE_LIMITER.acquire()
+        if is_exceeded_for_today():
+            break
         try:
             query = query.strip()
             results: list[OpenCageResult] = cast(
@@ -135,10 +254,94 @@ def geo_result(query: str) -> GeoResult:
                         f"day. will become available again in {sleep_time}s "
                         f"at {EXCEEDED_FOR_TODAY.isoformat()}")
                     break
-            time.sleep(sleep_time)
+            RATE_LIMITER.pause(sleep_time)
     return (None, "ratelimit")
 
 
+GEO_LOCK = threading.RLock()
+"""Lock for the geocoding executor and the in-flight requests."""
+GEO_EXECUTOR: ThreadPoolExecutor | None = None
+"""The geocoding executor."""
+GEO_INFLIGHT: dict[str, Future[GeoResult]] = {}
+"""Queries that are currently being geocoded."""
+
+
+def set_geo_limits(*, workers: int, rate: float) -> None:
+    """
+    Configures the geocoding executor. This must be called before any
+    geocoding happens to change the number of workers.
+
+    Args:
+        workers (int): The number of requests performed in parallel.
+        rate (float): The maximum number of requests per second. Must be
+            positive.
+
+    Raises:
+        ValueError: If the rate is not positive.
+    """
+    global GEO_WORKERS  # pylint: disable=global-statement
+    global GEO_RATE  # pylint: disable=global-statement
+
+    if rate <= 0.0:
+        raise ValueError(f"geocoding {rate=} must be positive")
+    GEO_WORKERS = max(1, workers)
+    GEO_RATE = rate
+    RATE_LIMITER.set_rate(rate)
+
+
+def get_geo_executor() -> ThreadPoolExecutor:
+    """
+    Gets the geocoding executor. The lock `GEO_LOCK` must be held.
+
+    Returns:
+        ThreadPoolExecutor: The executor.
+    """
+    global GEO_EXECUTOR  # pylint: disable=global-statement
+
+    if GEO_EXECUTOR is None:
+        GEO_EXECUTOR = ThreadPoolExecutor(
+            max_workers=GEO_WORKERS, thread_name_prefix="geocode")
+    return GEO_EXECUTOR
+
+
+def geo_results(queries: Iterable[str]) -> dict[str, GeoResult]:
+    """
+    Query the OpenCage database for multiple queries in parallel. Queries
+    that are already being looked up (e.g., by a concurrent request) are only
+    requested once.
+
+    Args:
+        queries (Iterable[str]): The queries.
+
+    Returns:
+        dict[str, GeoResult]: The geolocation result for each query.
+    """
+    futures: dict[str, Future[GeoResult]] = {}
+
+    def get_done(query: str) -> Callable[[Future[GeoResult]], None]:
+
+        def done(_: Future[GeoResult]) -> None:
+            with GEO_LOCK:
+                GEO_INFLIGHT.pop(query, None)
+
+        return done
+
+    with GEO_LOCK:
+        for query in queries:
+            if query in futures:
+                continue
+            future = GEO_INFLIGHT.get(query)
+            if future is None:
+                future = get_geo_executor().submit(geo_result, query)
+                GEO_INFLIGHT[query] = future
+                future.add_done_callback(get_done(query))
+            futures[query] = future
+    return {
+        query: future.result()
+        for query, future in futures.items()
+    }
+
+
 def as_opencage_format(results: list[GeoResponse]) -> OpenCageFormat:
     """
     Convert a geolocation result into the OpenCage format.
@@ -23,7 +23,7 @@ from app.system.db.db import DBConnector
 from app.system.location.cache import read_geo_cache, write_geo_cache
 from app.system.location.forwardgeo import (
     as_opencage_format,
-    geo_result,
+    geo_results,
     OpenCageFormat,
     OpenCageResult,
 )
@@ -76,7 +76,7 @@ def extract_opencage(db: DBConnector, text: str, user: UUID) -> OpenCageFormat:
             if status not in NO_COUNT_REQUESTS:
                 status_count[STATUS_MAP[status]] += 1
             continue
-        geo_res = geo_result(key)
+        geo_res = geo_results([key])[key]
         write_geo_cache(db, {key: geo_res})
         geo_response, geo_status = geo_res
         if geo_status not in NO_COUNT_REQUESTS:
@@ -151,15 +151,15 @@ def extract_locations(
     queries = set(query_list)
     cache_res = read_geo_cache(db, queries)
     compute_res: dict[str, GeoResult] = {}
-    requests = 0
+    geo_queries: list[str] = []
     for query, cres in cache_res.items():
         if cres[0] is not None:
             continue
-        if max_requests is None or requests < max_requests:
-            requests += 1
-            compute_res[query] = geo_result(query)
+        if max_requests is None or len(geo_queries) < max_requests:
+            geo_queries.append(query)
         else:
             compute_res[query] = (None, "requestlimit")
+    compute_res.update(geo_results(geo_queries))
     write_geo_cache(db, compute_res)
     get_resp = strategy.get_callback(query_list, {
         query: compute_res.get(query, cache_res[query])
@@ -20,7 +20,7 @@ like this: `<base>:<doc_id>`."""
 import traceback
 from collections.abc import Callable, Iterable
 from datetime import datetime
-from typing import Protocol, TypeAlias
+from typing import Any, Protocol, TypeAlias, TypeVar
 
 import sqlalchemy as sa
 from scattermind.system.util import maybe_first
@@ -41,6 +41,9 @@ from app.system.prep.snippify import snippify_text
 from app.system.stats import create_length_counter
 
 
+T = TypeVar('T')
+
+
 AllDocsFn: TypeAlias = Callable[[str], Iterable[str]]
 """Function to retrieve all documents of a given base. The function returns an
 iterator of main ids."""
@@ -49,6 +52,9 @@ IsRemoveFn: TypeAlias = Callable[[str], tuple[bool, str | None]]
 database (e.g., unpublished or deemed irrelevant). Note, the result is *not*
 a boolean but a tuple of a boolean and an optional error message. If the error
 is not None the boolean is undefined and cannot be used."""
+IsRemovesFn: TypeAlias = Callable[[list[str]], list[tuple[bool, str | None]]]
+"""Whether multiple main ids denote documents that were removed from the
+database. The results are in the order of the input. See `IsRemoveFn`."""
 FullTextFn: TypeAlias = Callable[[str], tuple[str | None, str | None]]
 """Function to retrieve the full text of a document specified as main id. The
 return value is a tuple of either the full text or the error."""
@@ -61,6 +67,20 @@ StatusDateTypeFn: TypeAlias = Callable[
 """Function to retrieve the status, date, and type of a document specified as
 main id. The result is a tuple of a tuple of status, date or None, and type,
 or the error."""
+FullTextsFn: TypeAlias = Callable[
+    [list[str]], list[tuple[str | None, str | None]]]
+"""Function to retrieve the full texts of multiple documents specified as main
+ids. The results are in the order of the input. See `FullTextFn`."""
+TagsFn: TypeAlias = Callable[[list[str]], list[tuple[str | None, str]]]
+"""Function to retrieve the tags (i.e., countries) of multiple documents
+specified as main ids. The results are in the order of the input. See
+`TagFn`."""
+StatusDateTypesFn: TypeAlias = Callable[
+    [list[str]],
+    list[tuple[tuple[DocStatus, str | None, str] | None, str | None]]]
+"""Function to retrieve the status, date, and type of multiple documents
+specified as main ids. The results are in the order of the input. See
+`StatusDateTypeFn`."""
 
 
 class UrlTitleFn(Protocol):  # pylint: disable=too-few-public-methods
@@ -85,6 +105,30 @@ class UrlTitleFn(Protocol):  # pylint: disable=too-few-public-methods
         """
 
 
+class UrlTitlesFn(Protocol):  # pylint: disable=too-few-public-methods
+    """Function to retrieve the urls and titles of multiple documents
+    specified as main ids. The results are in the order of the input. See
+    `UrlTitleFn`."""
+    def __call__(
+            self,
+            main_ids: list[str],
+            *,
+            is_logged_in: bool,
+            ) -> list[tuple[tuple[str, str] | None, str | None]]:
+        """
+        Returns the urls and titles of documents specified as main ids.
+
+        Args:
+            main_ids (list[str]): The main ids.
+            is_logged_in (bool): Whether the requestor has access to preview /
+                private documents.
+
+        Returns:
+            list[tuple[tuple[str, str] | None, str | None]]: The url and title
+                or the error for each main id.
+        """
+
+
 def get_base_doc(main_id: str) -> tuple[str, int]:
     """
     Splits a main id into `base` and `doc_id`.
@@ -116,6 +160,81 @@ def get_title(title: str | None) -> str | None:
     return title
 
 
+def batch_by_base(
+        main_ids: list[str],
+        platforms: dict[str, DBConnector],
+        blogs: dict[str, DBConnector],
+        *,
+        read_pads: Callable[[DBConnector, str, list[int]], dict[int, T]],
+        read_blogs: Callable[[DBConnector, str, list[int]], dict[int, T]],
+        on_error: Callable[[str], T]) -> list[T]:
+    """
+    Retrieves information for multiple documents. The documents are grouped
+    by base so each base only needs one database query.
+
+    Args:
+        main_ids (list[str]): The main ids.
+        platforms (dict[str, DBConnector]): The platforms' database connectors.
+        blogs (dict[str, DBConnector]): The blogs' database connectors.
+        read_pads (Callable[[DBConnector, str, list[int]], dict[int, T]]):
+            Reads the information of pads given the database, the base, and
+            the doc ids. The result must contain every doc id.
+        read_blogs (Callable[[DBConnector, str, list[int]], dict[int, T]]):
+            Reads the information of blog documents given the database, the
+            base, and the doc ids. The result must contain every doc id.
+        on_error (Callable[[str], T]): Converts an error message into a
+            result.
+
+    Returns:
+        list[T]: The result for each main id in the order of the input.
+    """
+    results: dict[str, T] = {}
+    groups: dict[str, dict[int, list[str]]] = {}
+    for main_id in main_ids:
+        try:
+            base, doc_id = get_base_doc(main_id)
+        except Exception:  # pylint: disable=broad-exception-caught
+            results[main_id] = on_error(traceback.format_exc())
+            continue
+        groups.setdefault(base, {}).setdefault(doc_id, []).append(main_id)
+    for base, group in groups.items():
+        try:
+            doc_ids = sorted(group.keys())
+            pdb = platforms.get(base)
+            bdb = blogs.get(base)
+            if pdb is not None:
+                res = read_pads(pdb, base, doc_ids)
+            elif bdb is not None:
+                res = read_blogs(bdb, base, doc_ids)
+            else:
+                res = {
+                    doc_id: on_error(f"unknown {base=}")
+                    for doc_id in doc_ids
+                }
+            for doc_id, group_ids in group.items():
+                for main_id in group_ids:
+                    results[main_id] = res[doc_id]
+        except Exception:  # pylint: disable=broad-exception-caught
+            error = traceback.format_exc()
+            for group_ids in group.values():
+                for main_id in group_ids:
+                    results[main_id] = on_error(error)
+    return [results[main_id] for main_id in main_ids]
+
+
+def as_error(error: str) -> tuple[None, str]:
+    """
+    Converts an error message into a result.
+
+    Args:
+        error (str): The error message.
+
+    Returns:
+        tuple[None, str]: The result.
+    """
+    return (None, error)
+
+
 def all_pad(db: DBConnector, base: str) -> Iterable[str]:
     """
     Get all pads from a platform base.
@@ -177,46 +296,87 @@ def create_all_docs(
     return get_all_docs
 
 
-def is_remove_pad(db: DBConnector, doc_id: int) -> bool:
+def convert_is_remove_pad(row: Any) -> bool:
     """
-    Whether a pad got removed.
+    Whether a pad got removed from its database row.
 
     Args:
-        db (DBConnector): The platform's database connector.
-        doc_id (int): The pad id.
+        row (Any): The database row or None if the pad doesn't exist.
 
     Returns:
         bool: True, if the pad was removed.
     """
+    if row is None:
+        return True  # pad doesn't exist (anymore)
+    if int(row.status) <= 1:
+        return True  # pad got unpublished
+    res = sanity_check(f"{row.full_text}")
+    if not res:
+        return True  # empty pad
+    title = get_title(row.title)
+    if title:
+        res = f"{title}\n\n{res}"
+    return not res.strip()
+
+
+def is_removes_pad(db: DBConnector, doc_ids: list[int]) -> dict[int, bool]:
+    """
+    Whether pads got removed.
+
+    Args:
+        db (DBConnector): The platform's database connector.
+        doc_ids (list[int]): The pad ids.
+
+    Returns:
+        dict[int, bool]: For each pad id, True, if the pad was removed.
+    """
     with db.get_session() as session:
         stmt = sa.select(
-            PadTable.status, PadTable.full_text, PadTable.title)
-        stmt = stmt.where(PadTable.id == doc_id)
-        row = session.execute(stmt).one_or_none()
-        if row is None:
-            return True  # pad doesn't exist (anymore)
-        if int(row.status) <= 1:
-            return True  # pad got unpublished
-        res = sanity_check(f"{row.full_text}")
-        if not res:
-            return True  # empty pad
-        title = get_title(row.title)
-        if title:
-            res = f"{title}\n\n{res}"
-        return not res.strip()
+            PadTable.id, PadTable.status, PadTable.full_text, PadTable.title)
+        stmt = stmt.where(PadTable.id.in_(doc_ids))
+        rows = {int(row.id): row for row in session.execute(stmt)}
+        return {
+            doc_id: convert_is_remove_pad(rows.get(doc_id))
+            for doc_id in doc_ids
+        }
 
 
-def is_remove_blog(db: DBConnector, doc_id: int) -> bool:
+def convert_is_remove_blog(row: Any) -> bool:
     """
-    Whether a document got removed from a blog database.
+    Whether a document got removed from a blog database from its database
+    row.
 
     Args:
-        db (DBConnector): The blog's database connector.
-        doc_id (int): The document id.
+        row (Any): The database row or None if the document doesn't exist.
 
     Returns:
         bool: True, if the document was removed.
     """
+    if row is None:
+        return True  # doc doesn't exist (anymore)
+    if int(row.relevance) <= 1:
+        return True  # doc not relevant (anymore)
+    content = sanity_check(f"{row.content}".strip())
+    if not content:
+        return True  # empty content
+    title = get_title(row.title)
+    if title:
+        content = f"{title}\n\n{content}"
+    return not content.strip()
+
+
+def is_removes_blog(db: DBConnector, doc_ids: list[int]) -> dict[int, bool]:
+    """
+    Whether documents got removed from a blog database.
+
+    Args:
+        db (DBConnector): The blog's database connector.
+        doc_ids (list[int]): The document ids.
+
+    Returns:
+        dict[int, bool]: For each document id, True, if the document was
+            removed.
+    """
     with db.get_session() as session:
         stmt = sa.select(
             ArticlesTable.id,
@@ -226,19 +386,12 @@ def is_remove_blog(db: DBConnector, doc_id: int) -> bool:
             ArticleContentTable.content)
         stmt = stmt.where(sa.and_(
             ArticleContentTable.article_id == ArticlesTable.id,
-            ArticlesTable.id == doc_id))
-        row = session.execute(stmt).one_or_none()
-        if row is None:
-            return True  # doc doesn't exist (anymore)
-        if int(row.relevance) <= 1:
-            return True  # doc not relevant (anymore)
-        content = sanity_check(f"{row.content}".strip())
-        if not content:
-            return True  # empty content
-        title = get_title(row.title)
-        if title:
-            content = f"{title}\n\n{content}"
-        return not content.strip()
+            ArticlesTable.id.in_(doc_ids)))
+        rows = {int(row.id): row for row in session.execute(stmt)}
+        return {
+            doc_id: convert_is_remove_blog(rows.get(doc_id))
+            for doc_id in doc_ids
+        }
 
 
 def create_is_remove(
@@ -254,38 +407,61 @@ def create_is_remove(
     Returns:
         IsRemoveFn: The function.
     """
+    get_is_removes = create_is_removes(platforms, blogs)
 
     def get_is_remove(main_id: str) -> tuple[bool, str | None]:
-        try:
-            base, doc_id = get_base_doc(main_id)
-            pdb = platforms.get(base)
-            bdb = blogs.get(base)
-            if pdb is not None:
-                is_remove = is_remove_pad(pdb, doc_id)
-                res: tuple[bool, str | None] = (is_remove, None)
-            elif bdb is not None:
-                is_remove = is_remove_blog(bdb, doc_id)
-                res = (is_remove, None)
-            else:
-                res = (False, f"unknown {base=}")
-        except Exception:  # pylint: disable=broad-exception-caught
-            res = (False, traceback.format_exc())
-        return res
+        return get_is_removes([main_id])[0]
 
     return get_is_remove
 
 
-def read_pad(
-        db: DBConnector,
+def create_is_removes(
+        platforms: dict[str, DBConnector],
+        blogs: dict[str, DBConnector]) -> IsRemovesFn:
+    """
+    Creates a function to check whether multiple documents got removed at
+    once.
+
+    Args:
+        platforms (dict[str, DBConnector]): The platforms' database connectors.
+        blogs (dict[str, DBConnector]): The blogs' database connectors.
+
+    Returns:
+        IsRemovesFn: The function.
+    """
+
+    def as_remove_error(error: str) -> tuple[bool, str | None]:
+        return (False, error)
+
+    def get_is_removes(main_ids: list[str]) -> list[tuple[bool, str | None]]:
+        return batch_by_base(
+            main_ids,
+            platforms,
+            blogs,
+            read_pads=lambda db, _, doc_ids: {
+                doc_id: (is_remove, None)
+                for doc_id, is_remove in is_removes_pad(db, doc_ids).items()
+            },
+            read_blogs=lambda db, _, doc_ids: {
+                doc_id: (is_remove, None)
+                for doc_id, is_remove in is_removes_blog(db, doc_ids).items()
+            },
+            on_error=as_remove_error)
+
+    return get_is_removes
+
+
+def convert_pad(
+        row: Any,
         doc_id: int,
         *,
         combine_title: bool,
         ignore_unpublished: bool) -> tuple[str | None, str | None]:
     """
-    Get the full text of a pad.
+    Get the full text of a pad from its database row.
 
     Args:
-        db (DBConnector): The platform's database connector.
+        row (Any): The database row or None if the pad doesn't exist.
         doc_id (int): The pad id.
         combine_title (bool): Whether to combine the title with the full text.
         ignore_unpublished (bool): Whether to ignore unpublished pads.
@@ -293,33 +469,63 @@ def read_pad(
     Returns:
         tuple[str | None, str | None]: The full text or the error.
     """
-    with db.get_session() as session:
-        stmt = sa.select(
-            PadTable.status, PadTable.full_text, PadTable.title)
-        stmt = stmt.where(PadTable.id == doc_id)
-        row = session.execute(stmt).one_or_none()
-        if row is None:
-            return (None, f"could not find {doc_id=}")
-        if ignore_unpublished and int(row.status) <= 1:
-            return (None, "pad is unpublished")
-        res = sanity_check(f"{row.full_text}")
-        title = get_title(row.title)
-        if combine_title and title:
-            res = f"{title}\n\n{res}"
-        return (res, None)
+    if row is None:
+        return (None, f"could not find {doc_id=}")
+    if ignore_unpublished and int(row.status) <= 1:
+        return (None, "pad is unpublished")
+    res = sanity_check(f"{row.full_text}")
+    title = get_title(row.title)
+    if combine_title and title:
+        res = f"{title}\n\n{res}"
+    return (res, None)
+
+
+def read_pads(
+        db: DBConnector,
+        doc_ids: list[int],
+        *,
+        combine_title: bool,
+        ignore_unpublished: bool,
+        ) -> dict[int, tuple[str | None, str | None]]:
+    """
+    Get the full texts of multiple pads.
 
+    Args:
+        db (DBConnector): The platform's database connector.
+        doc_ids (list[int]): The pad ids.
+        combine_title (bool): Whether to combine the title with the full text.
+        ignore_unpublished (bool): Whether to ignore unpublished pads.
 
-def read_blog(
-        db: DBConnector,
+    Returns:
+        dict[int, tuple[str | None, str | None]]: The full text or the error
+            for each pad id.
+    """
+    with db.get_session() as session:
+        stmt = sa.select(
+            PadTable.id, PadTable.status, PadTable.full_text, PadTable.title)
+        stmt = stmt.where(PadTable.id.in_(doc_ids))
+        rows = {int(row.id): row for row in session.execute(stmt)}
+        return {
+            doc_id: convert_pad(
+                rows.get(doc_id),
+                doc_id,
+                combine_title=combine_title,
+                ignore_unpublished=ignore_unpublished)
+            for doc_id in doc_ids
+        }
+
+
+def convert_blog(
+        row: Any,
         doc_id: int,
         *,
         combine_title: bool,
         ignore_unpublished: bool) -> tuple[str | None, str | None]:
     """
-    Get the full text of a blog database document.
+    Get the full text of a blog database document from its database row.
 
     Args:
-        db (DBConnector): The blog's database connector.
+        row (Any): The database row or None if the document doesn't exist.
         doc_id (int): The document id.
         combine_title (bool): Whether to combine the title into the full text.
         ignore_unpublished (bool): Whether to ignore unpublished documents.
@@ -327,6 +533,39 @@ def read_blog(
     Returns:
         tuple[str | None, str | None]: The full text or the error.
     """
+    if row is None:
+        return (None, f"could not find {doc_id=}")
+    if ignore_unpublished and int(row.relevance) <= 1:
+        return (None, "article not relevant")
+    content = sanity_check(f"{row.content}".strip())
+    if not content:
+        return (None, "empty content")
+    title = get_title(row.title)
+    if combine_title and title:
+        content = f"{title}\n\n{content}"
+    return (content, None)
+
+
+def read_blogs(
+        db: DBConnector,
+        doc_ids: list[int],
+        *,
+        combine_title: bool,
+        ignore_unpublished: bool,
+        ) -> dict[int, tuple[str | None, str | None]]:
+    """
+    Get the full texts of multiple blog database documents.
+
+    Args:
+        db (DBConnector): The blog's database connector.
+        doc_ids (list[int]): The document ids.
+        combine_title (bool): Whether to combine the title into the full text.
+        ignore_unpublished (bool): Whether to ignore unpublished documents.
+
+    Returns:
+        dict[int, tuple[str | None, str | None]]: The full text or the error
+            for each document id.
+    """
     with db.get_session() as session:
         stmt = sa.select(
             ArticlesTable.id,
@@ -336,19 +575,16 @@ def read_blog(
             ArticleContentTable.content)
         stmt = stmt.where(sa.and_(
             ArticleContentTable.article_id == ArticlesTable.id,
-            ArticlesTable.id == doc_id))
-        row = session.execute(stmt).one_or_none()
-        if row is None:
-            return (None, f"could not find {doc_id=}")
-        if ignore_unpublished and int(row.relevance) <= 1:
-            return (None, "article not relevant")
-        content = sanity_check(f"{row.content}".strip())
-        if not content:
-            return (None, "empty content")
-        title = get_title(row.title)
-        if combine_title and title:
-            content = f"{title}\n\n{content}"
-        return (content, None)
+            ArticlesTable.id.in_(doc_ids)))
+        rows = {int(row.id): row for row in session.execute(stmt)}
+        return {
+            doc_id: convert_blog(
+                rows.get(doc_id),
+                doc_id,
+                combine_title=combine_title,
+                ignore_unpublished=ignore_unpublished)
+            for doc_id in doc_ids
+        }
 
 
 FULL_TEXT_LRU: LRU[str, tuple[str | None, str | None]] = LRU(100)
@@ -375,35 +611,70 @@ def create_full_text(
         FullTextFn: The function.
     """
 
+    get_full_texts = create_full_texts(
+        platforms,
+        blogs,
+        combine_title=combine_title,
+        ignore_unpublished=ignore_unpublished)
+
     def get_full_text(main_id: str) -> tuple[str | None, str | None]:
+        return get_full_texts([main_id])[0]
+
+    return get_full_text
+
+
+def create_full_texts(
+        platforms: dict[str, DBConnector],
+        blogs: dict[str, DBConnector],
+        *,
+        combine_title: bool,
+        ignore_unpublished: bool,
+        ) -> FullTextsFn:
+    """
+    Creates a function to retrieve the full texts of multiple documents at
+    once. Results are shared with `create_full_text` via the LRU cache.
+
+    Args:
+        platforms (dict[str, DBConnector]): The platforms' database connectors.
+        blogs (dict[str, DBConnector]): The blogs' database connectors.
+        combine_title (bool): Whether to combine the title into the full text.
+        ignore_unpublished (bool): Whether to ignore unpublished documents.
+
+    Returns:
+        FullTextsFn: The function.
+    """
+
+    def get_full_texts(
+            main_ids: list[str]) -> list[tuple[str | None, str | None]]:
         lru = FULL_TEXT_LRU
-        res = lru.get(main_id)
-        if res is None:
-            try:
-                base, doc_id = get_base_doc(main_id)
-                pdb = platforms.get(base)
-                bdb = blogs.get(base)
-                if pdb is not None:
-                    res = read_pad(
-                        pdb,
-                        doc_id,
+        cached: dict[str, tuple[str | None, str | None]] = {}
+        for main_id in main_ids:
+            res = lru.get(main_id)
+            if res is not None:
+                cached[main_id] = res
+        missing = [main_id for main_id in main_ids if main_id not in cached]
+        if missing:
+            for main_id, res in zip(missing, batch_by_base(
+                    missing,
+                    platforms,
+                    blogs,
+                    read_pads=lambda db, _, doc_ids: read_pads(
+                        db,
+                        doc_ids,
                         combine_title=combine_title,
-                        ignore_unpublished=ignore_unpublished)
-                elif bdb is not None:
-                    res = read_blog(
-                        bdb,
-                        doc_id,
+                        ignore_unpublished=ignore_unpublished),
+                    read_blogs=lambda db, _, doc_ids: read_blogs(
+                        db,
+                        doc_ids,
                         combine_title=combine_title,
-                        ignore_unpublished=ignore_unpublished)
-                else:
-                    res = (None, f"unknown {base=}")
-            except Exception:  # pylint: disable=broad-exception-caught
-                res = (None, traceback.format_exc())
-            if res[0] is not None:
-                lru.set(main_id, res)
-        return res
+                        ignore_unpublished=ignore_unpublished),
+                    on_error=as_error)):
+                cached[main_id] = res
+                if res[0] is not None:
+                    lru.set(main_id, res)
+        return [cached[main_id] for main_id in main_ids]
 
-    return get_full_text
+    return get_full_texts
 
 
 PLATFORM_URLS: dict[str, str] = {
@@ -416,20 +687,20 @@ PLATFORM_URLS: dict[str, str] = {
 """Base URLs of the platforms."""
 
 
-def get_url_title_pad(
-        db: DBConnector,
-        base: str,
+def convert_url_title_pad(
+        row: Any,
+        url_base: str,
         doc_id: int,
         *,
         ignore_unpublished: bool,
         is_logged_in: bool,
         ) -> tuple[tuple[str, str | None] | None, str | None]:
     """
-    Get the URL and title of a pad.
+    Get the URL and title of a pad from its database row.
 
     Args:
-        db (DBConnector): The platform's database connector.
-        base (str): The base.
+        row (Any): The database row or None if the pad doesn't exist.
+        url_base (str): The base URL of the platform.
         doc_id (int): The pad id.
         ignore_unpublished (bool): Whether to ignore unpublished pads.
         is_logged_in (bool): Whether the requestor is logged in.
@@ -438,39 +709,71 @@ def get_url_title_pad(
         tuple[tuple[str, str | None] | None, str | None]: The title and URL or
             the error.
     """
+    if row is None:
+        return (None, f"could not find {doc_id=}")
+    status_int = int(row.status)
+    if ignore_unpublished and status_int <= 1:
+        return (None, "pad is unpublished")
+    status = STATUS_MAP.get(status_int)
+    if status is None:
+        return (None, f"invalid {status_int=}")
+    if not is_logged_in and status != "public":
+        return (None, "no access")
+    title = get_title(row.title)
+    return ((f"{url_base}{doc_id}", title), None)
+
+
+def get_url_titles_pad(
+        db: DBConnector,
+        base: str,
+        doc_ids: list[int],
+        *,
+        ignore_unpublished: bool,
+        is_logged_in: bool,
+        ) -> dict[int, tuple[tuple[str, str | None] | None, str | None]]:
+    """
+    Get the URLs and titles of multiple pads.
+
+    Args:
+        db (DBConnector): The platform's database connector.
+        base (str): The base.
+        doc_ids (list[int]): The pad ids.
+        ignore_unpublished (bool): Whether to ignore unpublished pads.
+        is_logged_in (bool): Whether the requestor is logged in.
+
+    Returns:
+        dict[int, tuple[tuple[str, str | None] | None, str | None]]: The title
+            and URL or the error for each pad id.
+    """
     url_base = PLATFORM_URLS.get(base)
     if url_base is None:
-        return (None, f"unknown {base=}")
-    url = f"{url_base}{doc_id}"
+        return {doc_id: (None, f"unknown {base=}") for doc_id in doc_ids}
     with db.get_session() as session:
-        stmt = sa.select(PadTable.status, PadTable.title)
-        stmt = stmt.where(PadTable.id == doc_id)
-        row = session.execute(stmt).one_or_none()
-        if row is None:
-            return (None, f"could not find {doc_id=}")
-        status_int = int(row.status)
-        if ignore_unpublished and status_int <= 1:
-            return (None, "pad is unpublished")
-        status = STATUS_MAP.get(status_int)
-        if status is None:
-            return (None, f"invalid {status_int=}")
-        if not is_logged_in and status != "public":
-            return (None, "no access")
-        title = get_title(row.title)
-        return ((url, title), None)
-
-
-def get_url_title_blog(
-        db: DBConnector,
+        stmt = sa.select(PadTable.id, PadTable.status, PadTable.title)
+        stmt = stmt.where(PadTable.id.in_(doc_ids))
+        rows = {int(row.id): row for row in session.execute(stmt)}
+        return {
+            doc_id: convert_url_title_pad(
+                rows.get(doc_id),
+                url_base,
+                doc_id,
+                ignore_unpublished=ignore_unpublished,
+                is_logged_in=is_logged_in)
+            for doc_id in doc_ids
+        }
+
+
+def convert_url_title_blog(
+        row: Any,
         doc_id: int,
         *,
         ignore_unpublished: bool,
         ) -> tuple[tuple[str, str | None] | None, str | None]:
     """
-    Get the URL and title of a blog database document.
+    Get the URL and title of a blog database document from its database row.
 
     Args:
-        db (DBConnector): The blog's database connector.
+        row (Any): The database row or None if the document doesn't exist.
         doc_id (int): The document id.
         ignore_unpublished (bool): Whether to ignore unpublished documents.
 
@@ -478,21 +781,77 @@ def get_url_title_blog(
         tuple[tuple[str, str | None] | None, str | None]: The URL and title or
             the error.
     """
+    if row is None:
+        return (None, f"could not find {doc_id=}")
+    if ignore_unpublished and int(row.relevance) <= 1:
+        return (None, "article not relevant")
+    url = f"{row.url}"
+    title = get_title(row.title)
+    return ((url, title), None)
+
+
+def get_url_titles_blog(
+        db: DBConnector,
+        doc_ids: list[int],
+        *,
+        ignore_unpublished: bool,
+        ) -> dict[int, tuple[tuple[str, str | None] | None, str | None]]:
+    """
+    Get the URLs and titles of multiple blog database documents.
+
+    Args:
+        db (DBConnector): The blog's database connector.
+        doc_ids (list[int]): The document ids.
+        ignore_unpublished (bool): Whether to ignore unpublished documents.
+
+    Returns:
+        dict[int, tuple[tuple[str, str | None] | None, str | None]]: The URL
+            and title or the error for each document id.
+    """
     with db.get_session() as session:
         stmt = sa.select(
             ArticlesTable.id,
             ArticlesTable.url,
             ArticlesTable.title,
             ArticlesTable.relevance)
-        stmt = stmt.where(ArticlesTable.id == doc_id)
-        row = session.execute(stmt).one_or_none()
-        if row is None:
-            return (None, f"could not find {doc_id=}")
-        if ignore_unpublished and int(row.relevance) <= 1:
-            return (None, "article not relevant")
-        url = f"{row.url}"
-        title = get_title(row.title)
-        return ((url, title), None)
+        stmt = stmt.where(ArticlesTable.id.in_(doc_ids))
+        rows = {int(row.id): row for row in session.execute(stmt)}
+        return {
+            doc_id: convert_url_title_blog(
+                rows.get(doc_id),
+                doc_id,
+                ignore_unpublished=ignore_unpublished)
+            for doc_id in doc_ids
+        }
+
+
+def infer_title(
+        input_str: str | None,
+        input_error: str | None) -> tuple[str | None, str | None]:
+    """
+    Infers the title of a document from its full text.
+
+    Args:
+        input_str (str | None): The full text or None.
+        input_error (str | None): The error if the full text could not be
+            retrieved.
+
+    Returns:
+        tuple[str | None, str | None]: The title or the error.
+    """
+    if input_str is None:
+        return (
+            None,
+            f"could not retrieve full text to infer title: {input_error}",
+        )
+    title_loc = maybe_first(snippify_text(
+        input_str,
+        chunk_size=TITLE_CHUNK_SIZE,
+        chunk_padding=CHUNK_PADDING))
+    if title_loc is None:
+        return (None, f"cannot infer title for {input_str=}")
+    title, _ = title_loc
+    return (title, None)
 
 
 def create_url_title(
@@ -515,121 +874,177 @@ def create_url_title(
         UrlTitleFn: The function.
     """
 
+    get_url_titles = create_url_titles(
+        platforms,
+        blogs,
+        get_full_texts=lambda main_ids: [
+            get_full_text(main_id) for main_id in main_ids
+        ],
+        ignore_unpublished=ignore_unpublished)
+
     def get_url_title(
             main_id: str,
             *,
             is_logged_in: bool,
             ) -> tuple[tuple[str, str] | None, str | None]:
-        try:
-            base, doc_id = get_base_doc(main_id)
-            pdb = platforms.get(base)
-            bdb = blogs.get(base)
-            if pdb is not None:
-                res = get_url_title_pad(
-                    pdb,
-                    base,
-                    doc_id,
-                    ignore_unpublished=ignore_unpublished,
-                    is_logged_in=is_logged_in)
-            elif bdb is not None:
-                res = get_url_title_blog(
-                    bdb,
-                    doc_id,
-                    ignore_unpublished=ignore_unpublished)
-            else:
-                res = (None, f"unknown {base=}")
-        except Exception:  # pylint: disable=broad-exception-caught
-            res = (None, traceback.format_exc())
-        urltitle, error = res
-        if urltitle is not None:
+        return get_url_titles([main_id], is_logged_in=is_logged_in)[0]
+
+    return get_url_title
+
+
+def create_url_titles(
+        platforms: dict[str, DBConnector],
+        blogs: dict[str, DBConnector],
+        *,
+        get_full_texts: FullTextsFn,
+        ignore_unpublished: bool) -> UrlTitlesFn:
+    """
+    Create a function to get the URLs and titles of multiple documents at
+    once.
+
+    Args:
+        platforms (dict[str, DBConnector]): The platforms' database connectors.
+        blogs (dict[str, DBConnector]): The blogs' database connectors.
+        get_full_texts (FullTextsFn): The full text function for inferring
+            titles from the content.
+        ignore_unpublished (bool): Whether to ignore unpublished documents.
+
+    Returns:
+        UrlTitlesFn: The function.
+    """
+
+    def get_url_titles(
+            main_ids: list[str],
+            *,
+            is_logged_in: bool,
+            ) -> list[tuple[tuple[str, str] | None, str | None]]:
+        results = batch_by_base(
+            main_ids,
+            platforms,
+            blogs,
+            read_pads=lambda db, base, doc_ids: get_url_titles_pad(
+                db,
+                base,
+                doc_ids,
+                ignore_unpublished=ignore_unpublished,
+                is_logged_in=is_logged_in),
+            read_blogs=lambda db, _, doc_ids: get_url_titles_blog(
+                db,
+                doc_ids,
+                ignore_unpublished=ignore_unpublished),
+            on_error=as_error)
+        infer_ixs = [
+            ix
+            for ix, (urltitle, _) in enumerate(results)
+            if urltitle is not None and urltitle[1] is None
+        ]
+        full_texts = get_full_texts([main_ids[ix] for ix in infer_ixs])
+        inferred = dict(zip(infer_ixs, full_texts))
+        res: list[tuple[tuple[str, str] | None, str | None]] = []
+        for ix, (urltitle, error) in enumerate(results):
+            if urltitle is None:
+                res.append((None, error))
+                continue
             url, title = urltitle
             if title is None:
-                input_str, input_error = get_full_text(main_id)
-                if input_str is None:
-                    return (
-                        None,
-                        "could not retrieve full text to "
-                        f"infer title: {input_error}",
-                    )
-                title_loc = maybe_first(snippify_text(
-                    input_str,
-                    chunk_size=TITLE_CHUNK_SIZE,
-                    chunk_padding=CHUNK_PADDING))
-                if title_loc is None:
-                    return (None, f"cannot infer title for {input_str=}")
-                title, _ = title_loc
-            urltitle = (url, title)
-        return (urltitle, error)
+                title, title_error = infer_title(*inferred[ix])
+                if title is None:
+                    res.append((None, title_error))
+                    continue
+            res.append(((url, title), error))
+        return res
 
-    return get_url_title
+    return get_url_titles
 
 
-def get_tag_pad(
+def get_tags_pad(
         login_db: DBConnector,
         db: DBConnector,
-        doc_id: int,
+        doc_ids: list[int],
         *,
         ignore_unpublished: bool,
-        ) -> tuple[str | None, str]:
+        ) -> dict[int, tuple[str | None, str]]:
     """
-    Get the tag (i.e., country) of a pad.
+    Get the tags (i.e., countries) of multiple pads. The owners of all pads
+    are looked up with a single query.
 
     Args:
         login_db (DBConnector): The login database connector.
         db (DBConnector): The platform's database connector.
-        doc_id (int): The pad id.
+        doc_ids (list[int]): The pad ids.
         ignore_unpublished (bool): Whether to ignore unpublished pads.
 
     Returns:
-        tuple[str | None, str]: The tag or None or the error.
+        dict[int, tuple[str | None, str]]: The tag or None or the error for
+            each pad id.
     """
+    res: dict[int, tuple[str | None, str]] = {}
+    owners: dict[int, Any] = {}
     with db.get_session() as session:
-        stmt = sa.select(PadTable.status, PadTable.owner)
-        stmt = stmt.where(PadTable.id == doc_id)
-        row = session.execute(stmt).one_or_none()
+        stmt = sa.select(PadTable.id, PadTable.status, PadTable.owner)
+        stmt = stmt.where(PadTable.id.in_(doc_ids))
+        rows = {int(row.id): row for row in session.execute(stmt)}
+    for doc_id in doc_ids:
+        row = rows.get(doc_id)
         if row is None:
-            return (None, f"could not find {doc_id=}")
-        if ignore_unpublished and int(row.status) <= 1:
-            return (None, "pad is unpublished")
-        user_id = row.owner
+            res[doc_id] = (None, f"could not find {doc_id=}")
+        elif ignore_unpublished and int(row.status) <= 1:
+            res[doc_id] = (None, "pad is unpublished")
+        else:
+            owners[doc_id] = row.owner
+    if not owners:
+        return res
     with login_db.get_session() as lsession:
-        stmt = sa.select(UsersTable.iso3)
-        stmt = stmt.where(UsersTable.uuid == user_id)
-        row = lsession.execute(stmt).one_or_none()
-        if row is None:
-            return (None, f"could not find {user_id=}")
-        return (row.iso3, "retrieved from users.iso3")
+        lstmt = sa.select(UsersTable.uuid, UsersTable.iso3)
+        lstmt = lstmt.where(UsersTable.uuid.in_(set(owners.values())))
+        iso3s = {
+            f"{lrow.uuid}": lrow.iso3
+            for lrow in lsession.execute(lstmt)
+        }
+    for doc_id, user_id in owners.items():
+        key = f"{user_id}"
+        if key not in iso3s:
+            res[doc_id] = (None, f"could not find {user_id=}")
+        else:
+            res[doc_id] = (iso3s[key], "retrieved from users.iso3")
+    return res
 
 
-def get_tag_blog(
+def get_tags_blog(
         db: DBConnector,
-        doc_id: int,
+        doc_ids: list[int],
         *,
         ignore_unpublished: bool,
-        ) -> tuple[str | None, str]:
+        ) -> dict[int, tuple[str | None, str]]:
     """
-    Get the tag (i.e., country) of a blog database document.
+    Get the tags (i.e., countries) of multiple blog database documents.
 
     Args:
         db (DBConnector): The blog's database connector.
-        doc_id (int): The document id.
+        doc_ids (list[int]): The document ids.
         ignore_unpublished (bool): Whether to ignore unpublished documents.
 
     Returns:
-        tuple[str | None, str]: The tag or None or the error.
+        dict[int, tuple[str | None, str]]: The tag or None or the error for
+            each document id.
     """
     with db.get_session() as session:
         stmt = sa.select(
             ArticlesTable.id,
             ArticlesTable.iso3,
             ArticlesTable.relevance)
-        stmt = stmt.where(ArticlesTable.id == doc_id)
-        row = session.execute(stmt).one_or_none()
+        stmt = stmt.where(ArticlesTable.id.in_(doc_ids))
+        rows = {int(row.id): row for row in session.execute(stmt)}
+    res: dict[int, tuple[str | None, str]] = {}
+    for doc_id in doc_ids:
+        row = rows.get(doc_id)
         if row is None:
-            return (None, f"could not find {doc_id=}")
-        if ignore_unpublished and int(row.relevance) <= 1:
-            return (None, "article not relevant")
-        return (row.iso3, "retrieved from articles.iso3")
+            res[doc_id] = (None, f"could not find {doc_id=}")
+        elif ignore_unpublished and int(row.relevance) <= 1:
+            res[doc_id] = (None, "article not relevant")
+        else:
+            res[doc_id] = (row.iso3, "retrieved from articles.iso3")
+    return res
 
 
 def create_tag_fn(
@@ -649,32 +1064,52 @@ def create_tag_fn(
         TagFn: The function.
     """
 
+    get_tags = create_tags_fn(
+        platforms, blogs, ignore_unpublished=ignore_unpublished)
+
     def get_tag(main_id: str) -> tuple[str | None, str]:
-        try:
-            base, doc_id = get_base_doc(main_id)
-            pdb = platforms.get(base)
-            bdb = blogs.get(base)
-            if pdb is not None:
-                login_db = platforms["login"]
-                res = get_tag_pad(
-                    login_db,
-                    pdb,
-                    doc_id,
-                    ignore_unpublished=ignore_unpublished)
-            elif bdb is not None:
-                res = get_tag_blog(
-                    bdb,
-                    doc_id,
-                    ignore_unpublished=ignore_unpublished)
-            else:
-                res = (None, f"unknown {base=}")
-        except Exception:  # pylint: disable=broad-exception-caught
-            res = (None, traceback.format_exc())
-        return res
+        return get_tags([main_id])[0]
 
     return get_tag
 
 
+def create_tags_fn(
+        platforms: dict[str, DBConnector],
+        blogs: dict[str, DBConnector],
+        *,
+        ignore_unpublished: bool) -> TagsFn:
+    """
+    Create a function to get the tags (i.e., countries) of multiple documents
+    at once.
+
+    Args:
+        platforms (dict[str, DBConnector]): The platforms' database connectors.
+        blogs (dict[str, DBConnector]): The blogs' database connectors.
+        ignore_unpublished (bool): Whether to ignore unpublished documents.
+
+    Returns:
+        TagsFn: The function.
+    """
+
+    def get_tags(main_ids: list[str]) -> list[tuple[str | None, str]]:
+        return batch_by_base(
+            main_ids,
+            platforms,
+            blogs,
+            read_pads=lambda db, _, doc_ids: get_tags_pad(
+                platforms["login"],
+                db,
+                doc_ids,
+                ignore_unpublished=ignore_unpublished),
+            read_blogs=lambda db, _, doc_ids: get_tags_blog(
+                db,
+                doc_ids,
+                ignore_unpublished=ignore_unpublished),
+            on_error=as_error)
+
+    return get_tags
+
+
 DOC_TYPES: dict[str, str] = {
     "solution": "solution",
     "actionplan": "action plan",
@@ -690,18 +1125,20 @@ STATUS_MAP: dict[int, DocStatus] = {
 """Status integer to string."""
 
 
-def get_status_date_type_pad(
-        db: DBConnector,
+def convert_status_date_type_pad(
+        row: Any,
+        doc_type: str | None,
         base: str,
         doc_id: int,
         *,
         ignore_unpublished: bool,
         ) -> tuple[tuple[DocStatus, str | None, str] | None, str | None]:
     """
-    Get the status, date, and type of a pad.
+    Get the status, date, and type of a pad from its database row.
 
     Args:
-        db (DBConnector): The platform's database connector.
+        row (Any): The database row or None if the pad doesn't exist.
+        doc_type (str | None): The document type of the base.
         base (str): The base.
         doc_id (int): The pad id.
         ignore_unpublished (bool): Whether to ignore unpublished pads.
@@ -710,39 +1147,72 @@ def get_status_date_type_pad(
         tuple[tuple[DocStatus, str | None, str] | None, str | None]: The
             status, date or None, and type or the error.
     """
-    with db.get_session() as session:
-        stmt = sa.select(PadTable.status, PadTable.update_at)
-        stmt = stmt.where(PadTable.id == doc_id)
-        row = session.execute(stmt).one_or_none()
-        if row is None:
-            return (None, f"could not find {doc_id=}")
-        status_int = int(row.status)
-        if ignore_unpublished and status_int <= 1:
-            return (None, "pad is unpublished")
-        doc_type = DOC_TYPES.get(base)
-        if doc_type is None:
-            return (None, f"{base} is not supported!")
-        if row.update_at:
-            date = datetime.fromisoformat(f"{row.update_at}").isoformat()
-        else:
-            date = None
-        status = STATUS_MAP.get(status_int)
-        if status is None:
-            return (None, f"invalid {status_int=}")
-        return ((status, date, doc_type), None)
+    if row is None:
+        return (None, f"could not find {doc_id=}")
+    status_int = int(row.status)
+    if ignore_unpublished and status_int <= 1:
+        return (None, "pad is unpublished")
+    if doc_type is None:
+        return (None, f"{base} is not supported!")
+    if row.update_at:
+        date = datetime.fromisoformat(f"{row.update_at}").isoformat()
+    else:
+        date = None
+    status = STATUS_MAP.get(status_int)
+    if status is None:
+        return (None, f"invalid {status_int=}")
+    return ((status, date, doc_type), None)
+
+
+def get_status_date_types_pad(
+        db: DBConnector,
+        base: str,
+        doc_ids: list[int],
+        *,
+        ignore_unpublished: bool,
+        ) -> dict[
+            int, tuple[tuple[DocStatus, str | None, str] | None, str | None]]:
+    """
+    Get the status, date, and type of multiple pads.
 
+    Args:
+        db (DBConnector): The platform's database connector.
+        base (str): The base.
+        doc_ids (list[int]): The pad ids.
+        ignore_unpublished (bool): Whether to ignore unpublished pads.
 
-def get_status_date_type_blog(
-        db: DBConnector,
+    Returns:
+        dict[int, tuple[tuple[DocStatus, str | None, str] | None, str | None]]:
+            The status, date or None, and type or the error for each pad id.
+    """
+    doc_type = DOC_TYPES.get(base)
+    with db.get_session() as session:
+        stmt = sa.select(PadTable.id, PadTable.status, PadTable.update_at)
+        stmt = stmt.where(PadTable.id.in_(doc_ids))
+        rows = {int(row.id): row for row in session.execute(stmt)}
+        return {
+            doc_id: convert_status_date_type_pad(
+                rows.get(doc_id),
+                doc_type,
+                base,
+                doc_id,
+                ignore_unpublished=ignore_unpublished)
+            for doc_id in doc_ids
+        }
+
+
+def convert_status_date_type_blog(
+        row: Any,
         doc_id: int,
         *,
         ignore_unpublished: bool,
         ) -> tuple[tuple[DocStatus, str | None, str] | None, str | None]:
     """
-    Get the status, date, and type of a blog database document.
+    Get the status, date, and type of a blog database document from its
+    database row.
 
     Args:
-        db (DBConnector): The blog's database connector.
+        row (Any): The database row or None if the document doesn't exist.
         doc_id (int): The document id.
         ignore_unpublished (bool): Whether to ignore unpublished documents.
 
@@ -750,6 +1220,47 @@ def get_status_date_type_blog(
         tuple[tuple[DocStatus, str | None, str] | None, str | None]: The
             status, date or None, and type or the error.
     """
+    if row is None:
+        return (None, f"could not find {doc_id=}")
+    if ignore_unpublished and int(row.relevance) <= 1:
+        return (None, "article not relevant")
+    status: DocStatus = "public"
+    if row.posted_date:
+        date: str | None = datetime.fromisoformat(
+            f"{row.posted_date}").isoformat()
+    else:
+        lnc, _ = create_length_counter()
+        date_res = extract_date(
+            row.raw_html,
+            posted_date_str=row.posted_date_str,
+            language=None,
+            use_date_str=True,
+            lnc=lnc)
+        date = None if date_res is None else fmt_time(date_res)
+    doc_type = f"{row.article_type}"
+    return ((status, date, doc_type), None)
+
+
+def get_status_date_types_blog(
+        db: DBConnector,
+        doc_ids: list[int],
+        *,
+        ignore_unpublished: bool,
+        ) -> dict[
+            int, tuple[tuple[DocStatus, str | None, str] | None, str | None]]:
+    """
+    Get the status, date, and type of multiple blog database documents.
+
+    Args:
+        db (DBConnector): The blog's database connector.
+        doc_ids (list[int]): The document ids.
+        ignore_unpublished (bool): Whether to ignore unpublished documents.
+
+    Returns:
+        dict[int, tuple[tuple[DocStatus, str | None, str] | None, str | None]]:
+            The status, date or None, and type or the error for each document
+            id.
+    """
     with db.get_session() as session:
         stmt = sa.select(
             ArticlesTable.id,
@@ -759,28 +1270,16 @@ def get_status_date_type_blog(
             ArticlesTable.relevance,
             ArticlesRawHTMLTable.raw_html)
         stmt = stmt.where(sa.and_(
-            ArticlesTable.id == doc_id,
+            ArticlesTable.id.in_(doc_ids),
             ArticlesTable.id == ArticlesRawHTMLTable.article_id))
-        row = session.execute(stmt).one_or_none()
-        if row is None:
-            return (None, f"could not find {doc_id=}")
-        if ignore_unpublished and int(row.relevance) <= 1:
-            return (None, "article not relevant")
-        status: DocStatus = "public"
-        if row.posted_date:
-            date: str | None = datetime.fromisoformat(
-                f"{row.posted_date}").isoformat()
-        else:
-            lnc, _ = create_length_counter()
-            date_res = extract_date(
-                row.raw_html,
-                posted_date_str=row.posted_date_str,
-                language=None,
-                use_date_str=True,
-                lnc=lnc)
-            date = None if date_res is None else fmt_time(date_res)
-        doc_type = f"{row.article_type}"
-        return ((status, date, doc_type), None)
+        rows = {int(row.id): row for row in session.execute(stmt)}
+        return {
+            doc_id: convert_status_date_type_blog(
+                rows.get(doc_id),
+                doc_id,
+                ignore_unpublished=ignore_unpublished)
+            for doc_id in doc_ids
+        }
 
 
 def create_status_date_type(
@@ -800,28 +1299,52 @@ def create_status_date_type(
         StatusDateTypeFn: The function.
     """
 
+    get_status_date_types = create_status_date_types(
+        platforms, blogs, ignore_unpublished=ignore_unpublished)
+
     def get_status_date_type(
             main_id: str,
             ) -> tuple[tuple[DocStatus, str | None, str] | None, str | None]:
-        try:
-            base, doc_id = get_base_doc(main_id)
-            pdb = platforms.get(base)
-            bdb = blogs.get(base)
-            if pdb is not None:
-                res = get_status_date_type_pad(
-                    pdb,
-                    base,
-                    doc_id,
-                    ignore_unpublished=ignore_unpublished)
-            elif bdb is not None:
-                res = get_status_date_type_blog(
-                    bdb,
-                    doc_id,
-                    ignore_unpublished=ignore_unpublished)
-            else:
-                res = (None, f"unknown {base=}")
-        except Exception:  # pylint: disable=broad-exception-caught
-            res = (None, traceback.format_exc())
-        return res
+        return get_status_date_types([main_id])[0]
 
     return get_status_date_type
+
+
+def create_status_date_types(
+        platforms: dict[str, DBConnector],
+        blogs: dict[str, DBConnector],
+        *,
+        ignore_unpublished: bool) -> StatusDateTypesFn:
+    """
+    Create a function to get the status, date, and type of multiple documents
+    at once.
+
+    Args:
+        platforms (dict[str, DBConnector]): The platforms' database connectors.
+        blogs (dict[str, DBConnector]): The blogs' database connectors.
+        ignore_unpublished (bool): Whether to ignore unpublished documents.
+
+    Returns:
+        StatusDateTypesFn: The function.
+    """
+
+    def get_status_date_types(
+            main_ids: list[str],
+            ) -> list[
+                tuple[tuple[DocStatus, str | None, str] | None, str | None]]:
+        return batch_by_base(
+            main_ids,
+            platforms,
+            blogs,
+            read_pads=lambda db, base, doc_ids: get_status_date_types_pad(
+                db,
+                base,
+                doc_ids,
+                ignore_unpublished=ignore_unpublished),
+            read_blogs=lambda db, _, doc_ids: get_status_date_types_blog(
+                db,
+                doc_ids,
+                ignore_unpublished=ignore_unpublished),
+            on_error=as_error)
+
+    return get_status_date_types
@@ -14,6 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """The semantic search document adder processing queue."""
+import traceback
 import uuid
 from collections.abc import Callable
 from typing import Literal, Protocol, TypedDict
@@ -26,22 +27,46 @@ from app.system.db.db import DBConnector
 from app.system.location.response import LanguageStr
 from app.system.prep.fulltext import (
     AllDocsFn,
-    FullTextFn,
+    FullTextsFn,
     get_base_doc,
-    IsRemoveFn,
-    StatusDateTypeFn,
+    IsRemovesFn,
+    StatusDateTypesFn,
     TagFn,
-    UrlTitleFn,
+    TagsFn,
+    UrlTitlesFn,
 )
 from app.system.smind.api import GraphProfile
-from app.system.smind.search import AddEmbed, vec_add
+from app.system.smind.search import (
+    AddEmbed,
+    AddThroughput,
+    vec_add,
+    vec_add_bulk,
+    VecAddDoc,
+)
 from app.system.smind.vec import MetaObject
-from app.system.workqueues.queue import register_process_queue
+from app.system.workqueues.queue import ProcessLane, register_process_queue
 
 
 AddDoc = TypedDict('AddDoc', {
     "total": int,
 })
+"""Number of documents of a base that got enqueued."""
+AddDocs = TypedDict('AddDocs', {
+    "total": int,
+    "fallback": int,
+    "throughput": AddThroughput | None,
+})
+"""Result of adding multiple documents at once. `fallback` is the number of
+documents that were enqueued individually because the bulk operation failed
+and `throughput` contains the throughput of each stage if it succeeded."""
+
+
+ADDER_BULK_SIZE = 50
+"""The number of documents added to the vector database at once when adding
+a full base."""
+ADDER_INVALIDATE_INTERVAL = 10.0
+"""The minimum time in seconds between clearing the caches of a vector
+database when adding a full base."""
 
 
 class AdderProcessor(Protocol):  # pylint: disable=too-few-public-methods
@@ -85,7 +110,15 @@ AdderUpdateDocPayload = TypedDict('AdderUpdateDocPayload', {
     "user": uuid.UUID,
 })
 """Adding a main id to the given vector database."""
-AdderPayload = AdderUpdateDocPayload | AdderAddBasePayload
+AdderUpdateDocsPayload = TypedDict('AdderUpdateDocsPayload', {
+    "stage": Literal["docs"],
+    "db": str,
+    "main_ids": list[str],
+    "user": uuid.UUID,
+})
+"""Adding multiple main ids to the given vector database at once."""
+AdderPayload = (
+    AdderUpdateDocPayload | AdderUpdateDocsPayload | AdderAddBasePayload)
 """Adding documents to a vector database."""
 
 
@@ -99,11 +132,13 @@ def register_adder(
         ner_graphs: dict[LanguageStr, GraphProfile],
         get_articles: Callable[[str], str],
         get_all_docs: AllDocsFn,
-        doc_is_remove: IsRemoveFn,
-        get_full_text: FullTextFn,
-        get_url_title: UrlTitleFn,
+        doc_is_removes: IsRemovesFn,
+        get_full_texts: FullTextsFn,
+        get_url_titles: UrlTitlesFn,
         get_tag: TagFn,
-        get_status_date_type: StatusDateTypeFn,
+        get_tags: TagsFn,
+        get_status_date_types: StatusDateTypesFn,
+        precompute_short_snippets: bool,
         ) -> tuple[BaseProcessor, AdderProcessor]:
     """
     Registers the document adder for the processing queue. The document adder
@@ -120,15 +155,19 @@ def register_adder(
             name from an external vector database name.
         get_all_docs (AllDocsFn): Gets all documents (main ids) of a given
             base.
-        doc_is_remove (IsRemoveFn): Whether a document (via main id) has been
-            removed.
-        get_full_text (FullTextFn): Get the full text of a document
-            (via main id).
-        get_url_title (UrlTitleFn): Get the URL and title of a document
-            (via main id).
+        doc_is_removes (IsRemovesFn): Whether documents (via main ids) have
+            been removed.
+        get_full_texts (FullTextsFn): Get the full texts of documents
+            (via main ids).
+        get_url_titles (UrlTitlesFn): Get the URLs and titles of documents
+            (via main ids).
         get_tag (TagFn): Get the tag (i.e., country) of a document via main id.
-        get_status_date_type (StatusDateTypeFn): Get the status, date, and
-            document type of a document via main id.
+        get_tags (TagsFn): Get the tags (i.e., countries) of documents via
+            main ids.
+        get_status_date_types (StatusDateTypesFn): Get the status, date, and
+            document type of documents via main ids.
+        precompute_short_snippets (bool): Whether to compute short snippet
+            embeddings when adding documents.
 
     Returns:
         tuple[BaseProcessor, AdderProcessor]: Adders for bases and documents.
@@ -144,6 +183,13 @@ def register_adder(
                 "base": entry["base"],
                 "user": entry["user"].hex,
             }
+        if entry["stage"] == "docs":
+            return {
+                "stage": "docs",
+                "db": entry["db"],
+                "main_ids": ",".join(entry["main_ids"]),
+                "user": entry["user"].hex,
+            }
         return {
             "stage": "doc",
             "db": entry["db"],
@@ -161,6 +207,13 @@ def register_adder(
                 "base": payload["base"],
                 "user": uuid.UUID(payload["user"]),
             }
+        if payload["stage"] == "docs":
+            return {
+                "stage": "docs",
+                "db": payload["db"],
+                "main_ids": payload["main_ids"].split(","),
+                "user": uuid.UUID(payload["user"]),
+            }
         return {
             "stage": "doc",
             "db": payload["db"],
@@ -168,68 +221,135 @@ def register_adder(
             "user": uuid.UUID(payload["user"]),
         }
 
-    def adder_compute(entry: AdderPayload) -> AddEmbed | AddDoc:
+    def get_docs(main_ids: list[str]) -> list[VecAddDoc]:
+        removes: dict[str, bool] = {}
+        for main_id, (is_remove, error_remove) in zip(
+                main_ids, doc_is_removes(main_ids)):
+            if error_remove is not None:
+                raise ValueError(error_remove)
+            print(f"{main_id=} {is_remove=}")
+            removes[main_id] = is_remove
+        keep_ids = [main_id for main_id in main_ids if not removes[main_id]]
+        input_strs = dict(zip(keep_ids, get_full_texts(keep_ids)))
+        infos = dict(zip(
+            keep_ids, get_url_titles(keep_ids, is_logged_in=True)))
+        sdts = dict(zip(keep_ids, get_status_date_types(keep_ids)))
+        res: list[VecAddDoc] = []
+        for main_id in main_ids:
+            base, doc_id = get_base_doc(main_id)
+            sdt: tuple[DocStatus, str | None, str] | None
+            error_sdt: str | None = "unknown error"
+            if removes[main_id]:
+                input_str = ""
+                url = "-"
+                title = "-"
+                sdt = ("public", get_time_str(), "solution")
+            else:
+                opt_input_str, error_input = input_strs[main_id]
+                if opt_input_str is None:
+                    raise ValueError(error_input)
+                input_str = opt_input_str
+                info, error_info = infos[main_id]
+                if info is None:
+                    raise ValueError(error_info)
+                url, title = info
+                sdt, error_sdt = sdts[main_id]
+            if sdt is None:
+                raise ValueError(error_sdt)
+            status, date_str, doc_type = sdt
+            meta_obj: MetaObject = {
+                "status": status,
+                "date": date_str,
+                "doc_type": doc_type,
+            }
+            res.append({
+                "input_str": input_str,
+                "base": base,
+                "doc_id": doc_id,
+                "url": url,
+                "title": title,
+                "meta_obj": meta_obj,
+            })
+        return res
+
+    def adder_compute(entry: AdderPayload) -> AddEmbed | AddDoc | AddDocs:
         vdb_str = entry["db"]
         user = entry["user"]
         if entry["stage"] == "base":
             total = 0
+            main_ids: list[str] = []
             for cur_main_id in get_all_docs(entry["base"]):
-                adder_processor(
-                    vdb_str=vdb_str, main_id=cur_main_id, user=user)
+                main_ids.append(cur_main_id)
+                if len(main_ids) >= ADDER_BULK_SIZE:
+                    bulk_processor(
+                        vdb_str=vdb_str, main_ids=main_ids, user=user)
+                    main_ids = []
                 total += 1
+            if main_ids:
+                bulk_processor(vdb_str=vdb_str, main_ids=main_ids, user=user)
             return {
                 "total": total,
             }
-        main_id = entry["main_id"]
-        is_remove, error_remove = doc_is_remove(main_id)
-        if error_remove is not None:
-            raise ValueError(error_remove)
-        print(f"{main_id=} {is_remove=}")
-        base, doc_id = get_base_doc(main_id)
         articles = get_articles(vdb_str)
-        if not is_remove:
-            input_str, error_input = get_full_text(main_id)
-            if input_str is None:
-                raise ValueError(error_input)
-        else:
-            input_str = ""
-        if not is_remove:
-            info, error_info = get_url_title(main_id, is_logged_in=True)
-            if info is None:
-                raise ValueError(error_info)
-            url, title = info
-        else:
-            url = "-"
-            title = "-"
-        sdt: tuple[DocStatus, str | None, str] | None
-        error_sdt: str | None = "unknown error"
-        if not is_remove:
-            sdt, error_sdt = get_status_date_type(main_id)
-        else:
-            sdt = ("public", get_time_str(), "solution")
-        if sdt is None:
-            raise ValueError(error_sdt)
-        status, date_str, doc_type = sdt
-        meta_obj: MetaObject = {
-            "status": status,
-            "date": date_str,
-            "doc_type": doc_type,
-        }
+        if entry["stage"] == "docs":
+            try:
+                docs = get_docs(entry["main_ids"])
+                tags = dict(zip(
+                    entry["main_ids"], get_tags(entry["main_ids"])))
+
+                def get_bulk_tag(main_id: str) -> tuple[str | None, str]:
+                    tag = tags.get(main_id)
+                    return get_tag(main_id) if tag is None else tag
+
+                res = vec_add_bulk(
+                    db,
+                    vec_db,
+                    docs,
+                    qdrant_cache=qdrant_cache,
+                    articles=articles,
+                    articles_graph=graph_embed,
+                    ner_graphs=ner_graphs,
+                    get_tag=get_bulk_tag,
+                    user=user,
+                    precompute_short_snippets=precompute_short_snippets,
+                    wait=True,
+                    invalidate_interval=ADDER_INVALIDATE_INTERVAL)
+            except Exception:  # pylint: disable=broad-exception-caught
+                print(traceback.format_exc())
+                # NOTE: failing documents will show up individually as errors
+                for main_id in entry["main_ids"]:
+                    doc_processor(
+                        vdb_str=vdb_str,
+                        main_id=main_id,
+                        user=user,
+                        lane="low")
+                return {
+                    "total": len(entry["main_ids"]),
+                    "fallback": len(entry["main_ids"]),
+                    "throughput": None,
+                }
+            return {
+                "total": len(entry["main_ids"]),
+                "fallback": 0,
+                "throughput": res["throughput"],
+            }
+        doc = get_docs([entry["main_id"]])[0]
         return vec_add(
             db,
             vec_db,
-            input_str,
+            doc["input_str"],
             qdrant_cache=qdrant_cache,
             articles=articles,
             articles_graph=graph_embed,
             ner_graphs=ner_graphs,
             get_tag=get_tag,
             user=user,
-            base=base,
-            doc_id=doc_id,
-            url=url,
-            title=title,
-            meta_obj=meta_obj)
+            base=doc["base"],
+            doc_id=doc["doc_id"],
+            url=doc["url"],
+            title=doc["title"],
+            meta_obj=doc["meta_obj"],
+            precompute_short_snippets=precompute_short_snippets)
 
     process_enqueue = register_process_queue(
         "adder",
@@ -249,8 +369,24 @@ def register_adder(
                     "user": user,
                 })
 
-    def adder_processor(
-            *, vdb_str: str, main_id: str, user: uuid.UUID) -> None:
+    def bulk_processor(
+            *, vdb_str: str, main_ids: list[str], user: uuid.UUID) -> None:
+        process_enqueue(
+            process_queue_redis,
+            {
+                "stage": "docs",
+                "db": vdb_str,
+                "main_ids": main_ids,
+                "user": user,
+            },
+            lane="low")
+
+    def doc_processor(
+            *,
+            vdb_str: str,
+            main_id: str,
+            user: uuid.UUID,
+            lane: ProcessLane) -> None:
         process_enqueue(
             process_queue_redis,
             {
@@ -258,6 +394,12 @@ def register_adder(
                 "db": vdb_str,
                 "main_id": main_id,
                 "user": user,
-            })
+            },
+            lane=lane)
+
+    def adder_processor(
+            *, vdb_str: str, main_id: str, user: uuid.UUID) -> None:
+        doc_processor(
+            vdb_str=vdb_str, main_id=main_id, user=user, lane="high")
 
     return base_processor, adder_processor
@@ -16,8 +16,11 @@
 """Definitions for the scattermind API."""
 import json
 import os
+import threading
+import time
 import traceback
-from typing import cast, Literal, TypedDict, TypeVar
+from concurrent.futures import Future
+from typing import cast, Generic, Literal, TypedDict, TypeVar
 
 import redis as redis_lib
 from redipy import Redis, RedisConfig
@@ -55,6 +58,12 @@ NERResponse = TypedDict('NERResponse', {
 """Response of a NER (Named Entity Recognition) run."""
 
 
+BATCH_MAX_SIZE = 64
+"""The number of pending texts that triggers a batch immediately."""
+BATCH_MAX_WAIT = 0.01  # 10ms
+"""The maximum time in seconds to wait for other callers to join a batch."""
+
+
 def get_redis(
         config_fname: str,
         *,
@@ -365,6 +374,144 @@ def get_text_results_immediate(
     return [res.get(ix, None) for ix in range(len(texts))]
 
 
+class TextBatcher(Generic[T]):
+    """Coalesces the texts of concurrent callers of a model into shared
+    batches. Identical texts that are already being computed are not sent to
+    the model again."""
+    def __init__(
+            self,
+            graph_profile: GraphProfile,
+            *,
+            output_sample: T,
+            max_batch: int,
+            max_wait: float) -> None:
+        """
+        Creates a batcher for the given model.
+
+        Args:
+            graph_profile (GraphProfile): The model.
+            output_sample (T): A sample of the output needed for typing. See
+                `get_text_results_immediate`.
+            max_batch (int): The number of pending texts that causes a batch
+                to be sent right away.
+            max_wait (float): The maximum time in seconds a batch waits for
+                more texts before being sent.
+        """
+        self._graph_profile = graph_profile
+        self._output_sample = output_sample
+        self._max_batch = max_batch
+        self._max_wait = max_wait
+        self._cond = threading.Condition()
+        self._pending: list[str] = []
+        self._inflight: dict[str, Future[T | None]] = {}
+
+    def compute(self, texts: list[str]) -> list[T | None]:
+        """
+        Computes the model outputs for the given texts. The first caller that
+        adds a text to an empty batch sends the batch after it is full or the
+        wait time has passed. All other callers wait for the results.
+
+        Args:
+            texts (list[str]): The input texts.
+
+        Returns:
+            list[T | None]: The outputs for each text. If an output could not
+                be retrieved for a given input text the corresponding value in
+                the list is None.
+        """
+        if not texts:
+            return []
+        is_leader = False
+        futures: list[Future[T | None]] = []
+        with self._cond:
+            for text in texts:
+                fut = self._inflight.get(text)
+                if fut is None:
+                    fut = Future()
+                    self._inflight[text] = fut
+                    if not self._pending:
+                        is_leader = True
+                    self._pending.append(text)
+                futures.append(fut)
+            if len(self._pending) >= self._max_batch:
+                self._cond.notify_all()
+        if is_leader:
+            self._dispatch()
+        return [fut.result() for fut in futures]
+
+    def _dispatch(self) -> None:
+        deadline = time.monotonic() + self._max_wait
+        with self._cond:
+            while len(self._pending) < self._max_batch:
+                remain = deadline - time.monotonic()
+                if remain <= 0.0:
+                    break
+                self._cond.wait(remain)
+            batch = self._pending
+            self._pending = []
+        if not batch:
+            return
+        ns = self._graph_profile.get_ns()
+        print(f"batch of {len(batch)} texts for {ns.get()}")
+        try:
+            results = get_text_results_immediate(
+                batch,
+                graph_profile=self._graph_profile,
+                output_sample=self._output_sample)
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            with self._cond:
+                futures = [self._inflight.pop(text) for text in batch]
+            for fut in futures:
+                fut.set_exception(exc)
+            return
+        with self._cond:
+            futures = [self._inflight.pop(text) for text in batch]
+        for fut, result in zip(futures, results):
+            fut.set_result(result)
+
+
+TEXT_BATCHERS: dict[str, TextBatcher] = {}
+"""Batchers for each model namespace."""
+TEXT_BATCHERS_LOCK = threading.Lock()
+"""Lock for creating batchers."""
+
+
+def get_text_results_batched(
+        texts: list[str],
+        *,
+        graph_profile: GraphProfile,
+        output_sample: T) -> list[T | None]:
+    """
+    Computes a model for a set of inputs. Texts of concurrent callers are
+    coalesced and sent to the model together to allow for bigger batches on
+    the workers. See `get_text_results_immediate` for the model requirements.
+
+    Args:
+        texts (list[str]): The input texts.
+        graph_profile (GraphProfile): The model.
+        output_sample (T): A sample of the output needed for typing. All
+            callers for the same model must use the same output type.
+
+    Returns:
+        list[T | None]: The outputs for each text. If an output could not be
+            retrieved for a given input text the corresponding value in the
+            list is None.
+    """
+    ns_str = graph_profile.get_ns().get()
+    batcher = TEXT_BATCHERS.get(ns_str)
+    if batcher is None:
+        with TEXT_BATCHERS_LOCK:
+            batcher = TEXT_BATCHERS.get(ns_str)
+            if batcher is None:
+                batcher = TextBatcher(
+                    graph_profile,
+                    output_sample=output_sample,
+                    max_batch=BATCH_MAX_SIZE,
+                    max_wait=BATCH_MAX_WAIT)
+                TEXT_BATCHERS[ns_str] = batcher
+    return batcher.compute(texts)
+
+
 def get_ner_results_immediate(
         texts: list[str],
         *,
@@ -14,29 +14,346 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """Caching of embedding model results."""
+import re
+import threading
+import time
+import uuid
 from collections.abc import Callable
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from typing import TypeVar
 
-from redipy import Redis
+from redipy import ExecFunction, Redis, RSM_MISSING
+from redipy.symbolic.rvar import RedisVar
+from redipy.symbolic.seq import FnContext
+from scattermind.system.names import GNamespace
+
+from app.misc.lru import LRU
+from app.misc.util import get_text_hash, json_compact_str, json_maybe_read
+from app.system.smind.api import get_text_results_batched, GraphProfile
 
 
 T = TypeVar('T')
 
 
-def clear_cache(cache: Redis, *, db_name: str | None) -> None:
+EMBED_LRU: LRU[str, list[float]] = LRU(1000)
+"""In-process cache of text embeddings. The keys are the same as the keys
+used in redis."""
+EMBED_PREFIX = "embed"
+"""Redis key prefix for cached text embeddings. Note, the prefix must not be
+a valid vector database name."""
+EMBED_EXPIRE = 7 * 24 * 60 * 60.0  # 1 week
+"""Expiration time of cached text embeddings in redis in seconds."""
+SNIPPET_EMBED_PREFIX = "snippet"
+"""Redis key prefix for cached embeddings of short snippets. They are
+computed when adding documents and are kept apart from query embeddings. Note,
+the prefix must not be a valid vector database name."""
+SNIPPET_EMBED_EXPIRE = 30 * 24 * 60 * 60.0  # 30 days
+"""Expiration time of cached short snippet embeddings in redis in seconds."""
+GENERATION_PREFIX = "gen"
+"""Redis key prefix for the cache generation of each vector database. Note,
+the prefix must not be a valid vector database name."""
+CACHE_EXPIRE = 24 * 60 * 60.0  # 1 day
+"""Expiration time of cached values in redis in seconds. Values of old
+generations are never read again and disappear after this time at the
+latest."""
+LEASE_PREFIX = "lease"
+"""Redis key prefix for the leases of values that are currently being
+computed. Note, the prefix must not be a valid vector database name."""
+
+
+GenerationCallback = Callable[[str | None, str], None]
+"""Called after the cache generation of a vector database changed. The
+arguments are the previous generation (None if there was none) and the new
+generation."""
+
+
+INVALIDATE_LOCK = threading.RLock()
+"""Lock for coalescing cache invalidations."""
+INVALIDATE_LAST: dict[str, float] = {}
+"""The time of the last generation change of each vector database."""
+INVALIDATE_PENDING: dict[str, threading.Timer] = {}
+"""Pending delayed generation changes of each vector database."""
+
+
+INFLIGHT_LOCK = threading.Lock()
+"""Lock for the values currently being computed in this process."""
+INFLIGHT: dict[str, Future] = {}
+"""The values currently being computed in this process by cache key."""
+RELEASE_SCRIPTS: dict[int, ExecFunction] = {}
+"""The lease release script for each redis cache (by object id)."""
+
+
+def get_generation_key(db_name: str) -> str:
+    """
+    Computes the redis key of the cache generation of a vector database.
+
+    Args:
+        db_name (str): The vector database name.
+
+    Returns:
+        str: The redis key.
+    """
+    return f"{GENERATION_PREFIX}:{db_name}"
+
+
+def get_generation(cache: Redis, db_name: str) -> str:
     """
-    Clears the cache for a specific vector database.
+    Gets the current cache generation of a vector database. A new generation
+    is created if none exists (e.g., if the key got evicted). Generations are
+    random so a recreated generation never matches old cached values.
+
+    Args:
+        cache (Redis): The redis cache database.
+        db_name (str): The vector database name.
+
+    Returns:
+        str: The generation.
+    """
+    key = get_generation_key(db_name)
+    res = cache.get_value(key)
+    while res is None:
+        cache.set_value(key, uuid.uuid4().hex, mode=RSM_MISSING)
+        res = cache.get_value(key)
+    return res
+
+
+def bump_generation(
+        cache: Redis,
+        db_name: str,
+        *,
+        on_bump: GenerationCallback | None) -> str:
+    """
+    Starts a new cache generation for a vector database. This invalidates
+    all cached values of the vector database at once.
+
+    Args:
+        cache (Redis): The redis cache database.
+        db_name (str): The vector database name.
+        on_bump (GenerationCallback | None): Called with the previous and the
+            new generation. The change is atomic so no other generation can be
+            in between.
+
+    Returns:
+        str: The new generation.
+    """
+    with INVALIDATE_LOCK:
+        INVALIDATE_LAST[db_name] = time.monotonic()
+        timer = INVALIDATE_PENDING.pop(db_name, None)
+        if timer is not None:
+            timer.cancel()
+    generation = uuid.uuid4().hex
+    prev = cache.set_value(
+        get_generation_key(db_name), generation, return_previous=True)
+    if on_bump is not None:
+        on_bump(None if prev is None else f"{prev}", generation)
+    return generation
+
+
+def clear_cache(
+        cache: Redis,
+        *,
+        db_name: str | None,
+        coalesce: float | None = None,
+        on_bump: GenerationCallback | None = None) -> None:
+    """
+    Clears the cache for a specific vector database. This is done by
+    starting a new cache generation. Old values expire on their own.
 
     Args:
         cache (Redis): The redis cache database.
         db_name (str | None): The vector database name or None to flush all
             caches.
+        coalesce (float | None, optional): If set, the cache is cleared at
+            most once in the given interval in seconds. A clear within the
+            interval is delayed until the end of the interval and combined
+            with other clears in the same interval. Defaults to None.
+        on_bump (GenerationCallback | None, optional): Called when the
+            generation changes. Defaults to None.
     """
     if db_name is None:
         cache.flushall()
-    else:
-        for key in cache.keys(match=f"{db_name}:*", block=True):
-            cache.delete(key)
+        return
+    if coalesce is None:
+        bump_generation(cache, db_name, on_bump=on_bump)
+        return
+    with INVALIDATE_LOCK:
+        if db_name in INVALIDATE_PENDING:
+            return
+        wait = INVALIDATE_LAST.get(db_name, 0.0) + coalesce - time.monotonic()
+        if wait > 0.0:
+            timer = threading.Timer(
+                wait,
+                bump_generation,
+                args=(cache, db_name),
+                kwargs={"on_bump": on_bump})
+            timer.daemon = True
+            INVALIDATE_PENDING[db_name] = timer
+            timer.start()
+            return
+    bump_generation(cache, db_name, on_bump=on_bump)
+
+
+def get_cache_key(
+        db_name: str,
+        generation: str,
+        cache_type: str,
+        cache_hash: str) -> str:
+    """
+    Computes the redis key of a cached value. See `cached`.
+
+    Args:
+        db_name (str): The vector database name.
+        generation (str): The cache generation of the vector database.
+        cache_type (str): The cache type identifier.
+        cache_hash (str): The hash of the task.
+
+    Returns:
+        str: The redis key.
+    """
+    return f"{db_name}:{generation}:{cache_type}:{cache_hash}"
+
+
+def get_lease_key(cache_key: str) -> str:
+    """
+    Computes the redis key of the lease of a cached value.
+
+    Args:
+        cache_key (str): The key of the cached value.
+
+    Returns:
+        str: The redis key of the lease.
+    """
+    return f"{LEASE_PREFIX}:{cache_key}"
+
+
+def get_release_script(cache: Redis) -> ExecFunction:
+    """
+    Gets the script that atomically removes a lease if it is still owned by
+    the given token.
+
+    Args:
+        cache (Redis): The redis cache database.
+
+    Returns:
+        ExecFunction: The script. The key is `lease` and the argument is
+            `token`.
+    """
+    key = id(cache)
+    res = RELEASE_SCRIPTS.get(key)
+    if res is None:
+        ctx = FnContext()
+        lease = RedisVar(ctx.add_key("lease"))
+        token = ctx.add_arg("token")
+        b_then, _ = ctx.if_(lease.get_value().eq_(token))
+        b_then.add(lease.delete())
+        ctx.set_return_value(None)
+        res = cache.register_script(ctx)
+        RELEASE_SCRIPTS[key] = res
+    return res
+
+
+def read_cached(
+        cache: Redis,
+        cache_key: str,
+        post_fn: Callable[[str], T | None]) -> T | None:
+    """
+    Reads a cached value.
+
+    Args:
+        cache (Redis): The redis cache database.
+        cache_key (str): The key of the cached value.
+        post_fn (Callable[[str], T | None]): Converts a string stored in redis
+            to the correct output type.
+
+    Returns:
+        T | None: The value or None if it is not available.
+    """
+    res = cache.get_value(cache_key)
+    if not res:
+        return None
+    return post_fn(res)
+
+
+def compute_cached(
+        cache: Redis,
+        *,
+        cache_type: str,
+        cache_key: str,
+        compute_fn: Callable[[], T],
+        pre_cache_fn: Callable[[T], str],
+        post_fn: Callable[[str], T | None],
+        timeout: float,
+        wait_sleep: float,
+        expire_in: float | None) -> T:
+    """
+    Computes a missing cached value. Only one process computes the value at a
+    time. The computing process holds a lease in redis. Other processes wait
+    for the value to appear. If the lease expires (e.g., because the
+    computing process died) or gets released without a value (e.g., because
+    the computation failed) a waiting process takes over. If the value does
+    not appear within the timeout the value is computed regardless of the
+    lease.
+
+    Args:
+        cache (Redis): The redis cache database.
+        cache_type (str): The cache type identifier.
+        cache_key (str): The key of the cached value.
+        compute_fn (Callable[[], T]): Computes the task.
+        pre_cache_fn (Callable[[T], str]): Converts the task output into a
+            string that can be stored in redis.
+        post_fn (Callable[[str], T | None]): Converts a string stored in redis
+            to the correct output type.
+        timeout (float): The lease duration and the maximum waiting time in
+            seconds.
+        wait_sleep (float): The time in seconds between checks whether the
+            value is available.
+        expire_in (float | None): The expiration time of the cached value in
+            seconds.
+
+    Raises:
+        ValueError: If the string to be stored in redis is empty.
+
+    Returns:
+        T: The result of the task.
+    """
+    lease_key = get_lease_key(cache_key)
+    token: str | None = uuid.uuid4().hex
+    start_time = time.monotonic()
+    deferred = False
+    while not cache.set_value(
+            lease_key, f"{token}", mode=RSM_MISSING, expire_in=timeout):
+        if not deferred:
+            print(f"{cache_type.upper()} CACHE DEFERRED {cache_key}")
+            deferred = True
+        if wait_sleep > 0.0:
+            time.sleep(wait_sleep)
+        response = read_cached(cache, cache_key, post_fn)
+        if response is not None:
+            print(f"{cache_type.upper()} CACHE HIT {cache_key}")
+            return response
+        if time.monotonic() - start_time >= timeout:
+            print(f"{cache_type.upper()} CACHE TIMEOUT {cache_key}")
+            token = None
+            break
+    try:
+        if deferred and token is not None:
+            response = read_cached(cache, cache_key, post_fn)
+            if response is not None:
+                print(f"{cache_type.upper()} CACHE HIT {cache_key}")
+                return response
+        print(f"{cache_type.upper()} CACHE MISS {cache_key}")
+        ret_val = compute_fn()
+        ret_str = pre_cache_fn(ret_val)
+        if not ret_str:
+            raise ValueError(
+                f"cache string must not be empty! {cache_type=} {cache_key=}")
+        cache.set_value(cache_key, ret_str, expire_in=expire_in)
+        return ret_val
+    finally:
+        if token is not None:
+            get_release_script(cache)(
+                keys={"lease": lease_key}, args={"token": token})
 
 
 def cached(
@@ -48,12 +365,17 @@ def cached(
         compute_fn: Callable[[], T],
         pre_cache_fn: Callable[[T], str],
         post_fn: Callable[[str], T | None],
-        timeout: float = 300.0,  # pylint: disable=unused-argument
-        wait_sleep: float = 0.1,  # pylint: disable=unused-argument
+        timeout: float = 300.0,
+        wait_sleep: float = 0.1,
+        expire_in: float | None = CACHE_EXPIRE,
+        generation: str | None = None,
         ) -> T:
     """
     Process a caching value. If the value is available in the cache it is
     returned, otherwise the value is computed and put into the cache.
+    Concurrent requests for the same missing value only compute it once.
+    Within a process later requests wait for the first one. Across processes
+    a lease in redis determines which process computes the value.
 
     Args:
         cache (Redis): The redis cache database. Must have a LRU or similar key
@@ -67,10 +389,19 @@ def cached(
             string that can be stored in redis. The string must never be empty.
         post_fn (Callable[[str], T | None]): Converts a string stored in redis
             to the correct output type.
-        timeout (float, optional): Unused timeout in seconds.
+        timeout (float, optional): The maximum time in seconds to wait for
+            another request computing the same value. This is also the
+            duration of the lease. If the computation takes longer other
+            processes might start computing the value as well.
             Defaults to 300.0.
-        wait_sleep (float, optional): Unused sleep time in seconds. Defaults
-            to 0.1.
+        wait_sleep (float, optional): The time in seconds between checks
+            whether a value computed by another process is available.
+            Defaults to 0.1.
+        expire_in (float | None, optional): The expiration time of the
+            cached value in seconds. Defaults to CACHE_EXPIRE.
+        generation (str | None, optional): The cache generation of the
+            vector database if it is already known. If None, the current
+            generation is retrieved. Defaults to None.
 
     Raises:
         ValueError: If the string to be stored in redis is empty.
@@ -78,32 +409,163 @@ def cached(
     Returns:
         T: The result of the task.
     """
-    cache_key = f"{db_name}:{cache_type}:{cache_hash}"
-    res = cache.get_value(cache_key)
-    if res is not None:
-        if not res:
-            pass
-            # FIXME: implement properly
-            # print(f"{cache_type.upper()} CACHE DEFERRED {cache_key}")
-            # start_time = time.monotonic()
-            # while (
-            #         res is not None
-            #         and not res
-            #         and time.monotonic() - start_time < timeout):
-            #     if wait_sleep > 0.0:
-            #         time.sleep(wait_sleep)
-            #     res = cache.get_value(cache_key)
-        if res:
-            response = post_fn(res)
-            if response is not None:
-                print(f"{cache_type.upper()} CACHE HIT {cache_key}")
-                return response
-    print(f"{cache_type.upper()} CACHE MISS {cache_key}")
-    # cache.set_value(cache_key, "", mode=RSM_MISSING)
-    ret_val = compute_fn()
-    ret_str = pre_cache_fn(ret_val)
-    if not ret_str:
-        raise ValueError(
-            f"cache string must not be empty! {cache_type=} {cache_key=}")
-    cache.set_value(cache_key, ret_str)
-    return ret_val
+    if generation is None:
+        generation = get_generation(cache, db_name)
+    cache_key = get_cache_key(db_name, generation, cache_type, cache_hash)
+    response = read_cached(cache, cache_key, post_fn)
+    if response is not None:
+        print(f"{cache_type.upper()} CACHE HIT {cache_key}")
+        return response
+    with INFLIGHT_LOCK:
+        future = INFLIGHT.get(cache_key)
+        is_owner = future is None
+        if future is None:
+            future = Future()
+            INFLIGHT[cache_key] = future
+    if not is_owner:
+        print(f"{cache_type.upper()} CACHE WAIT {cache_key}")
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            print(f"{cache_type.upper()} CACHE TIMEOUT {cache_key}")
+            return compute_fn()
+    try:
+        ret_val = compute_cached(
+            cache,
+            cache_type=cache_type,
+            cache_key=cache_key,
+            compute_fn=compute_fn,
+            pre_cache_fn=pre_cache_fn,
+            post_fn=post_fn,
+            timeout=timeout,
+            wait_sleep=wait_sleep,
+            expire_in=expire_in)
+        future.set_result(ret_val)
+        return ret_val
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    finally:
+        with INFLIGHT_LOCK:
+            INFLIGHT.pop(cache_key, None)
+
+
+def normalize_embed_text(text: str) -> str:
+    """
+    Normalizes a text for embedding. Consecutive white-space is collapsed.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        str: The normalized text.
+    """
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def get_embed_cache_key(ns: GNamespace, text: str, *, prefix: str) -> str:
+    """
+    Computes the cache key of the embedding of a normalized text.
+
+    Args:
+        ns (GNamespace): The namespace of the embedding model.
+        text (str): The normalized text.
+        prefix (str): The redis key prefix.
+
+    Returns:
+        str: The cache key.
+    """
+    return f"{prefix}:{ns.get()}:{get_text_hash(text)}"
+
+
+def cached_embeds(
+        cache: Redis,
+        texts: list[str],
+        *,
+        graph_profile: GraphProfile,
+        prefix: str = EMBED_PREFIX,
+        expire_in: float = EMBED_EXPIRE,
+        use_lru: bool = True,
+        ) -> list[list[float] | None]:
+    """
+    Computes the embeddings of the given texts. Embeddings are looked up in
+    an in-process cache first and in redis second. Only the remaining texts
+    are sent to the embedding model. Identical texts are only computed once.
+
+    Args:
+        cache (Redis): The redis cache database. Must have a LRU or similar key
+            expiration policy.
+        texts (list[str]): The texts. They get normalized via
+            `normalize_embed_text` before embedding.
+        graph_profile (GraphProfile): The embedding model.
+        prefix (str, optional): The redis key prefix of the embeddings.
+            Defaults to EMBED_PREFIX.
+        expire_in (float, optional): The expiration time in seconds of newly
+            computed embeddings in redis. Defaults to EMBED_EXPIRE.
+        use_lru (bool, optional): Whether to use the in-process cache. Bulk
+            lookups whose texts are unlikely to be requested again in this
+            process (e.g., when adding documents) should skip it to not evict
+            the embeddings of recent queries. Defaults to True.
+
+    Returns:
+        list[list[float] | None]: The embedding for each text. If an embedding
+            could not be computed the corresponding value is None.
+    """
+    if not texts:
+        return []
+    lru = EMBED_LRU if use_lru else None
+    ns = graph_profile.get_ns()
+    norm_texts = [normalize_embed_text(text) for text in texts]
+    keys = [
+        get_embed_cache_key(ns, text, prefix=prefix) for text in norm_texts
+    ]
+    res: dict[str, list[float]] = {}
+    if lru is not None:
+        for key in keys:
+            embed = lru.get(key)
+            if embed is not None:
+                res[key] = embed
+    lru_hits = len(res)
+    redis_keys = sorted({key for key in keys if key not in res})
+    if redis_keys:
+        with cache.pipeline() as pipe:
+            for key in redis_keys:
+                pipe.get_value(key)
+            redis_values: list[str | None] = pipe.execute()
+        for key, value in zip(redis_keys, redis_values):
+            if not value:
+                continue
+            embed = json_maybe_read(value)
+            if embed is None:
+                continue
+            res[key] = embed
+            if lru is not None:
+                lru.set(key, embed)
+    redis_hits = len(res) - lru_hits
+    missing: dict[str, str] = {}
+    for key, text in zip(keys, norm_texts):
+        if key not in res:
+            missing[key] = text
+    if missing:
+        miss_keys = list(missing.keys())
+        embeds = get_text_results_batched(
+            [missing[key] for key in miss_keys],
+            graph_profile=graph_profile,
+            output_sample=[1.0])
+        with cache.pipeline() as pipe:
+            any_set = False
+            for key, embed in zip(miss_keys, embeds):
+                if embed is None:
+                    continue
+                res[key] = embed
+                if lru is not None:
+                    lru.set(key, embed)
+                pipe.set_value(
+                    key, json_compact_str(embed), expire_in=expire_in)
+                any_set = True
+            if any_set:
+                pipe.execute()
+    print(
+        f"EMBED CACHE {prefix} {ns.get()} total={len(keys)} {lru_hits=} "
+        f"{redis_hits=} misses={len(missing)}")
+    return [res.get(key) for key in keys]
@@ -0,0 +1,330 @@
+# NLP-API provides useful Natural Language Processing capabilities as API.
+# Copyright (C) 2024 UNDP Accelerator Labs, Josua Krause
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""An in-memory columnar facet index for counting documents by field
+values. Each field value is stored as a bitmap of rows (using python integers
+as bit sets) so counts for arbitrary filter combinations only require bitmap
+intersections."""
+import threading
+from collections.abc import Callable, Iterable
+from typing import Any, TypedDict
+
+import numpy as np
+
+
+class FacetField(TypedDict):
+    """Describes how a payload field is indexed."""
+    key: str
+    """The payload key."""
+    values: Callable[[Any], list[str]]
+    """Converts the payload value into the facet values of a row."""
+    order: Callable[[Any], float] | None
+    """Converts the payload value into a number for range queries. If None,
+    the field does not support range queries."""
+
+
+FacetFilter = TypedDict('FacetFilter', {
+    "values": dict[str, list[str]],
+    "ranges": dict[str, tuple[float, float]],
+})
+"""Filter for the facet index. Rows must match all fields. `values` filters
+by facet values where any of the values of a field must match. Fields with
+empty lists are ignored. `ranges` filters by ranges (inclusive on both
+ends)."""
+
+
+def mask_to_bitmap(mask: np.ndarray) -> int:
+    """
+    Converts a boolean row mask into a bitmap.
+
+    Args:
+        mask (np.ndarray): The boolean mask. The index is the row.
+
+    Returns:
+        int: The bitmap. Bit `i` is set if row `i` is set in the mask.
+    """
+    if mask.shape[0] == 0:
+        return 0
+    return int.from_bytes(
+        np.packbits(mask, bitorder="little").tobytes(), "little")
+
+
+def rows_to_bitmap(rows: Iterable[int], size: int) -> int:
+    """
+    Converts rows into a bitmap.
+
+    Args:
+        rows (Iterable[int]): The rows.
+        size (int): The total number of rows.
+
+    Returns:
+        int: The bitmap.
+    """
+    mask = np.zeros((size,), dtype=np.bool_)
+    mask[np.fromiter(rows, dtype=np.int64)] = True
+    return mask_to_bitmap(mask)
+
+
+class FacetIndex:
+    """An in-memory columnar facet index. Rows are identified by point ids.
+    The index is thread-safe."""
+    def __init__(self, fields: list[FacetField], version: str | None) -> None:
+        """
+        Creates an empty facet index.
+
+        Args:
+            fields (list[FacetField]): The fields to index.
+            version (str | None): The version of the data the index
+                represents.
+        """
+        self._lock = threading.RLock()
+        self._fields = {field["key"]: field for field in fields}
+        self._version = version
+        self._rows: dict[str, int] = {}
+        self._free: list[int] = []
+        self._size = 0
+        self._live = 0
+        self._bitmaps: dict[str, dict[str, int]] = {
+            key: {} for key in self._fields
+        }
+        self._row_values: dict[str, dict[int, list[str]]] = {
+            key: {} for key in self._fields
+        }
+        self._orders: dict[str, np.ndarray] = {
+            key: np.zeros((0,), dtype=np.float64)
+            for key, field in self._fields.items()
+            if field["order"] is not None
+        }
+
+    @staticmethod
+    def build(
+            fields: list[FacetField],
+            points: Iterable[tuple[str, dict[str, Any]]],
+            *,
+            version: str | None) -> 'FacetIndex':
+        """
+        Builds an index from scratch. This is much faster than adding the
+        points one by one.
+
+        Args:
+            fields (list[FacetField]): The fields to index.
+            points (Iterable[tuple[str, dict[str, Any]]]): The point ids and
+                their payloads.
+            version (str | None): The version of the data the index
+                represents.
+
+        Returns:
+            FacetIndex: The index.
+        """
+        res = FacetIndex(fields, version)
+        value_rows: dict[str, dict[str, list[int]]] = {
+            key: {} for key in res._fields
+        }
+        orders: dict[str, list[float]] = {key: [] for key in res._orders}
+        for point_id, payload in points:
+            if point_id in res._rows:
+                continue
+            row = res._size
+            res._rows[point_id] = row
+            res._size += 1
+            for key, field in res._fields.items():
+                raw = payload.get(key)
+                values = [] if raw is None else field["values"](raw)
+                if values:
+                    res._row_values[key][row] = values
+                    field_rows = value_rows[key]
+                    for value in values:
+                        field_rows.setdefault(value, []).append(row)
+                order_fn = field["order"]
+                if order_fn is not None:
+                    orders[key].append(
+                        np.nan if raw is None else order_fn(raw))
+        size = res._size
+        res._live = (1 << size) - 1
+        for key, field_rows in value_rows.items():
+            res._bitmaps[key] = {
+                value: rows_to_bitmap(rows, size)
+                for value, rows in field_rows.items()
+            }
+        for key, order_values in orders.items():
+            res._orders[key] = np.array(order_values, dtype=np.float64)
+        return res
+
+    def get_version(self) -> str | None:
+        """
+        The version of the data the index represents.
+
+        Returns:
+            str | None: The version.
+        """
+        return self._version
+
+    def advance_version(self, prev_version: str | None, version: str) -> bool:
+        """
+        Sets the version of the index if it is currently at the previous
+        version. This is used after applying incremental updates.
+
+        Args:
+            prev_version (str | None): The expected current version.
+            version (str): The new version.
+
+        Returns:
+            bool: Whether the version got updated.
+        """
+        with self._lock:
+            if self._version is None or self._version != prev_version:
+                return False
+            self._version = version
+            return True
+
+    def size(self) -> int:
+        """
+        The number of points in the index.
+
+        Returns:
+            int: The number of points.
+        """
+        return self._live.bit_count()
+
+    def _clear_row(self, row: int) -> None:
+        bit = 1 << row
+        for key in self._fields:
+            values = self._row_values[key].pop(row, None)
+            if values is None:
+                continue
+            field_bitmaps = self._bitmaps[key]
+            for value in values:
+                bitmap = field_bitmaps.get(value, 0) & ~bit
+                if bitmap:
+                    field_bitmaps[value] = bitmap
+                else:
+                    field_bitmaps.pop(value, None)
+        for orders in self._orders.values():
+            orders[row] = np.nan
+        self._live &= ~bit
+
+    def set(self, point_id: str, payload: dict[str, Any]) -> None:
+        """
+        Adds or updates a point.
+
+        Args:
+            point_id (str): The point id.
+            payload (dict[str, Any]): The payload of the point.
+        """
+        with self._lock:
+            row = self._rows.get(point_id)
+            if row is None:
+                if self._free:
+                    row = self._free.pop()
+                else:
+                    row = self._size
+                    self._size += 1
+                    for key, orders in self._orders.items():
+                        if orders.shape[0] < self._size:
+                            self._orders[key] = np.concatenate([
+                                orders,
+                                np.full(
+                                    (max(self._size, orders.shape[0]),),
+                                    np.nan),
+                            ])
+                self._rows[point_id] = row
+            else:
+                self._clear_row(row)
+            bit = 1 << row
+            for key, field in self._fields.items():
+                raw = payload.get(key)
+                values = [] if raw is None else field["values"](raw)
+                if values:
+                    self._row_values[key][row] = values
+                    field_bitmaps = self._bitmaps[key]
+                    for value in values:
+                        field_bitmaps[value] = (
+                            field_bitmaps.get(value, 0) | bit)
+                order_fn = field["order"]
+                if order_fn is not None and raw is not None:
+                    self._orders[key][row] = order_fn(raw)
+            self._live |= bit
+
+    def remove(self, point_id: str) -> None:
+        """
+        Removes a point if it exists.
+
+        Args:
+            point_id (str): The point id.
+        """
+        with self._lock:
+            row = self._rows.pop(point_id, None)
+            if row is None:
+                return
+            self._clear_row(row)
+            self._free.append(row)
+
+    def get_mask(self, facet_filter: FacetFilter) -> int:
+        """
+        Computes the bitmap of all rows matching the given filter.
+
+        Args:
+            facet_filter (FacetFilter): The filter.
+
+        Returns:
+            int: The bitmap of matching rows.
+        """
+        with self._lock:
+            res = self._live
+            for key, field_values in facet_filter["values"].items():
+                if not field_values:
+                    continue
+                field_bitmaps = self._bitmaps[key]
+                cur = 0
+                for value in field_values:
+                    cur |= field_bitmaps.get(value, 0)
+                res &= cur
+            for key, (low, high) in facet_filter["ranges"].items():
+                orders = self._orders[key][:self._size]
+                res &= mask_to_bitmap((orders >= low) & (orders <= high))
+            return res
+
+    def get_counts(self, key: str, mask: int) -> dict[str, int]:
+        """
+        Counts the rows of each facet value of a field.
+
+        Args:
+            key (str): The field.
+            mask (int): Only rows in this bitmap are counted.
+
+        Returns:
+            dict[str, int]: The counts of each facet value. Values without
+                rows are omitted.
+        """
+        with self._lock:
+            res: dict[str, int] = {}
+            for value, bitmap in self._bitmaps[key].items():
+                count = (bitmap & mask).bit_count()
+                if count > 0:
+                    res[value] = count
+            return res
+
+    def get_values(self, key: str) -> list[str]:
+        """
+        All facet values of a field.
+
+        Args:
+            key (str): The field.
+
+        Returns:
+            list[str]: The facet values.
+        """
+        with self._lock:
+            return list(self._bitmaps[key].keys())
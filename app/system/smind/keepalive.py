@@ -20,6 +20,7 @@ import time
 from typing import Protocol
 
 from qdrant_client import QdrantClient
+from redipy import Redis
 
 from app.system.db.db import DBConnector
 from app.system.smind.api import GraphProfile
@@ -35,6 +36,7 @@ class VecSearch(Protocol):  # pylint: disable=too-few-public-methods
             vec_db: QdrantClient,
             input_str: str,
             *,
+            qdrant_cache: Redis,
             articles: str,
             articles_graph: GraphProfile,
             filters: dict[MetaKey, list[str]] | None,
@@ -56,6 +58,7 @@ class VecSearch(Protocol):  # pylint: disable=too-few-public-methods
             db (DBConnector): The database connector.
             vec_db (QdrantClient): The vector database client.
             input_str (str): The search query.
+            qdrant_cache (Redis): The cache for query embeddings.
             articles (str): The vector database name.
             articles_graph (GraphProfile): The embedding model.
             filters (dict[MetaKey, list[str]] | None): Query filters. A mapping
@@ -86,6 +89,8 @@ MAIN_DB: DBConnector | None = None
 """The database connector for the keepalive query."""
 MAIN_VEC_DB: QdrantClient | None = None
 """The vector database client for the keepalive query."""
+MAIN_CACHE: Redis | None = None
+"""The cache for query embeddings for the keepalive query."""
 MAIN_ARTICLES: str | None = None
 """The vector database name for the keepalive query."""
 MAIN_GRAPH: GraphProfile | None = None
@@ -106,6 +111,7 @@ def set_main_articles(
         db: DBConnector,
         vec_db: QdrantClient,
         *,
+        qdrant_cache: Redis,
         articles: str,
         articles_graph: GraphProfile,
         vec_search_fn: VecSearch) -> None:
@@ -115,6 +121,7 @@ def set_main_articles(
     Args:
         db (DBConnector): The database connector.
         vec_db (QdrantClient): The vector database client.
+        qdrant_cache (Redis): The cache for query embeddings.
         articles (str): The vector database name.
         articles_graph (GraphProfile): The embedding model.
         vec_search_fn (VecSearch): The search function.
@@ -124,6 +131,7 @@ def set_main_articles(
     """
     global MAIN_DB  # pylint: disable=global-statement
     global MAIN_VEC_DB  # pylint: disable=global-statement
+    global MAIN_CACHE  # pylint: disable=global-statement
     global MAIN_ARTICLES  # pylint: disable=global-statement
     global MAIN_GRAPH  # pylint: disable=global-statement
     global MAIN_FN  # pylint: disable=global-statement
@@ -135,6 +143,7 @@ def set_main_articles(
 
     MAIN_DB = db
     MAIN_VEC_DB = vec_db
+    MAIN_CACHE = qdrant_cache
     MAIN_ARTICLES = articles
     MAIN_GRAPH = articles_graph
     MAIN_FN = vec_search_fn
@@ -167,6 +176,7 @@ def update_last_query(*, long_time: bool, update_time: bool = True) -> None:
         return
     m_db = MAIN_DB
     m_vec_db = MAIN_VEC_DB
+    m_cache = MAIN_CACHE
     m_lock = KEEP_ALIVE_LOCK
     m_articles = MAIN_ARTICLES
     m_articles_graph = MAIN_GRAPH
@@ -176,12 +186,14 @@ def update_last_query(*, long_time: bool, update_time: bool = True) -> None:
     if (
             m_db is None
             or m_vec_db is None
+            or m_cache is None
             or m_lock is None
             or m_articles is None
             or m_articles_graph is None):
         raise ValueError(f"must call {set_main_articles.__name__} first!")
     db = m_db
     vec_db = m_vec_db
+    qdrant_cache = m_cache
     lock = m_lock
     articles = m_articles
     articles_graph = m_articles_graph
@@ -196,6 +208,7 @@ def update_last_query(*, long_time: bool, update_time: bool = True) -> None:
                     db,
                     vec_db,
                     input_str,
+                    qdrant_cache=qdrant_cache,
                     articles=articles,
                     articles_graph=articles_graph,
                     filters=None,
@@ -40,35 +40,53 @@ from app.misc.util import (
     to_list,
 )
 from app.system.db.db import DBConnector
-from app.system.language.pipeline import extract_language
+from app.system.language.pipeline import extract_language, extract_languages
 from app.system.location.response import LanguageStr
 from app.system.prep.clean import normalize_text, sanity_check
 from app.system.prep.fulltext import TagFn
 from app.system.prep.snippify import snippify_text
 from app.system.smind.api import (
     clear_redis,
-    get_text_results_immediate,
+    get_text_results_batched,
     GraphProfile,
 )
-from app.system.smind.cache import cached, clear_cache
+from app.system.smind.cache import (
+    bump_generation,
+    CACHE_EXPIRE,
+    cached,
+    cached_embeds,
+    clear_cache,
+    get_cache_key,
+    get_generation,
+    normalize_embed_text,
+    SNIPPET_EMBED_EXPIRE,
+    SNIPPET_EMBED_PREFIX,
+)
 from app.system.smind.keepalive import update_last_query
 from app.system.smind.log import log_query
 from app.system.smind.vec import (
-    add_embed,
+    add_embeds,
+    advance_facet_index,
+    compute_meta_hash,
+    compute_snippet_hash,
     EmbedChunk,
     EmbedMain,
     get_doc,
+    get_doc_hashes,
+    get_main_id,
+    HashTup,
     MetaKey,
     MetaObject,
+    peek_facet_index,
     query_docs,
     query_embed,
     QueryEmbed,
     ResultChunk,
     search_docs,
-    stat_embed,
-    stat_total,
+    stat_fields,
     StatEmbed,
     to_result,
+    update_meta,
     vec_flushall,
 )
 from app.system.urlinspect.inspect import inspect_url
@@ -83,6 +101,41 @@ AddEmbed = TypedDict('AddEmbed', {
 the previous number of snippets, `snippets` is the new number of snippets, and
 `failed` is snippets that could not be added."""
 
+AddThroughput = TypedDict('AddThroughput', {
+    "docs": int,
+    "unchanged": int,
+    "meta_only": int,
+    "snippets": int,
+    "short_snippets": int,
+    "preprocess_docs_per_s": float,
+    "check_docs_per_s": float,
+    "embed_snippets_per_s": float,
+    "short_snippets_per_s": float,
+    "vec_docs_per_s": float,
+    "total_docs_per_s": float,
+})
+"""Throughput of each stage when adding documents to the vector database.
+`unchanged` documents are skipped entirely and `meta_only` documents only get
+their meta data updated. Neither are embedded."""
+AddEmbedBulk = TypedDict('AddEmbedBulk', {
+    "docs": list[AddEmbed],
+    "throughput": AddThroughput,
+})
+"""Information about documents added to the vector database. `docs` contains
+the information of each document in the order of the input."""
+
+
+VecAddDoc = TypedDict('VecAddDoc', {
+    "input_str": str,
+    "base": str,
+    "doc_id": int,
+    "url": str,
+    "title": str | None,
+    "meta_obj": MetaObject,
+})
+"""A document to be added to the vector database. `input_str` is the full
+document content. If `title` is None it is inferred from the content."""
+
 
 class GetVecDB(Protocol):  # pylint: disable=too-few-public-methods
     """Function to get the internal name of a vector database."""
@@ -123,6 +176,23 @@ ClearResponse = TypedDict('ClearResponse', {
 """Which app components were cleared / deleted / dropped / indexed."""
 
 
+SearchCursor = TypedDict('SearchCursor', {
+    "query_hash": str,
+    "seen": list[str],
+    "offset": int,
+})
+"""State of a cursor based search. `query_hash` identifies the query (without
+the page size), `seen` are the main ids of the documents of the previous page,
+and `offset` is the number of documents returned so far."""
+
+
+CURSOR_PREFIX = "cursor"
+"""Redis key prefix for search cursors. Cursors are not cleared when the
+vector database changes."""
+CURSOR_EXPIRE = 60 * 60.0  # 1h
+"""Expiration time of search cursors in seconds."""
+
+
 def vec_clear(
         vec_db: QdrantClient,
         smind_config: str,
@@ -143,7 +213,8 @@ def vec_clear(
         index_vecdb_main: bool,
         index_vecdb_test: bool) -> ClearResponse:
     """
-    Clears / indexes app components.
+    Clears / indexes app components. The caches of cleared or indexed vector
+    databases are invalidated.
 
     Args:
         vec_db (QdrantClient): The vector database client.
@@ -223,27 +294,35 @@ def vec_clear(
             clear_vecdb_test = False
     if clear_vecdb_main:
         try:
-            get_vec_db(name="main", force_clear=True, force_index=False)
+            db_name = get_vec_db(
+                name="main", force_clear=True, force_index=False)
+            bump_generation(qdrant_cache, db_name, on_bump=None)
             index_vecdb_main = False
         except Exception:  # pylint: disable=broad-except
             print(traceback.format_exc())
             clear_vecdb_main = False
     if clear_vecdb_test:
         try:
-            get_vec_db(name="test", force_clear=True, force_index=False)
+            db_name = get_vec_db(
+                name="test", force_clear=True, force_index=False)
+            bump_generation(qdrant_cache, db_name, on_bump=None)
             index_vecdb_test = False
         except Exception:  # pylint: disable=broad-except
             print(traceback.format_exc())
             clear_vecdb_test = False
     if index_vecdb_main:
         try:
-            get_vec_db(name="main", force_clear=False, force_index=True)
+            db_name = get_vec_db(
+                name="main", force_clear=False, force_index=True)
+            bump_generation(qdrant_cache, db_name, on_bump=None)
         except Exception:  # pylint: disable=broad-except
             print(traceback.format_exc())
             index_vecdb_main = False
     if index_vecdb_test:
         try:
-            get_vec_db(name="test", force_clear=False, force_index=True)
+            db_name = get_vec_db(
+                name="test", force_clear=False, force_index=True)
+            bump_generation(qdrant_cache, db_name, on_bump=None)
         except Exception:  # pylint: disable=broad-except
             print(traceback.format_exc())
             index_vecdb_test = False
@@ -267,14 +346,10 @@ LOW_CUTOFF_DATE = parse_time_str("1971-01-01T00:00:00.000+0000").date()
 """Cutoff date for invalid / non-sensical dates."""
 
 
-def vec_add(
+def prepare_embed_main(
         db: DBConnector,
-        vec_db: QdrantClient,
         input_str: str,
         *,
-        qdrant_cache: Redis,
-        articles: str,
-        articles_graph: GraphProfile,
         ner_graphs: dict[LanguageStr, GraphProfile],
         get_tag: TagFn,
         user: uuid.UUID,
@@ -282,17 +357,13 @@ def vec_add(
         doc_id: int,
         url: str,
         title: str | None,
-        meta_obj: MetaObject) -> AddEmbed:
+        meta_obj: MetaObject) -> EmbedMain:
     """
-    Adds a document to the vector database.
+    Validates the information of a document and fills in missing meta data.
 
     Args:
         db (DBConnector): The database connector.
-        vec_db (QdrantClient): The vector database client.
         input_str (str): The full document content.
-        qdrant_cache (Redis): The vector database cache redis.
-        articles (str): The internal vector database name.
-        articles_graph (GraphProfile): The embedding model.
         ner_graphs (dict[LanguageStr, GraphProfile]): NER models for different
             languages.
         get_tag (TagFn): Function to return the tag (i.e., country) of the
@@ -305,17 +376,9 @@ def vec_add(
         meta_obj (MetaObject): The document meta data.
 
     Returns:
-        AddEmbed: Information about the added snippets.
+        EmbedMain: The meta data and row info.
     """
-    update_last_query(long_time=True)
     main_id = f"{base}:{doc_id}"
-    # FIXME: make "smart" features optional
-    full_start = time.monotonic()
-    # clear caches
-    cache_start = time.monotonic()
-    clear_cache(qdrant_cache, db_name=articles)
-    cache_time = time.monotonic() - cache_start
-    preprocess_start = time.monotonic()
     # validate title
     title = normalize_text(sanity_check(title))
     if not title:
@@ -406,62 +469,306 @@ def vec_add(
     else:
         meta_obj["iso3"][url_iso3] = 1.0
     country_time = time.monotonic() - country_start
-    preprocess_time = time.monotonic() - preprocess_start
-    # compute embedding
-    embed_start = time.monotonic()
-    if not input_str:
-        snippets: list[str] = []
-        embeds: list[list[float] | None] = []
-    else:
-        snippets = [
-            snippet
-            for (snippet, _) in snippify_text(
-                input_str,
-                chunk_size=CHUNK_SIZE,
-                chunk_padding=CHUNK_PADDING)
-        ]
-        embeds = get_text_results_immediate(
-            snippets,
-            graph_profile=articles_graph,
-            output_sample=[1.0])
-    embed_main: EmbedMain = {
+    print(
+        f"preparing {main_id} took {language_time=}s {country_time=}s")
+    return {
         "base": base,
         "doc_id": doc_id,
         "url": url,
         "title": title,
         "meta": meta_obj,
     }
-    embed_chunks: list[EmbedChunk] = [
-        {
-            "chunk_id": chunk_id,
-            "embed": embed,
-            "snippet": snippet,
+
+
+def vec_add(
+        db: DBConnector,
+        vec_db: QdrantClient,
+        input_str: str,
+        *,
+        qdrant_cache: Redis,
+        articles: str,
+        articles_graph: GraphProfile,
+        ner_graphs: dict[LanguageStr, GraphProfile],
+        get_tag: TagFn,
+        user: uuid.UUID,
+        base: str,
+        doc_id: int,
+        url: str,
+        title: str | None,
+        meta_obj: MetaObject,
+        precompute_short_snippets: bool = False) -> AddEmbed:
+    """
+    Adds a document to the vector database.
+
+    Args:
+        db (DBConnector): The database connector.
+        vec_db (QdrantClient): The vector database client.
+        input_str (str): The full document content.
+        qdrant_cache (Redis): The vector database cache redis.
+        articles (str): The internal vector database name.
+        articles_graph (GraphProfile): The embedding model.
+        ner_graphs (dict[LanguageStr, GraphProfile]): NER models for different
+            languages.
+        get_tag (TagFn): Function to return the tag (i.e., country) of the
+            document.
+        user (uuid.UUID): The user uuid.
+        base (str): The document base.
+        doc_id (int): The document id.
+        url (str): The document URL.
+        title (str | None): The document title. If None it will be inferred.
+        meta_obj (MetaObject): The document meta data.
+        precompute_short_snippets (bool, optional): Whether to compute the
+            embeddings of short snippets (see `snippet_post`) of the document
+            ahead of time. The embeddings are stored in the embedding cache
+            under their own prefix (see `SNIPPET_EMBED_PREFIX`) so refining
+            snippets at query time only needs a lookup. Defaults to False.
+
+    Returns:
+        AddEmbed: Information about the added snippets.
+    """
+    res = vec_add_bulk(
+        db,
+        vec_db,
+        [
+            {
+                "input_str": input_str,
+                "base": base,
+                "doc_id": doc_id,
+                "url": url,
+                "title": title,
+                "meta_obj": meta_obj,
+            },
+        ],
+        qdrant_cache=qdrant_cache,
+        articles=articles,
+        articles_graph=articles_graph,
+        ner_graphs=ner_graphs,
+        get_tag=get_tag,
+        user=user,
+        precompute_short_snippets=precompute_short_snippets,
+        wait=False)
+    return res["docs"][0]
+
+
+def vec_add_bulk(
+        db: DBConnector,
+        vec_db: QdrantClient,
+        docs: list[VecAddDoc],
+        *,
+        qdrant_cache: Redis,
+        articles: str,
+        articles_graph: GraphProfile,
+        ner_graphs: dict[LanguageStr, GraphProfile],
+        get_tag: TagFn,
+        user: uuid.UUID,
+        precompute_short_snippets: bool,
+        wait: bool,
+        invalidate_interval: float | None = None) -> AddEmbedBulk:
+    """
+    Adds multiple documents to the vector database. The snippets of all
+    documents are embedded together and the vector database is updated in
+    large batches.
+
+    Args:
+        db (DBConnector): The database connector.
+        vec_db (QdrantClient): The vector database client.
+        docs (list[VecAddDoc]): The documents.
+        qdrant_cache (Redis): The vector database cache redis.
+        articles (str): The internal vector database name.
+        articles_graph (GraphProfile): The embedding model.
+        ner_graphs (dict[LanguageStr, GraphProfile]): NER models for different
+            languages.
+        get_tag (TagFn): Function to return the tag (i.e., country) of the
+            documents.
+        user (uuid.UUID): The user uuid.
+        precompute_short_snippets (bool): Whether to compute the embeddings of
+            short snippets of the documents ahead of time. See `vec_add`.
+        wait (bool): Whether to wait for the vector database to apply all
+            changes before returning.
+        invalidate_interval (float | None, optional): If set, the caches of
+            the vector database are cleared at most once in the given interval
+            in seconds. This is useful when adding many batches in a row.
+            Defaults to None.
+
+    Returns:
+        AddEmbedBulk: Information about the added documents and the throughput
+            of each stage.
+    """
+    update_last_query(long_time=True)
+    # FIXME: make "smart" features optional
+    full_start = time.monotonic()
+    # validate and fill meta data
+    preprocess_start = time.monotonic()
+    lang_docs = [
+        doc
+        for doc in docs
+        if doc["meta_obj"].get("language") is None
+    ]
+    lang_results = extract_languages(
+        db, [doc["input_str"] for doc in lang_docs], user)
+    for doc, lang_res in zip(lang_docs, lang_results):
+        doc["meta_obj"]["language"] = {
+            lang_obj["lang"]: lang_obj["score"]
+            for lang_obj in lang_res["languages"]
         }
-        for chunk_id, (snippet, embed) in enumerate(zip(snippets, embeds))
-        if embed is not None
+    embed_mains = [
+        prepare_embed_main(
+            db,
+            doc["input_str"],
+            ner_graphs=ner_graphs,
+            get_tag=get_tag,
+            user=user,
+            base=doc["base"],
+            doc_id=doc["doc_id"],
+            url=doc["url"],
+            title=doc["title"],
+            meta_obj=doc["meta_obj"])
+        for doc in docs
+    ]
+    preprocess_time = time.monotonic() - preprocess_start
+    doc_snippets: list[list[str]] = [
+        [
+            snippet
+            for (snippet, _) in snippify_text(
+                doc["input_str"],
+                chunk_size=CHUNK_SIZE,
+                chunk_padding=CHUNK_PADDING)
+        ] if doc["input_str"] else []
+        for doc in docs
     ]
+    # detect unchanged documents
+    check_start = time.monotonic()
+    prev_hashes = get_doc_hashes(vec_db, articles, embed_mains)
+    results: list[AddEmbed | None] = [None] * len(docs)
+    add_ixs: list[int] = []
+    meta_docs: list[tuple[EmbedMain, HashTup]] = []
+    for doc_ix, (embed_main, snippets) in enumerate(
+            zip(embed_mains, doc_snippets)):
+        snippet_hash = compute_snippet_hash(snippets)
+        prev = prev_hashes.get(get_main_id(embed_main))
+        if prev is None or prev[0] != snippet_hash:
+            add_ixs.append(doc_ix)
+            continue
+        if prev[1] != compute_meta_hash(embed_main):
+            meta_docs.append((embed_main, snippet_hash))
+        _, count = snippet_hash
+        results[doc_ix] = {
+            "previous": count,
+            "snippets": count,
+            "failed": 0,
+        }
+    # NOTE: only the index that is current before any writes receives all
+    # changes (a concurrent rebuild might miss some of them)
+    facets = peek_facet_index(articles)
+    update_meta(vec_db, name=articles, docs=meta_docs, wait=wait)
+    check_time = time.monotonic() - check_start
+    # compute embeddings
+    embed_start = time.monotonic()
+    all_embeds = get_text_results_batched(
+        [
+            snippet
+            for doc_ix in add_ixs
+            for snippet in doc_snippets[doc_ix]
+        ],
+        graph_profile=articles_graph,
+        output_sample=[1.0])
+    doc_chunks: list[list[EmbedChunk]] = []
+    doc_failed: list[int] = []
+    embed_offset = 0
+    for doc_ix in add_ixs:
+        snippets = doc_snippets[doc_ix]
+        embeds = all_embeds[embed_offset:embed_offset + len(snippets)]
+        embed_offset += len(snippets)
+        doc_chunks.append([
+            {
+                "chunk_id": chunk_id,
+                "embed": embed,
+                "snippet": snippet,
+            }
+            for chunk_id, (snippet, embed) in enumerate(zip(snippets, embeds))
+            if embed is not None
+        ])
+        doc_failed.append(sum(1 if embed is None else 0 for embed in embeds))
     embed_time = time.monotonic() - embed_start
-    # add embedding to vecdb
+    short_start = time.monotonic()
+    short_count = 0
+    if precompute_short_snippets:
+        short_snippets = [
+            short_snippet
+            for chunks in doc_chunks
+            for embed_chunk in chunks
+            for short_snippet in get_short_snippets(embed_chunk["snippet"])
+        ]
+        cached_embeds(
+            qdrant_cache,
+            short_snippets,
+            graph_profile=articles_graph,
+            prefix=SNIPPET_EMBED_PREFIX,
+            expire_in=SNIPPET_EMBED_EXPIRE,
+            use_lru=False)
+        short_count = len(short_snippets)
+    short_time = time.monotonic() - short_start
+    # add embeddings to vecdb
     vec_start = time.monotonic()
-    # print(f"{len(input_str)=} vs {len(embed_chunks)=}")
-    prev_count, new_count = add_embed(
+    counts = add_embeds(
         vec_db,
         name=articles,
-        data=embed_main,
+        docs=[
+            (embed_mains[doc_ix], chunks)
+            for doc_ix, chunks in zip(add_ixs, doc_chunks)
+        ],
         embed_size=articles_graph.get_output_size(),
-        chunks=embed_chunks)
-    failed = sum(1 if embed is None else 0 for embed in embeds)
+        wait=wait)
+    for doc_ix, (prev_count, new_count), failed in zip(
+            add_ixs, counts, doc_failed):
+        results[doc_ix] = {
+            "previous": prev_count,
+            "snippets": new_count,
+            "failed": failed,
+        }
     vec_time = time.monotonic() - vec_start
+    # clear caches if anything was written
+    cache_start = time.monotonic()
+
+    def on_bump(prev_generation: str | None, generation: str) -> None:
+        # NOTE: the local facet index received all changes so it can stay if
+        # it was up to date before and has not been rebuilt in the meantime
+        advance_facet_index(articles, facets, prev_generation, generation)
+
+    if add_ixs or meta_docs:
+        clear_cache(
+            qdrant_cache,
+            db_name=articles,
+            coalesce=invalidate_interval,
+            on_bump=on_bump)
+    cache_time = time.monotonic() - cache_start
     full_time = time.monotonic() - full_start
+
+    def rate(count: int, duration: float) -> float:
+        return count / duration if duration > 0.0 else 0.0
+
+    doc_count = len(docs)
+    snippet_count = len(all_embeds)
+    throughput: AddThroughput = {
+        "docs": doc_count,
+        "unchanged": doc_count - len(add_ixs) - len(meta_docs),
+        "meta_only": len(meta_docs),
+        "snippets": snippet_count,
+        "short_snippets": short_count,
+        "preprocess_docs_per_s": rate(doc_count, preprocess_time),
+        "check_docs_per_s": rate(doc_count, check_time),
+        "embed_snippets_per_s": rate(snippet_count, embed_time),
+        "short_snippets_per_s": rate(short_count, short_time),
+        "vec_docs_per_s": rate(len(add_ixs), vec_time),
+        "total_docs_per_s": rate(doc_count, full_time),
+    }
     print(
-        f"adding {main_id} took "
-        f"{full_time=}s {preprocess_time=}s {embed_time=}s {vec_time=}s "
-        f"{language_time=}s {country_time=}s {cache_time=}s "
-        f"{prev_count=} {new_count=} {failed=}")
+        f"adding {doc_count} documents took "
+        f"{full_time=}s {preprocess_time=}s {check_time=}s {embed_time=}s "
+        f"{vec_time=}s {cache_time=}s {short_time=}s {throughput=}")
     return {
-        "previous": prev_count,
-        "snippets": new_count,
-        "failed": failed,
+        "docs": [result for result in results if result is not None],
+        "throughput": throughput,
     }
 
 
@@ -492,77 +799,70 @@ def get_filter_hash(filters: dict[MetaKey, list[str]] | None) -> str:
     return blake.hexdigest()
 
 
-def vec_filter_total(
-        vec_db: QdrantClient,
+def get_search_hash(
+        input_str: str,
         *,
-        qdrant_cache: Redis,
-        articles: str,
-        filters: dict[MetaKey, list[str]] | None) -> int:
+        articles_graph: GraphProfile,
+        filters: dict[MetaKey, list[str]] | None,
+        offset: int | None,
+        limit: int,
+        hit_limit: int,
+        score_threshold: float | None,
+        short_snippets: bool) -> str:
     """
-    Computes how many documents in total are retained after using the given
-    filter.
+    Compute the hash value of a semantic search.
 
     Args:
-        vec_db (QdrantClient): The vector database client.
-        qdrant_cache (Redis): The vector database cache redis
-        articles (str): The internal vector database name.
+        input_str (str): The search query.
+        articles_graph (GraphProfile): The embedding model.
         filters (dict[MetaKey, list[str]] | None): The filter.
+        offset (int | None): The offset of the returned results.
+        limit (int): The maximum number of returned results.
+        hit_limit (int): The maximum number of hit snippets per result.
+        score_threshold (float | None): The score threshold.
+        short_snippets (bool): Whether hit snippets are refined.
 
     Returns:
-        int: Number of documents after applying the filter.
+        str: The hash value.
     """
-    if filters is not None:
-        filters = {
-            key: to_list(value)
-            for key, value in filters.items()
-            if to_list(value)
-        }
-    return cached(
-        qdrant_cache,
-        cache_type="total",
-        db_name=articles,
-        cache_hash=get_filter_hash(filters),
-        compute_fn=lambda: stat_total(vec_db, articles, filters=filters),
-        pre_cache_fn=str,
-        post_fn=int)
+    blake = hashlib.blake2b(digest_size=32)
+    for part in (
+            articles_graph.get_ns().get(),
+            normalize_embed_text(input_str),
+            get_filter_hash(filters),
+            f"{0 if offset is None else offset}",
+            f"{limit}",
+            f"{hit_limit}",
+            f"{score_threshold}",
+            f"{short_snippets}"):
+        part_bytes = part.encode("utf-8")
+        blake.update(f"{len(part_bytes)}:".encode("utf-8"))
+        blake.update(part_bytes)
+    return blake.hexdigest()
 
 
-def vec_filter_field(
-        vec_db: QdrantClient,
-        field: MetaKey,
+def get_stat_filters(
+        filters: dict[MetaKey, list[str]] | None,
         *,
-        qdrant_cache: Redis,
-        articles: str,
-        filters: dict[MetaKey, list[str]] | None) -> dict[str, int]:
+        skip_field: MetaKey | None) -> dict[MetaKey, list[str]] | None:
     """
-    Return the number of documents for each field value after applying the
-    filter.
+    Normalizes a filter for computing statistics.
 
     Args:
-        vec_db (QdrantClient): The vector database client.
-        field (MetaKey): The field to retrieve information for.
-        qdrant_cache (Redis): The vector database cache redis.
-        articles (str): The internal vector database name.
-        filters (dict[MetaKey, list[str]] | None): The filters.
+        filters (dict[MetaKey, list[str]] | None): The filter.
+        skip_field (MetaKey | None): If set, the filter of this field is
+            removed.
 
     Returns:
-        dict[str, int]: Field values mapped to counts.
+        dict[MetaKey, list[str]] | None: The filter without empty values.
     """
-    if filters is not None:
-        filters = {
-            key: to_list(value)
-            for key, value in filters.items()
-            if key != field and to_list(value)
-        }
-    return cached(
-        qdrant_cache,
-        cache_type="field",
-        db_name=f"{articles}:{field}",
-        cache_hash=get_filter_hash(filters),
-        compute_fn=lambda: stat_embed(
-            vec_db, articles, field=field, filters=filters),
-        pre_cache_fn=json_compact_str,
-        post_fn=json_maybe_read)
+    if filters is None:
+        return None
+    return {
+        key: to_list(value)
+        for key, value in filters.items()
+        if key != skip_field and to_list(value)
+    }
 
 
 def vec_filter(
@@ -574,6 +874,9 @@ def vec_filter(
         filters: dict[MetaKey, list[str]] | None) -> StatEmbed:
     """
     Provide full information about document counts after applying a filter.
+    The total and each field are cached individually. All missing values are
+    computed together from the facet index. Concurrent requests share the
+    facet index build (see `get_facet_index`).
 
     Args:
         vec_db (QdrantClient): The vector database client.
@@ -586,21 +889,62 @@ def vec_filter(
         StatEmbed: Statistics about total document counts and requested field
             document counts.
     """
-    return {
-        "doc_count": vec_filter_total(
+    filters = get_stat_filters(filters, skip_field=None)
+    field_list = sorted(fields)
+    generation = get_generation(qdrant_cache, articles)
+    total_key = get_cache_key(
+        articles, generation, "total", get_filter_hash(filters))
+    field_keys = [
+        get_cache_key(
+            articles,
+            generation,
+            f"field:{field}",
+            get_filter_hash(get_stat_filters(filters, skip_field=field)))
+        for field in field_list
+    ]
+    with qdrant_cache.pipeline() as pipe:
+        pipe.get_value(total_key)
+        for field_key in field_keys:
+            pipe.get_value(field_key)
+        cache_res: list[str | None] = pipe.execute()
+    total_str = cache_res[0]
+    doc_count = int(total_str) if total_str else None
+    res_fields: dict[MetaKey, dict[str, int]] = {}
+    missing_fields: list[MetaKey] = []
+    for field, field_key, field_str in zip(
+            field_list, field_keys, cache_res[1:]):
+        field_res = json_maybe_read(field_str) if field_str else None
+        if field_res is None:
+            print(f"FIELD CACHE MISS {field_key}")
+            missing_fields.append(field)
+        else:
+            print(f"FIELD CACHE HIT {field_key}")
+            res_fields[field] = field_res
+    print(f"TOTAL CACHE {'MISS' if doc_count is None else 'HIT'} {total_key}")
+    if doc_count is None or missing_fields:
+        stats = stat_fields(
             vec_db,
-            qdrant_cache=qdrant_cache,
-            articles=articles,
-            filters=filters),
-        "fields": {
-            field: vec_filter_field(
-                vec_db,
-                field,
-                qdrant_cache=qdrant_cache,
-                articles=articles,
-                filters=filters)
-            for field in fields
-        },
+            articles,
+            fields=missing_fields,
+            filters=filters,
+            facet_version=generation)
+        with qdrant_cache.pipeline() as pipe:
+            if doc_count is None:
+                doc_count = stats["doc_count"]
+                pipe.set_value(
+                    total_key, str(doc_count), expire_in=CACHE_EXPIRE)
+            for field, field_key in zip(field_list, field_keys):
+                if field not in missing_fields:
+                    continue
+                res_fields[field] = stats["fields"][field]
+                pipe.set_value(
+                    field_key,
+                    json_compact_str(stats["fields"][field]),
+                    expire_in=CACHE_EXPIRE)
+            pipe.execute()
+    return {
+        "doc_count": doc_count,
+        "fields": {field: res_fields[field] for field in field_list},
     }
 
 
@@ -627,18 +971,41 @@ def apply_snippets(
     return [apply(ix, hit) for (ix, hit) in enumerate(hits)]
 
 
+def get_short_snippets(snippet: str) -> list[str]:
+    """
+    Splits a hit snippet into short snippets.
+
+    Args:
+        snippet (str): The hit snippet.
+
+    Returns:
+        list[str]: The short snippets.
+    """
+    return [
+        snap.strip()
+        for (snap, _) in snippify_text(
+            re.sub(r"\s+", " ", snippet).strip(),
+            chunk_size=SMALL_CHUNK_SIZE,
+            chunk_padding=CHUNK_PADDING)
+        if snap.strip()
+    ]
+
+
 def snippet_post(
         hits: list[ResultChunk],
         *,
+        qdrant_cache: Redis,
         embed: list[float],
         articles_graph: GraphProfile,
         short_snippets: bool,
         hit_limit: int) -> tuple[list[ResultChunk], int]:
     """
-    Performs snippet refinement for the given query results.
+    Performs snippet refinement for the given query results. Embeddings of
+    short snippets are cached.
 
     Args:
         hits (list[ResultChunk]): The query results.
+        qdrant_cache (Redis): The cache for snippet embeddings.
         embed (list[float]): Query embedding.
         articles_graph (GraphProfile): The embedding model.
         short_snippets (bool): Whether to return short snippets. That is the
@@ -660,21 +1027,19 @@ def snippet_post(
     if not short_snippets:
         return (apply_snippets(hits, process_snippets), 0)
     small_snippets: list[tuple[int, str]] = [
-        (ix, snap.strip())
+        (ix, snap)
         for (ix, hit) in enumerate(hits)
         for snip in hit["snippets"]
-        for (snap, _) in snippify_text(
-            re.sub(r"\s+", " ", snip).strip(),
-            chunk_size=SMALL_CHUNK_SIZE,
-            chunk_padding=CHUNK_PADDING)
-        if snap.strip()
+        for snap in get_short_snippets(snip)
     ]
     sembeds: list[tuple[tuple[int, str], list[float]]] = [
         (ssnip, sembed)
-        for ssnip, sembed in zip(small_snippets, get_text_results_immediate(
+        for ssnip, sembed in zip(small_snippets, cached_embeds(
+            qdrant_cache,
             [snip for (_, snip) in small_snippets],
             graph_profile=articles_graph,
-            output_sample=[1.0]))
+            prefix=SNIPPET_EMBED_PREFIX,
+            expire_in=SNIPPET_EMBED_EXPIRE))
         if sembed is not None
     ]
     lookup = dot_order(embed, sembeds, hit_limit)
@@ -690,6 +1055,7 @@ def vec_search(
         vec_db: QdrantClient,
         input_str: str,
         *,
+        qdrant_cache: Redis,
         articles: str,
         articles_graph: GraphProfile,
         filters: dict[MetaKey, list[str]] | None,
@@ -711,6 +1077,7 @@ def vec_search(
         db (DBConnector): The database connector.
         vec_db (QdrantClient): The vector database client.
         input_str (str): The search query.
+        qdrant_cache (Redis): The cache for query embeddings.
         articles (str): The vector database name.
         articles_graph (GraphProfile): The embedding model.
         filters (dict[MetaKey, list[str]] | None): Query filters. A mapping
@@ -790,10 +1157,8 @@ def vec_search(
                 "status": "ok",
             }
     embed_start = time.monotonic()
-    embed = get_text_results_immediate(
-        [input_str],
-        graph_profile=articles_graph,
-        output_sample=[1.0])[0]
+    embed = cached_embeds(
+        qdrant_cache, [input_str], graph_profile=articles_graph)[0]
     embed_time = time.monotonic() - embed_start
 
     if embed is None:
@@ -802,33 +1167,231 @@ def vec_search(
             "status": "error",
         }
 
-    query_start = time.monotonic()
-    hits = query_embed(
-        vec_db,
-        articles,
-        embed,
-        offset=offset,
-        limit=limit,
-        hit_limit=hit_limit,
-        score_threshold=score_threshold,
-        filters=filters)
-    query_time = time.monotonic() - query_start
+    def compute_hits() -> list[ResultChunk]:
+        assert embed is not None
+        query_start = time.monotonic()
+        hits = query_embed(
+            vec_db,
+            articles,
+            embed,
+            offset=offset,
+            limit=limit,
+            hit_limit=hit_limit,
+            score_threshold=score_threshold,
+            filters=filters)
+        query_time = time.monotonic() - query_start
 
-    snippy_start = time.monotonic()
-    final_hits, snippy_embeds = snippet_post(
-        hits,
-        embed=embed,
-        articles_graph=articles_graph,
-        short_snippets=short_snippets,
-        hit_limit=hit_limit)
-    snippy_time = time.monotonic() - snippy_start
+        snippy_start = time.monotonic()
+        res_hits, snippy_embeds = snippet_post(
+            hits,
+            qdrant_cache=qdrant_cache,
+            embed=embed,
+            articles_graph=articles_graph,
+            short_snippets=short_snippets,
+            hit_limit=hit_limit)
+        snippy_time = time.monotonic() - snippy_start
+        print(
+            f"query for '{input_str}' computed "
+            f"{query_time=}s {snippy_time=}s {snippy_embeds=}")
+        return res_hits
+
+    search_start = time.monotonic()
+    final_hits: list[ResultChunk] = cached(
+        qdrant_cache,
+        cache_type="search",
+        db_name=articles,
+        cache_hash=get_search_hash(
+            input_str,
+            articles_graph=articles_graph,
+            filters=filters,
+            offset=offset,
+            limit=limit,
+            hit_limit=hit_limit,
+            score_threshold=score_threshold,
+            short_snippets=short_snippets),
+        compute_fn=compute_hits,
+        pre_cache_fn=json_compact_str,
+        post_fn=json_maybe_read)
+    search_time = time.monotonic() - search_start
 
     full_time = time.monotonic() - full_start
     print(
         f"query for '{input_str}' took "
-        f"{full_time=}s {log_time=}s {embed_time=}s {query_time=}s "
-        f"{snippy_time=}s {snippy_embeds=}")
+        f"{full_time=}s {log_time=}s {embed_time=}s {search_time=}s")
     return {
         "hits": final_hits,
         "status": "ok",
     }
+
+
+def get_cursor_key(articles: str, cursor: str) -> str:
+    """
+    Computes the redis key of a search cursor.
+
+    Args:
+        articles (str): The vector database name.
+        cursor (str): The cursor.
+
+    Returns:
+        str: The redis key.
+    """
+    return f"{CURSOR_PREFIX}:{articles}:{cursor}"
+
+
+def vec_search_cursor(
+        db: DBConnector,
+        vec_db: QdrantClient,
+        input_str: str,
+        *,
+        qdrant_cache: Redis,
+        articles: str,
+        articles_graph: GraphProfile,
+        filters: dict[MetaKey, list[str]] | None,
+        order_by: MetaKey | tuple[MetaKey, str] | None,
+        cursor: str | None,
+        limit: int,
+        hit_limit: int,
+        score_threshold: float | None,
+        short_snippets: bool,
+        no_log: bool) -> QueryEmbed:
+    """
+    Searches for the given string in the vector database and returns a cursor
+    for the next page. The first page is the same as (and shares the cache
+    with) `vec_search`. Later pages are not cached as their cursors are
+    unique. Semantic searches skip the documents before the previous page
+    via the offset tracked by the cursor and exclude the documents of the
+    previous page explicitly. This way, documents added in between pages do
+    not cause results of the previous page to repeat while the cursor state
+    stays bounded by the page size. Other searches use the offset tracked by
+    the cursor.
+
+    Args:
+        db (DBConnector): The database connector.
+        vec_db (QdrantClient): The vector database client.
+        input_str (str): The search query.
+        qdrant_cache (Redis): The cache for query embeddings and cursors.
+        articles (str): The vector database name.
+        articles_graph (GraphProfile): The embedding model.
+        filters (dict[MetaKey, list[str]] | None): Query filters. See
+            `vec_search`.
+        order_by (MetaKey | tuple[MetaKey, str] | None): Which way to order
+            non-search results.
+        cursor (str | None): The cursor returned by the previous page or None
+            for the first page. The query, filters, and snippet settings must
+            be the same for all pages. The page size can change.
+        limit (int): The maximum number of returned results.
+        hit_limit (int): The maximum number of hit snippets generated per
+            result.
+        score_threshold (float | None): Allows to limit the number of
+            results further by cutting off at a given score threshold.
+            If None defaults to not limiting by score.
+        short_snippets (bool): Whether hit snippets should be further
+            refined to give more precise and relevant snippets.
+        no_log (bool): If True, no log entry is created for the query. Only the
+            first page creates a log entry.
+
+    Returns:
+        QueryEmbed: Vector database search results. "cursor" is None if there
+            are no more results. If the cursor is unknown or has expired the
+            status is "error".
+    """
+    if filters is not None:
+        filters = {
+            key: to_list(value)
+            for key, value in filters.items()
+            if to_list(value)
+        }
+    query_hash = get_search_hash(
+        input_str,
+        articles_graph=articles_graph,
+        filters=filters,
+        offset=None,
+        limit=0,
+        hit_limit=hit_limit,
+        score_threshold=score_threshold,
+        short_snippets=short_snippets)
+    state: SearchCursor | None = None
+    if cursor:
+        state_str = qdrant_cache.get_value(get_cursor_key(articles, cursor))
+        if state_str:
+            state = json_maybe_read(state_str)
+        if state is None or state["query_hash"] != query_hash:
+            return {
+                "hits": [],
+                "status": "error",
+                "cursor": None,
+            }
+    seen = [] if state is None else state["seen"]
+    offset = 0 if state is None else state["offset"]
+    if state is None or not input_str or input_str[0] == "=":
+        res = vec_search(
+            db,
+            vec_db,
+            input_str,
+            qdrant_cache=qdrant_cache,
+            articles=articles,
+            articles_graph=articles_graph,
+            filters=filters,
+            order_by=order_by,
+            offset=offset,
+            limit=limit,
+            hit_limit=hit_limit,
+            score_threshold=score_threshold,
+            short_snippets=short_snippets,
+            no_log=no_log or state is not None)
+        if res["status"] != "ok":
+            return {
+                "hits": [],
+                "status": "error",
+                "cursor": None,
+            }
+        hits = res["hits"]
+    else:
+        update_last_query(long_time=False)
+        full_start = time.monotonic()
+        embed = cached_embeds(
+            qdrant_cache, [input_str], graph_profile=articles_graph)[0]
+        if embed is None:
+            return {
+                "hits": [],
+                "status": "error",
+                "cursor": None,
+            }
+        query_hits = query_embed(
+            vec_db,
+            articles,
+            embed,
+            offset=offset - len(seen),
+            limit=limit,
+            hit_limit=hit_limit,
+            score_threshold=score_threshold,
+            filters=filters,
+            exclude_main_ids=seen)
+        hits, snippy_embeds = snippet_post(
+            query_hits,
+            qdrant_cache=qdrant_cache,
+            embed=embed,
+            articles_graph=articles_graph,
+            short_snippets=short_snippets,
+            hit_limit=hit_limit)
+        full_time = time.monotonic() - full_start
+        print(
+            f"query for '{input_str}' page {offset} took "
+            f"{full_time=}s {snippy_embeds=}")
+    next_cursor: str | None = None
+    if hits and len(hits) >= limit:
+        next_cursor = uuid.uuid4().hex
+        next_state: SearchCursor = {
+            "query_hash": query_hash,
+            "seen": [hit["main_id"] for hit in hits],
+            "offset": offset + len(hits),
+        }
+        qdrant_cache.set_value(
+            get_cursor_key(articles, next_cursor),
+            json_compact_str(next_state),
+            expire_in=CURSOR_EXPIRE)
+    return {
+        "hits": hits,
+        "status": "ok",
+        "cursor": next_cursor,
+    }
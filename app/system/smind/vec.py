@@ -15,11 +15,12 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """Vector database operations. All vector database client calls should go
 here."""
-import collections
 import hashlib
+import queue
+import threading
 import uuid
-from collections.abc import Sequence
-from datetime import datetime
+from collections.abc import Iterator, Sequence
+from datetime import datetime, timezone
 from typing import (
     cast,
     get_args,
@@ -42,6 +43,7 @@ from qdrant_client.models import (
     DatetimeRange,
     Direction,
     Distance,
+    ExtendedPointId,
     FieldCondition,
     Filter,
     FilterSelector,
@@ -63,15 +65,18 @@ from qdrant_client.models import (
     VectorParams,
     WithLookup,
 )
+from scattermind.system.util import maybe_first
 
 from app.misc.util import (
     DocStatus,
     get_time_str,
+    json_compact_str,
     parse_time_str,
     retry_err,
     retry_err_config,
 )
 from app.system.config import Config
+from app.system.smind.facets import FacetField, FacetFilter, FacetIndex
 
 
 T = TypeVar('T')
@@ -227,8 +232,11 @@ ResultChunk = TypedDict('ResultChunk', {
 QueryEmbed = TypedDict('QueryEmbed', {
     "hits": list[ResultChunk],
     "status": Literal["ok", "error"],
+    "cursor": NotRequired[str | None],
 })
-"""Query results for a semantic search query."""
+"""Query results for a semantic search query. If the query was performed
+in cursor mode, "cursor" is the cursor for the next page or None if there are
+no more results."""
 
 DocResult = TypedDict('DocResult', {
     "main_id": str,
@@ -398,6 +406,7 @@ def vec_flushall(db: QdrantClient) -> None:
         retry_err(
             lambda name: db.delete_collection(name, timeout=600),
             collection.name)
+    drop_facet_index(None)
 
 
 def get_vec_stats(
@@ -485,6 +494,7 @@ def build_db_name(
     def recreate() -> None:
         # FIXME test no replication
         print(f"create {name} size={embed_size} distance={distance}")
+        drop_facet_index(name)
         vec_name = get_db_name(name, is_vec=True)
         hnsw_config = HnswConfigDiff(
             m=64,
@@ -692,14 +702,17 @@ def build_scalar_index(
         count += recreate_index(db, name, force_recreate=False)
     data_name = get_db_name(name, is_vec=False)
     data_schema = db.get_collection(data_name).payload_schema
+    # NOTE: no caching! the facet index is always built from scratch
+    facets = None if full_stats is not None else build_facet_index(
+        db, name, version=None)
     for meta_key in META_SCALAR:
-        if full_stats is None:
-            # NOTE: no caching!
-            stats: dict[str, int] | dict[str, float] = stat_embed(
-                db, name, field=meta_key, filters=None)
+        if full_stats is not None:
+            variants = list(full_stats.get(meta_key, {}).keys())
         else:
-            stats = full_stats.get(meta_key, {})
-        for variant in stats.keys():
+            assert facets is not None
+            variants = facets.get_values(
+                convert_meta_key_data(meta_key, None))
+        for variant in variants:
             data_meta_key = convert_meta_key_data(meta_key, variant)
             count += create_index(
                 db,
@@ -711,49 +724,199 @@ def build_scalar_index(
     return count
 
 
-def full_scroll(
+SCROLL_PAGE_SIZE = 1000
+"""The number of points retrieved by each scroll request."""
+SCROLL_PARALLEL = 4
+"""The number of disjoint point id ranges that are scrolled in parallel."""
+
+
+def get_scroll_ranges(
+        parallel: int) -> list[tuple[uuid.UUID | None, uuid.UUID | None]]:
+    """
+    Splits the point id space into disjoint ranges of uuids. Numeric point
+    ids are sorted before all uuids and therefore belong to the first range.
+
+    Args:
+        parallel (int): The number of ranges.
+
+    Returns:
+        list[tuple[uuid.UUID | None, uuid.UUID | None]]: The inclusive start
+            and exclusive end of each range. None indicates an open end.
+    """
+    bounds: list[uuid.UUID | None] = [
+        uuid.UUID(int=(ix << 128) // parallel)
+        for ix in range(1, parallel)
+    ]
+    return list(zip([None, *bounds], [*bounds, None]))
+
+
+def is_before(point_id: ExtendedPointId, end: uuid.UUID | None) -> bool:
+    """
+    Whether a point id comes before the given end of a range.
+
+    Args:
+        point_id (ExtendedPointId): The point id.
+        end (uuid.UUID | None): The exclusive end of the range. None indicates
+            an open end.
+
+    Returns:
+        bool: True if the point id is inside the range.
+    """
+    if end is None or isinstance(point_id, int):
+        return True
+    return uuid.UUID(point_id) < end
+
+
+def scroll_range(
         db: QdrantClient,
         name: str,
         *,
+        start: uuid.UUID | None,
+        end: uuid.UUID | None,
         scroll_filter: Filter | None,
         with_vectors: bool,
-        with_payload: bool | Sequence[str]) -> list[Record]:
+        with_payload: bool | Sequence[str],
+        page_size: int) -> Iterator[list[Record]]:
     """
-    Performs a full scroll through the vector database. This operation can take
-    a while since it has to look at every row in the database (except for
-    using filters leveraging indices) so it is advised to cache the results.
+    Scrolls through a range of point ids of the vector database.
 
     Args:
         db (QdrantClient): The vector database client.
         name (str): The database name.
+        start (uuid.UUID | None): The inclusive start of the range. None
+            starts at the beginning.
+        end (uuid.UUID | None): The exclusive end of the range. None scrolls
+            until the end.
         scroll_filter (Filter | None): The filter or None for no filter.
         with_vectors (bool): Whether to return the rows with their embeddings.
         with_payload (bool | Sequence[str]): Whether to return the rows with
-            their meta data.
+            their meta data or which meta data keys to return.
+        page_size (int): The number of points retrieved per request.
 
-    Returns:
-        list[Record]: The results of the scan.
+    Yields:
+        list[Record]: Non-empty batches of points in id order.
+    """
+    offset: ExtendedPointId | None = None if start is None else f"{start}"
+    pages = 0
+    count = 0
+    try:
+        while True:
+            cur, next_offset = retry_err(
+                db.scroll,
+                name,
+                scroll_filter=scroll_filter,
+                offset=offset,
+                limit=page_size,
+                with_vectors=with_vectors,
+                with_payload=with_payload)
+            pages += 1
+            batch = [point for point in cur if is_before(point.id, end)]
+            count += len(batch)
+            if batch:
+                yield batch
+            if (
+                    next_offset is None
+                    or len(batch) < len(cur)
+                    or not is_before(next_offset, end)):
+                break
+            offset = next_offset
+    finally:
+        print(f"scroll {name} from {start} to {end}: {pages=} {count=}")
+
+
+def iter_scroll(
+        db: QdrantClient,
+        name: str,
+        *,
+        scroll_filter: Filter | None,
+        with_vectors: bool,
+        with_payload: bool | Sequence[str],
+        page_size: int = SCROLL_PAGE_SIZE,
+        parallel: int = SCROLL_PARALLEL) -> Iterator[list[Record]]:
     """
-    offset = None
-    cur_limit = 10
-    res: list[Record] = []
-    while True:
-        cur, next_offset = db.scroll(
+    Performs a full scroll through the vector database yielding the results
+    in batches. The id space is split into disjoint ranges which are scrolled
+    in parallel. Stopping the iteration early stops all scrolls. This
+    operation can take a while since it has to look at every row in the
+    database (except for using filters leveraging indices) so it is advised
+    to cache the results.
+
+    Args:
+        db (QdrantClient): The vector database client.
+        name (str): The database name.
+        scroll_filter (Filter | None): The filter or None for no filter.
+        with_vectors (bool): Whether to return the rows with their embeddings.
+        with_payload (bool | Sequence[str]): Whether to return the rows with
+            their meta data or which meta data keys to return.
+        page_size (int, optional): The number of points retrieved per
+            request. Defaults to SCROLL_PAGE_SIZE.
+        parallel (int, optional): The number of id ranges scrolled in
+            parallel. If 1, the points are returned in id order. Defaults to
+            SCROLL_PARALLEL.
+
+    Yields:
+        list[Record]: Non-empty batches of points. The order of the batches
+            is arbitrary if the scroll is parallel.
+    """
+    if parallel <= 1:
+        yield from scroll_range(
+            db,
             name,
+            start=None,
+            end=None,
             scroll_filter=scroll_filter,
-            offset=offset,
-            limit=cur_limit,
             with_vectors=with_vectors,
-            with_payload=with_payload)
-        res.extend(cur)
-        print(
-            f"scroll with offset={offset} limit={cur_limit} "
-            f"chunk={len(cur)} results={len(res)} next={next_offset}")
-        if next_offset is None:
-            break
-        offset = next_offset
-        cur_limit = int(max(1, min(100, cur_limit * 1.2)))
-    return res
+            with_payload=with_payload,
+            page_size=page_size)
+        return
+
+    batches: queue.Queue[list[Record] | None] = queue.Queue(
+        maxsize=2 * parallel)
+    done = threading.Event()
+    errors: list[BaseException] = []
+
+    def put(batch: list[Record] | None) -> bool:
+        while not done.is_set():
+            try:
+                batches.put(batch, timeout=1.0)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def run(start: uuid.UUID | None, end: uuid.UUID | None) -> None:
+        try:
+            for batch in scroll_range(
+                    db,
+                    name,
+                    start=start,
+                    end=end,
+                    scroll_filter=scroll_filter,
+                    with_vectors=with_vectors,
+                    with_payload=with_payload,
+                    page_size=page_size):
+                if not put(batch):
+                    break
+        except BaseException as exc:  # pylint: disable=broad-except
+            errors.append(exc)
+        finally:
+            put(None)
+
+    ranges = get_scroll_ranges(parallel)
+    for start, end in ranges:
+        threading.Thread(target=run, args=(start, end), daemon=True).start()
+    try:
+        remaining = len(ranges)
+        while remaining > 0:
+            batch = batches.get()
+            if batch is None:
+                remaining -= 1
+                continue
+            yield batch
+        if errors:
+            raise errors[0]
+    finally:
+        done.set()
 
 
 def compute_chunk_hash(chunks: list[EmbedChunk]) -> HashTup:
@@ -766,13 +929,53 @@ def compute_chunk_hash(chunks: list[EmbedChunk]) -> HashTup:
     Returns:
         HashTup: The hash and the number of chunks.
     """
+    return compute_snippet_hash([chunk["snippet"] for chunk in chunks])
+
+
+def compute_snippet_hash(snippets: list[str]) -> HashTup:
+    """
+    Computes the hash of snippets. The result is the same as computing the
+    hash of the corresponding chunks via `compute_chunk_hash` which allows to
+    detect unchanged documents before computing any embeddings.
+
+    Args:
+        snippets (list[str]): The snippets.
+
+    Returns:
+        HashTup: The hash and the number of snippets.
+    """
     blake = hashlib.blake2b(digest_size=32)
-    blake.update(f"{len(chunks)}:".encode("utf-8"))
-    for chunk in chunks:
-        snippet = chunk["snippet"]
+    blake.update(f"{len(snippets)}:".encode("utf-8"))
+    for snippet in snippets:
         blake.update(f"{len(snippet)}:".encode("utf-8"))
         blake.update(snippet.encode("utf-8"))
-    return (blake.hexdigest(), len(chunks))
+    return (blake.hexdigest(), len(snippets))
+
+
+def compute_meta_hash(data: EmbedMain) -> str:
+    """
+    Computes the hash of the meta data and row info of a document.
+
+    Args:
+        data (EmbedMain): The meta data and row info.
+
+    Returns:
+        str: The hash.
+    """
+    meta_obj = {
+        key: value
+        for key, value in data["meta"].items()
+        if value is not None
+    }
+    blake = hashlib.blake2b(digest_size=32)
+    blake.update(json_compact_str({
+        "base": data["base"],
+        "doc_id": data["doc_id"],
+        "url": data["url"],
+        "title": data["title"],
+        "meta": meta_obj,
+    }).encode("utf-8"))
+    return blake.hexdigest()
 
 
 def compute_doc_embedding(
@@ -845,6 +1048,7 @@ def to_data_payload(
         "updated": get_time_str(),
         "hash": hash_str,
         "count": count,
+        "meta_hash": compute_meta_hash(data),
     }
     for (mkey, value) in data["meta"].items():
         key = cast(MetaKey, mkey)
@@ -897,6 +1101,35 @@ def to_snippet_payload_template(
     return res
 
 
+ADD_BATCH_SIZE = 256
+"""The number of snippet points written to the vector database at once."""
+
+
+def check_doc_type(data: EmbedMain) -> None:
+    """
+    Ensures that the document type matches the base of the document.
+
+    Args:
+        data (EmbedMain): The meta data and row info.
+
+    Raises:
+        ValueError: If the document type or base is invalid.
+    """
+    base = data["base"]
+    doc_type = data["meta"]["doc_type"]
+    required_doc_types = KNOWN_DOC_TYPES.get(base)
+    if (
+            required_doc_types is not None
+            and doc_type not in required_doc_types):
+        raise ValueError(
+            f"base {base} requires doc_type from "
+            f"{required_doc_types} not {doc_type}")
+    required_base = DOC_TYPE_TO_BASE.get(doc_type)
+    if required_base is not None and required_base != base:
+        raise ValueError(
+            f"doc_type {doc_type} requires base {required_base} != {base}")
+
+
 def add_embed(
         db: QdrantClient,
         *,
@@ -917,83 +1150,57 @@ def add_embed(
     Returns:
         tuple[int, int]: The previous snippet count and the new snippet count.
     """
-    chunk_hash = compute_chunk_hash(chunks)
-    doc_embed = compute_doc_embedding(embed_size, chunks)
-    cur_hash, new_count = chunk_hash
-    is_remove = new_count == 0
-    main_id = get_main_id(data)
-    main_uuid = get_main_uuid(data)
-
-    data_name = get_db_name(name, is_vec=False)
-    filter_data = Filter(
-        must=[
-            FieldCondition(
-                key="main_id",
-                match=MatchValue(value=main_id)),
-        ])
-    prev_data = full_scroll(
+    return add_embeds(
         db,
-        data_name,
-        scroll_filter=filter_data,
-        with_vectors=False,
-        with_payload=["hash", "count"])
-    prev_hash: str | None = None
-    prev_count: int = 0
-    if len(prev_data) > 0:
-        prev_payload = prev_data[0].payload
-        assert prev_payload is not None
-        prev_hash = prev_payload["hash"]
-        prev_count = prev_payload["count"]
+        name=name,
+        docs=[(data, chunks)],
+        embed_size=embed_size,
+        wait=False)[0]
 
-    meta_obj = data["meta"]
-    if meta_obj.get("date") is None:
-        meta_obj.pop("date", None)
 
-    base = data["base"]
-    doc_type = meta_obj["doc_type"]
-    if not is_remove:
-        required_doc_types = KNOWN_DOC_TYPES.get(base)
-        if (
-                required_doc_types is not None
-                and doc_type not in required_doc_types):
-            raise ValueError(
-                f"base {base} requires doc_type from "
-                f"{required_doc_types} not {doc_type}")
-        required_base = DOC_TYPE_TO_BASE.get(doc_type)
-        if required_base is not None and required_base != base:
-            raise ValueError(
-                f"doc_type {doc_type} requires base {required_base} != {base}")
+def add_embeds(
+        db: QdrantClient,
+        *,
+        name: str,
+        docs: list[tuple[EmbedMain, list[EmbedChunk]]],
+        embed_size: int,
+        wait: bool) -> list[tuple[int, int]]:
+    """
+    Adds the embeddings of multiple documents to the vector database. The
+    previous state of all documents is retrieved at once and all points are
+    written in large batches.
 
-    vec_name = get_db_name(name, is_vec=True)
+    Args:
+        db (QdrantClient): The vector database client.
+        name (str): The database name.
+        docs (list[tuple[EmbedMain, list[EmbedChunk]]]): The meta data and row
+            info and the snippet chunks of each document.
+        embed_size (int): The dimensionality of the embeddings.
+        wait (bool): Whether to wait for all writes to be applied before
+            returning.
 
-    def empty_previous() -> None:
-        if prev_count <= new_count and new_count > 0:
-            return
-        filter_docs = Filter(
-            must=[
-                FieldCondition(
-                    key=REF_KEY,
-                    match=MatchValue(value=main_uuid)),
-            ])
-        retry_err(lambda: db.delete(
-            vec_name,
-            points_selector=FilterSelector(filter=filter_docs)))
+    Returns:
+        list[tuple[int, int]]: The previous snippet count and the new snippet
+            count for each document.
+    """
+    if not docs:
+        return []
+    data_name = get_db_name(name, is_vec=False)
+    vec_name = get_db_name(name, is_vec=True)
 
-    def insert_chunks() -> None:
-        vec_payload_template = to_snippet_payload_template(data)
-        all_chunks = [
-            convert_chunk(chunk, vec_payload_template)
-            for chunk in chunks
-        ]
-        batch_size = 20
-        for offset in range(0, len(all_chunks), batch_size):
-            cur_chunks = all_chunks[offset:offset + batch_size]
-            print(f"insert range {offset}:{offset + len(cur_chunks)}")
-            retry_err(
-                lambda cur: db.upsert(vec_name, points=cur, wait=False),
-                cur_chunks)
+    prev_hashes: dict[str, HashTup] = {}
+    for prev_point in retry_err(lambda: db.retrieve(
+            data_name,
+            ids=list({get_main_uuid(data) for (data, _) in docs}),
+            with_vectors=False,
+            with_payload=["main_id", "hash", "count"])):
+        prev_payload = prev_point.payload
+        assert prev_payload is not None
+        prev_hashes[prev_payload["main_id"]] = (
+            prev_payload["hash"], prev_payload["count"])
 
     def convert_chunk(
+            main_id: str,
             chunk: EmbedChunk,
             vec_payload_template: dict[
                 InternalSnippetKey, list[str] | str | int],
@@ -1010,127 +1217,540 @@ def add_embed(
             vector=chunk["embed"],
             payload=point_payload)
 
-    if prev_hash != cur_hash and prev_count != new_count:
-        empty_previous()
-        if chunks:
-            insert_chunks()
+    res: list[tuple[int, int]] = []
+    empty_uuids: list[str] = []
+    vec_points: list[PointStruct] = []
+    data_points: list[PointStruct] = []
+    remove_main_ids: list[str] = []
+    full_stats: dict[MetaKey, dict[str, float]] = {}
+    for data, chunks in docs:
+        chunk_hash = compute_chunk_hash(chunks)
+        cur_hash, new_count = chunk_hash
+        is_remove = new_count == 0
+        main_id = get_main_id(data)
+        main_uuid = get_main_uuid(data)
+        prev_hash, prev_count = prev_hashes.get(main_id, (None, 0))
+
+        meta_obj = data["meta"]
+        if meta_obj.get("date") is None:
+            meta_obj.pop("date", None)
+        if not is_remove:
+            check_doc_type(data)
+
+        if prev_hash != cur_hash or prev_count != new_count:
+            if prev_count > new_count or new_count == 0:
+                empty_uuids.append(main_uuid)
+            if chunks:
+                vec_payload_template = to_snippet_payload_template(data)
+                vec_points.extend(
+                    convert_chunk(main_id, chunk, vec_payload_template)
+                    for chunk in chunks)
+
+        if not is_remove:
+            for meta_key in META_SCALAR:
+                full_stats.setdefault(meta_key, {}).update(
+                    meta_obj.get(meta_key, {}))
+            data_points.append(PointStruct(
+                id=main_uuid,
+                vector=compute_doc_embedding(embed_size, chunks),
+                payload=to_data_payload(data, chunk_hash)))
+        else:
+            remove_main_ids.append(main_id)
+        res.append((prev_count, new_count))
 
-    if not is_remove:
+    if data_points:
         new_index_count = build_scalar_index(
-            db,
-            name,
-            full_stats={
-                meta_key: meta_obj.get(meta_key, {})
-                for meta_key in META_SCALAR
-            })
+            db, name, full_stats=cast(dict, full_stats))
         if new_index_count > 0:
             print(f"created {new_index_count=}")
+
+    batch_size = ADD_BATCH_SIZE
+    vec_batches = [
+        vec_points[offset:offset + batch_size]
+        for offset in range(0, len(vec_points), batch_size)
+    ]
+    if empty_uuids:
+        filter_docs = Filter(
+            must=[
+                FieldCondition(
+                    key=REF_KEY,
+                    match=MatchAny(any=empty_uuids)),
+            ])
+        retry_err(lambda: db.delete(
+            vec_name,
+            points_selector=FilterSelector(filter=filter_docs),
+            wait=wait and not vec_batches))
+    for batch_ix, cur_points in enumerate(vec_batches):
+        print(f"insert batch {batch_ix + 1}/{len(vec_batches)}")
+        retry_err(
+            lambda cur, is_wait: db.upsert(
+                vec_name, points=cur, wait=is_wait),
+            cur_points,
+            wait and batch_ix == len(vec_batches) - 1)
+
+    update_facet_index(
+        name,
+        points=[
+            (f"{point.id}", {} if point.payload is None else point.payload)
+            for point in data_points
+        ],
+        removed=[
+            get_main_uuid(data)
+            for (data, chunks) in docs
+            if not chunks
+        ])
+    if data_points:
         retry_err(lambda: db.upsert(
             data_name,
-            points=[
-                PointStruct(
-                    id=main_uuid,
-                    vector=doc_embed,
-                    payload=to_data_payload(data, chunk_hash)),
-            ],
-            wait=False))
-    else:
+            points=data_points,
+            wait=wait and not remove_main_ids))
+    if remove_main_ids:
+        filter_data = Filter(
+            must=[
+                FieldCondition(
+                    key="main_id",
+                    match=MatchAny(any=remove_main_ids)),
+            ])
         retry_err(lambda: db.delete(
             data_name,
-            points_selector=filter_data))
-
-    return (prev_count, new_count)
+            points_selector=filter_data,
+            wait=wait))
+    return res
 
 
-def stat_total(
+def get_doc_hashes(
         db: QdrantClient,
         name: str,
-        *,
-        filters: dict[MetaKey, list[str]] | None) -> int:
+        datas: list[EmbedMain]) -> dict[str, tuple[HashTup, str | None]]:
     """
-    Counts the total number of documents for a given filter.
+    Retrieves the stored hashes of the given documents.
 
     Args:
         db (QdrantClient): The vector database client.
         name (str): The database name.
-        filters (dict[MetaKey, list[str]] | None): The filter or None for no
-            filter.
+        datas (list[EmbedMain]): The meta data and row info of the documents.
 
     Returns:
-        int: The number of documents.
+        dict[str, tuple[HashTup, str | None]]: Mapping of main ids to the
+            snippet hash and the meta data hash. Documents that are not in
+            the database are omitted. The meta data hash might be None for
+            documents that have been added before it was introduced.
     """
-    query_filter = get_filter(
-        filters, for_vec=False, skip_fields=None, exclude_main_id=None)
+    if not datas:
+        return {}
     data_name = get_db_name(name, is_vec=False)
-    if query_filter is None:
-        res = db.get_collection(data_name).points_count
-        if res is not None:
-            return res
-    count_res = retry_err(
-        lambda: db.count(data_name, count_filter=query_filter, exact=True))
-    return count_res.count
+    res: dict[str, tuple[HashTup, str | None]] = {}
+    for point in retry_err(lambda: db.retrieve(
+            data_name,
+            ids=list({get_main_uuid(data) for data in datas}),
+            with_vectors=False,
+            with_payload=["main_id", "hash", "count", "meta_hash"])):
+        payload = point.payload
+        assert payload is not None
+        res[payload["main_id"]] = (
+            (payload["hash"], payload["count"]), payload.get("meta_hash"))
+    return res
+
+
+def update_meta(
+        db: QdrantClient,
+        *,
+        name: str,
+        docs: list[tuple[EmbedMain, HashTup]],
+        wait: bool) -> None:
+    """
+    Updates the meta data of documents whose snippets have not changed. No
+    embeddings are modified.
+
+    Args:
+        db (QdrantClient): The vector database client.
+        name (str): The database name.
+        docs (list[tuple[EmbedMain, HashTup]]): The meta data and row info and
+            the current snippet hash of each document.
+        wait (bool): Whether to wait for the updates to be applied before
+            returning.
+    """
+    if not docs:
+        return
+    data_name = get_db_name(name, is_vec=False)
+    vec_name = get_db_name(name, is_vec=True)
+    full_stats: dict[MetaKey, dict[str, float]] = {}
+    for data, _ in docs:
+        meta_obj = data["meta"]
+        if meta_obj.get("date") is None:
+            meta_obj.pop("date", None)
+        check_doc_type(data)
+        for meta_key in META_SCALAR:
+            full_stats.setdefault(meta_key, {}).update(
+                meta_obj.get(meta_key, {}))
+    new_index_count = build_scalar_index(
+        db, name, full_stats=cast(dict, full_stats))
+    if new_index_count > 0:
+        print(f"created {new_index_count=}")
+    for doc_ix, (data, chunk_hash) in enumerate(docs):
+        is_last = wait and doc_ix == len(docs) - 1
+        main_uuid = get_main_uuid(data)
+        filter_docs = Filter(
+            must=[
+                FieldCondition(
+                    key=REF_KEY,
+                    match=MatchValue(value=main_uuid)),
+            ])
+        vec_payload = to_snippet_payload_template(data)
+        missing_keys = [
+            convert_meta_key_snippet(meta_key)
+            for meta_key in META_KEYS
+            if meta_key not in data["meta"]
+        ]
+        if missing_keys:
+            retry_err(
+                db.delete_payload,
+                vec_name,
+                keys=missing_keys,
+                points=FilterSelector(filter=filter_docs),
+                wait=False)
+        retry_err(
+            db.set_payload,
+            vec_name,
+            payload=vec_payload,
+            points=FilterSelector(filter=filter_docs),
+            wait=is_last)
+        data_payload = to_data_payload(data, chunk_hash)
+        update_facet_index(
+            name, points=[(main_uuid, data_payload)], removed=[])
+        retry_err(
+            db.overwrite_payload,
+            data_name,
+            payload=data_payload,
+            points=[main_uuid],
+            wait=is_last)
 
 
-def stat_embed(
+def stat_fields(
         db: QdrantClient,
         name: str,
         *,
-        field: MetaKey,
+        fields: list[MetaKey],
         filters: dict[MetaKey, list[str]] | None,
-        ) -> dict[str, int]:
+        facet_version: str) -> StatEmbed:
     """
-    Computes the number of documents of each variant of a given meta field
-    after applying a filter.
+    Computes the total number of documents after applying a filter and the
+    number of documents of each variant of multiple meta fields at once. The
+    variants of a field are counted after applying all filters except the
+    filter of the field itself. The counts are computed from the facet index.
 
     Args:
         db (QdrantClient): The vector database client.
         name (str): The vector database name.
-        field (MetaKey): The meta field to inspect.
+        fields (list[MetaKey]): The meta fields to inspect.
         filters (dict[MetaKey, list[str]] | None): The filters.
+        facet_version (str): The expected version of the facet index. See
+            `get_facet_index`.
 
     Returns:
-        dict[str, int]: The variants of the meta field and their document
-            counts.
+        StatEmbed: The total document count and the variants of each meta
+            field and their document counts.
     """
-    query_filter = get_filter(
-        filters, for_vec=False, skip_fields={field}, exclude_main_id=None)
-    data_name = get_db_name(name, is_vec=False)
+    facets = get_facet_index(db, name, version=facet_version)
+    return {
+        "doc_count": facets.get_mask(
+            get_facet_filter(filters, skip_fields=None)).bit_count(),
+        "fields": {
+            field: facets.get_counts(
+                convert_meta_key_data(field, None),
+                facets.get_mask(
+                    get_facet_filter(filters, skip_fields={field})))
+            for field in fields
+        },
+    }
+
+
+def convert_for_list(val: str | list[str]) -> list[str]:
+    """
+    Converts a payload value into a list.
+
+    Args:
+        val (str | list[str]): The payload value.
+
+    Returns:
+        list[str]: The value as list.
+    """
+    if isinstance(val, list):
+        return val
+    return [val]
+
+
+def convert_for_date(val: str | datetime) -> str:
+    """
+    Converts a date payload value into the day it represents.
+
+    Args:
+        val (str | datetime): The payload value.
+
+    Returns:
+        str: The day as ISO formatted string.
+    """
+    if isinstance(val, datetime):
+        dt = val
+    else:
+        dt = parse_time_str(val)
+    return dt.date().isoformat()
+
+
+def convert_for_value(val: str | datetime) -> str:
+    """
+    Converts a payload value for statistics.
+
+    Args:
+        val (str | datetime): The payload value.
+
+    Returns:
+        str: The value.
+    """
+    return f"{val}"
+
+
+def get_date_order(val: str | datetime) -> float:
+    """
+    Converts a date payload value into a timestamp. Dates without timezone are
+    interpreted as UTC (as done by the vector database).
+
+    Args:
+        val (str | datetime): The payload value.
+
+    Returns:
+        float: The timestamp in seconds.
+    """
+    if isinstance(val, datetime):
+        dt = val
+    else:
+        dt = parse_time_str(val)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+FACET_INDEXES: dict[str, FacetIndex] = {}
+"""The facet indices of the document data of each vector database."""
+FACET_LOCK = threading.RLock()
+"""Lock for building facet indices."""
+
+
+def get_facet_fields() -> list[FacetField]:
+    """
+    The fields of the facet index. Each meta field is indexed. Dates are
+    indexed by day and can be queried by range.
+
+    Returns:
+        list[FacetField]: The facet fields.
+    """
+
+    def convert_date_values(val: str | datetime) -> list[str]:
+        return [convert_for_date(val)]
+
+    def convert_values(val: str | list[str]) -> list[str]:
+        return [
+            convert_for_value(value)
+            for value in convert_for_list(val)
+            if value is not None
+        ]
+
+    return [
+        {
+            "key": convert_meta_key_data(meta_key, None),
+            "values": convert_date_values,
+            "order": get_date_order,
+        }
+        if meta_key == "date" else
+        {
+            "key": convert_meta_key_data(meta_key, None),
+            "values": convert_values,
+            "order": None,
+        }
+        for meta_key in sorted(META_KEYS)
+    ]
 
-    field_key = convert_meta_key_data(field, None)
-    main_ids_data = full_scroll(
+
+def get_facet_filter(
+        filters: dict[MetaKey, list[str]] | None,
+        *,
+        skip_fields: set[MetaKey] | None,
+        ) -> FacetFilter:
+    """
+    Converts a dictionary filter into facet index filters. The semantics are
+    the same as `get_filter`.
+
+    Args:
+        filters (dict[MetaKey, list[str]] | None): The filter.
+        skip_fields (set[MetaKey] | None): Meta keys to skip if set.
+
+    Raises:
+        ValueError: If the date filter is invalid.
+
+    Returns:
+        FacetFilter: The facet index filter.
+    """
+    values: dict[str, list[str]] = {}
+    ranges: dict[str, tuple[float, float]] = {}
+    for key, key_values in ({} if filters is None else filters).items():
+        if skip_fields is not None and key in skip_fields:
+            continue
+        if not key_values:
+            continue
+        ikey = convert_meta_key_data(key, None)
+        if key == "date":
+            if len(key_values) != 2:
+                raise ValueError(
+                    f"date filter must be exactly two dates got {key_values}")
+            orders = [get_date_order(value) for value in key_values]
+            ranges[ikey] = (min(orders), max(orders))
+            continue
+        values[ikey] = key_values
+    return {
+        "values": values,
+        "ranges": ranges,
+    }
+
+
+def build_facet_index(
+        db: QdrantClient, name: str, *, version: str | None) -> FacetIndex:
+    """
+    Builds the facet index of a vector database from scratch.
+
+    Args:
+        db (QdrantClient): The vector database client.
+        name (str): The vector database name.
+        version (str | None): The version of the index.
+
+    Returns:
+        FacetIndex: The facet index.
+    """
+    fields = get_facet_fields()
+    data_name = get_db_name(name, is_vec=False)
+    batches = iter_scroll(
         db,
         data_name,
-        scroll_filter=query_filter,
+        scroll_filter=None,
         with_vectors=False,
-        with_payload=[field_key])
+        with_payload=[field["key"] for field in fields])
+    return FacetIndex.build(
+        fields,
+        (
+            (f"{point.id}", {} if point.payload is None else point.payload)
+            for batch in batches
+            for point in batch
+        ),
+        version=version)
 
-    def convert(val: str | list[str]) -> list[str]:
-        if isinstance(val, list):
-            return val
-        return [val]
 
-    def convert_for_date(val: str) -> str:
-        if isinstance(val, datetime):
-            dt = val
-        else:
-            dt = parse_time_str(val)
-        return dt.date().isoformat()
+def get_facet_index(
+        db: QdrantClient, name: str, *, version: str) -> FacetIndex:
+    """
+    Gets the facet index of a vector database. The index gets rebuilt if its
+    version does not match. Every change to the vector database (from any
+    process) must result in a new version.
 
-    def convert_for_value(val: str) -> str:
-        return val
+    Args:
+        db (QdrantClient): The vector database client.
+        name (str): The vector database name.
+        version (str): The expected version of the index.
 
-    if field == "date":
-        convert_for_stat = convert_for_date
-    else:
-        convert_for_stat = convert_for_value
+    Returns:
+        FacetIndex: The facet index.
+    """
+    res = FACET_INDEXES.get(name)
+    if res is not None and res.get_version() == version:
+        return res
+    with FACET_LOCK:
+        res = FACET_INDEXES.get(name)
+        if res is not None and res.get_version() == version:
+            return res
+        print(f"building facet index for {name} ({version})")
+        res = build_facet_index(db, name, version=version)
+        FACET_INDEXES[name] = res
+        return res
 
-    counts: collections.Counter[str] = collections.Counter(
-        convert_for_stat(value)
-        for data in main_ids_data
-        if data.payload is not None
-        for value in convert(data.payload.get(field_key, []))
-        if value is not None)
-    return dict(counts)
+
+def update_facet_index(
+        name: str,
+        *,
+        points: list[tuple[str, Payload]],
+        removed: list[str]) -> None:
+    """
+    Applies changes to the facet index of a vector database if it exists.
+
+    Args:
+        name (str): The vector database name.
+        points (list[tuple[str, Payload]]): Added or updated points and their
+            data payload.
+        removed (list[str]): Removed points.
+    """
+    facets = FACET_INDEXES.get(name)
+    if facets is None:
+        return
+    for point_id, payload in points:
+        facets.set(point_id, payload)
+    for point_id in removed:
+        facets.remove(point_id)
+
+
+def peek_facet_index(name: str) -> FacetIndex | None:
+    """
+    Gets the current facet index of a vector database without building it.
+
+    Args:
+        name (str): The vector database name.
+
+    Returns:
+        FacetIndex | None: The facet index or None if it doesn't exist.
+    """
+    return FACET_INDEXES.get(name)
+
+
+def advance_facet_index(
+        name: str,
+        facets: FacetIndex | None,
+        prev_version: str | None,
+        version: str) -> bool:
+    """
+    Marks the facet index of a vector database as up to date with a new
+    version after all changes leading to the new version have been applied
+    via `update_facet_index`. This only succeeds if the index was at the
+    previous version and if it is still the same index object that was
+    current before the changes were applied (see `peek_facet_index`). An
+    index that got rebuilt in the meantime might miss some of the changes.
+
+    Args:
+        name (str): The vector database name.
+        facets (FacetIndex | None): The index that was current before the
+            changes were applied.
+        prev_version (str | None): The version before the changes.
+        version (str): The new version.
+
+    Returns:
+        bool: Whether the index is up to date with the new version.
+    """
+    if facets is None:
+        return False
+    with FACET_LOCK:
+        if FACET_INDEXES.get(name) is not facets:
+            return False
+        return facets.advance_version(prev_version, version)
+
+
+def drop_facet_index(name: str | None) -> None:
+    """
+    Removes the facet index of a vector database.
+
+    Args:
+        name (str | None): The vector database name or None to remove all
+            facet indices.
+    """
+    with FACET_LOCK:
+        if name is None:
+            FACET_INDEXES.clear()
+        else:
+            FACET_INDEXES.pop(name, None)
 
 
 def fill_meta_data(payload: Payload) -> MetaObjectOpt:
@@ -1291,17 +1911,22 @@ def get_doc(db: QdrantClient, name: str, main_id: str) -> DocResult | None:
                 key="main_id",
                 match=MatchValue(value=main_id)),
         ])
-    res = full_scroll(
-        db,
-        data_name,
-        scroll_filter=filter_data,
-        with_vectors=True,
-        with_payload=True)
-    if len(res) <= 0:
+    point = maybe_first(
+        point
+        for batch in iter_scroll(
+            db,
+            data_name,
+            scroll_filter=filter_data,
+            with_vectors=True,
+            with_payload=True,
+            page_size=1,
+            parallel=1)
+        for point in batch)
+    if point is None:
         return None
-    payload = res[0].payload
+    payload = point.payload
     assert payload is not None
-    embed = res[0].vector
+    embed = point.vector
     assert embed is not None
     base = payload["base"]
     doc_id = payload["doc_id"]
@@ -1442,6 +2067,7 @@ def query_embed(
         hit_limit: int,
         score_threshold: float | None,
         filters: dict[MetaKey, list[str]] | None,
+        exclude_main_ids: list[str] | None = None,
         ) -> list[ResultChunk]:
     """
     Find the closest documents to the given embedding using the snippet
@@ -1458,6 +2084,9 @@ def query_embed(
         score_threshold (float | None): If set limits the results by filtering
             by score.
         filters (dict[MetaKey, list[str]] | None): The filters.
+        exclude_main_ids (list[str] | None, optional): Documents to exclude
+            from the results. The offset applies after excluding the
+            documents. Defaults to None.
 
     Returns:
         list[ResultChunk]: The result chunks.
@@ -1465,9 +2094,24 @@ def query_embed(
     # FIXME https://github.com/qdrant/qdrant/issues/3970 would be nice
     real_offset = 0 if offset is None else offset
     total_limit = real_offset + limit
-    print(f"query {name} offset={real_offset} limit={total_limit}")
+    print(
+        f"query {name} offset={real_offset} limit={total_limit} "
+        f"excluded={0 if exclude_main_ids is None else len(exclude_main_ids)}")
     vec_filter = get_filter(
         filters, for_vec=True, skip_fields=None, exclude_main_id=None)
+    if exclude_main_ids:
+        exclude_cond = FieldCondition(
+            key=REF_KEY,
+            match=MatchExcept(**{
+                "except": [
+                    f"{uuid.uuid5(QDRANT_UUID, main_id)}"
+                    for main_id in exclude_main_ids
+                ],
+            }))
+        vec_filter = Filter(
+            must=[exclude_cond]
+            if vec_filter is None
+            else [vec_filter, exclude_cond])
     vec_name = get_db_name(name, is_vec=True)
     data_name = get_db_name(name, is_vec=False)
     hits = retry_err(
@@ -19,9 +19,22 @@ import time
 import traceback
 import uuid
 from collections.abc import Callable
-from typing import Any, Generic, Protocol, TypeAlias, TypedDict, TypeVar
-
-from redipy import Redis, RSM_MISSING
+from typing import (
+    Any,
+    Generic,
+    get_args,
+    Literal,
+    NotRequired,
+    Protocol,
+    TypeAlias,
+    TypedDict,
+    TypeVar,
+)
+
+from redipy import ExecFunction, Redis
+from redipy.symbolic.rlist import RedisList
+from redipy.symbolic.rvar import RedisVar
+from redipy.symbolic.seq import FnContext
 
 from app.misc.util import get_time_str, json_compact_str, json_read_str
 
@@ -30,16 +43,34 @@ PL = TypeVar('PL')
 PL_contra = TypeVar('PL_contra', contravariant=True)
 
 
+ProcessLane: TypeAlias = Literal["high", "normal", "low"]
+"""Priority lane of a task. Tasks in the `high` lane are always processed
+before tasks in the `normal` lane which in turn are processed before tasks in
+the `low` lane. `high` is meant for interactive requests and `low` for bulk
+work that expands into many tasks."""
+PROCESS_LANES: tuple[ProcessLane, ...] = get_args(ProcessLane)
+"""All priority lanes in the order in which they are processed."""
+DEFAULT_LANE: ProcessLane = "normal"
+"""The default priority lane."""
+
+
 class ProcessEnqueue(  # pylint: disable=too-few-public-methods
         Protocol[PL_contra]):
     """Functioin enqueue a task."""
-    def __call__(self, process_queue_redis: Redis, payload: PL_contra) -> None:
+    def __call__(
+            self,
+            process_queue_redis: Redis,
+            payload: PL_contra,
+            *,
+            lane: ProcessLane = DEFAULT_LANE) -> None:
         """
         Enqueues a task to the processing queue.
 
         Args:
             process_queue_redis (Redis): The processing queue redis.
             payload (PL_contra): The task payload.
+            lane (ProcessLane, optional): The priority lane of the task.
+                Defaults to DEFAULT_LANE.
         """
 
 
@@ -58,8 +89,12 @@ class ProcessEntry(TypedDict, Generic[PL]):
 ProcessEntryJSON = TypedDict('ProcessEntryJSON', {
     "payload": dict[str, str],
     "process": ProcessHandlerId,
+    "lane": NotRequired[ProcessLane],
+    "enqueued": NotRequired[float],
 })
-"""Entry in the processing queue as JSON."""
+"""Entry in the processing queue as JSON. `lane` is the priority lane and
+`enqueued` is the time when the task was added to the queue. Both are missing
+for entries created by older versions."""
 
 
 class ProcessError(ProcessEntryJSON):  # pylint: disable=inherit-non-class
@@ -68,10 +103,19 @@ class ProcessError(ProcessEntryJSON):  # pylint: disable=inherit-non-class
     """The error."""
 
 
+ProcessLaneStats = TypedDict('ProcessLaneStats', {
+    "queue": int,
+    "wait": float,
+    "handlers": dict[str, int],
+})
+"""Information about a priority lane. `queue` is the number of waiting tasks,
+`wait` is the time in seconds the oldest waiting task has been in the queue,
+and `handlers` is the number of waiting tasks per handler."""
 ProcessQueueStats = TypedDict('ProcessQueueStats', {
     "queue": int,
     "active": list[ProcessEntryJSON],
     "error": int,
+    "lanes": dict[ProcessLane, ProcessLaneStats],
 })
 """Information about the current status of the processing queue."""
 
@@ -84,30 +128,148 @@ class ProcessHandler(TypedDict, Generic[PL]):
     """Convert the payload to JSON."""
     convert_from_json: Callable[[dict[str, str]], PL]
     """Convert the payload back from JSON."""
+    max_workers: int | None
+    """The maximum number of workers of a process that are allowed to compute
+    tasks of this handler at the same time. If None, all workers of a process
+    can compute tasks of this handler at the same time."""
+    weight: float
+    """The share of the processing time of this handler when multiple handlers
+    have tasks waiting in the same lane."""
+    exclusive: bool
+    """Whether at most one worker across all processes is allowed to compute
+    tasks of this handler at the same time. This is enforced via a lease in
+    the processing queue redis."""
 
 
 PROCESS_LOCK = threading.RLock()
 """The processing queue lock."""
 PROCESS_COND = threading.Condition(PROCESS_LOCK)
 """The processing queue notification condition."""
-PROCESS_THREAD: threading.Thread | None = None
-"""The processing queue processing thread."""
+PROCESS_THREADS: dict[str, threading.Thread] = {}
+"""The processing queue worker threads of this process by worker id."""
+PROCESS_HB_THREAD: threading.Thread | None = None
+"""The heartbeat thread of the workers of this process."""
+PROCESS_WORKERS = 1
+"""The number of processing queue workers of this process."""
+PROCESS_RUNNING: dict[ProcessHandlerId, int] = {}
+"""The number of tasks currently being computed in this process for each
+handler."""
+PROCESS_VTIME: dict[ProcessHandlerId, float] = {}
+"""The virtual time of each handler for weighted fair scheduling. Claiming a
+task advances the virtual time of its handler by the inverse of its weight.
+The handler with the lowest virtual time is asked first."""
+PROCESS_CUR_VTIME = 0.0
+"""The virtual time of the most recently claimed task. Idle handlers catch up
+to this time so they cannot accumulate credit while their queue is empty."""
+PROCESS_LEASES: dict[str, ProcessHandlerId] = {}
+"""The handler leases held by the workers of this process by worker id."""
 PROCESS_QUEUE_KEY = "process"
-"""Redis key for the processing queue tasks."""
+"""Redis key prefix for the processing queue tasks of each handler."""
 PROCESS_ACTIVE_KEY = "active"
-"""Redis key for the active tasks in the processing queue."""
+"""Redis key prefix for the active tasks of each worker."""
 PROCESS_ERROR_KEY = "errors"
 """Redis key for errors in the processing queue."""
-PROCESS_LOCK_KEY = "lock"
-"""Redis key lock for ensuring only one thread is processing the queue."""
+PROCESS_WORKERS_KEY = "workers"
+"""Redis key for the set of all workers of all processes."""
+PROCESS_HB_KEY = "heartbeat"
+"""Redis key prefix for the heartbeat of each worker."""
+PROCESS_LEASE_KEY = "lease"
+"""Redis key prefix for the lease of each exclusive handler."""
 HB_TIMEOUT = 60.0  # 1min
 """Heartbeat timeout in seconds."""
+VISIBILITY_TIMEOUT = 2 * HB_TIMEOUT
+"""Time in seconds after which the active tasks of a worker without heartbeat
+are put back into the queue."""
 
 
 PROCESS_HND_LOOKUP: dict[ProcessHandlerId, ProcessHandler] = {}
 """Process handler lookup."""
 
 
+def get_queue_key(hnd_name: ProcessHandlerId, lane: ProcessLane) -> str:
+    """
+    Computes the redis key of the queue of a handler in a given lane.
+
+    Args:
+        hnd_name (ProcessHandlerId): The handler.
+        lane (ProcessLane): The priority lane.
+
+    Returns:
+        str: The redis key.
+    """
+    return f"{PROCESS_QUEUE_KEY}:{lane}:{hnd_name}"
+
+
+def get_entry_queue_key(entry: ProcessEntryJSON) -> str:
+    """
+    Computes the redis key of the queue a given entry belongs to.
+
+    Args:
+        entry (ProcessEntryJSON): The entry.
+
+    Returns:
+        str: The redis key.
+    """
+    return get_queue_key(entry["process"], entry.get("lane", DEFAULT_LANE))
+
+
+def get_active_key(worker_id: str) -> str:
+    """
+    Computes the redis key of the active tasks of a worker.
+
+    Args:
+        worker_id (str): The worker id.
+
+    Returns:
+        str: The redis key.
+    """
+    return f"{PROCESS_ACTIVE_KEY}:{worker_id}"
+
+
+def get_heartbeat_key(worker_id: str) -> str:
+    """
+    Computes the redis key of the heartbeat of a worker.
+
+    Args:
+        worker_id (str): The worker id.
+
+    Returns:
+        str: The redis key.
+    """
+    return f"{PROCESS_HB_KEY}:{worker_id}"
+
+
+def get_lease_key(hnd_name: ProcessHandlerId) -> str:
+    """
+    Computes the redis key of the lease of an exclusive handler.
+
+    Args:
+        hnd_name (ProcessHandlerId): The handler.
+
+    Returns:
+        str: The redis key.
+    """
+    return f"{PROCESS_LEASE_KEY}:{hnd_name}"
+
+
+def set_process_workers(workers: int) -> None:
+    """
+    Sets the number of processing queue workers of this process. This needs to
+    be called before any tasks are enqueued.
+
+    Args:
+        workers (int): The number of workers.
+
+    Raises:
+        ValueError: If the number of workers is invalid.
+    """
+    global PROCESS_WORKERS  # pylint: disable=global-statement
+
+    if workers < 1:
+        raise ValueError(f"need at least one worker got {workers}")
+    PROCESS_WORKERS = workers
+
+
 def process_queue_info(process_queue_redis: Redis) -> ProcessQueueStats:
     """
     Get information about the queue status.
@@ -118,19 +280,55 @@ def process_queue_info(process_queue_redis: Redis) -> ProcessQueueStats:
     Returns:
         ProcessQueueStats: The statistics.
     """
-    process_queue_key = PROCESS_QUEUE_KEY
-    process_active_key = PROCESS_ACTIVE_KEY
     process_error_key = PROCESS_ERROR_KEY
 
+    worker_ids = sorted(process_queue_redis.smembers(PROCESS_WORKERS_KEY))
+    queue_keys = [
+        (lane, hnd_name)
+        for lane in PROCESS_LANES
+        for hnd_name in sorted(PROCESS_HND_LOOKUP.keys())
+    ]
     with process_queue_redis.pipeline() as pipe:
-        pipe.llen(process_queue_key)
-        pipe.lrange(process_active_key, 0, -1)
+        for lane, hnd_name in queue_keys:
+            queue_key = get_queue_key(hnd_name, lane)
+            pipe.llen(queue_key)
+            pipe.lrange(queue_key, 0, 0)
+        for worker_id in worker_ids:
+            pipe.lrange(get_active_key(worker_id), 0, -1)
         pipe.llen(process_error_key)
-        queue_len, actives, error_len = pipe.execute()
+        res = pipe.execute()
+    queue_res = res[:2 * len(queue_keys)]
+    actives = res[2 * len(queue_keys):-1]
+    error_len = res[-1]
+    now = time.time()
+    lanes: dict[ProcessLane, ProcessLaneStats] = {
+        lane: {
+            "queue": 0,
+            "wait": 0.0,
+            "handlers": {},
+        }
+        for lane in PROCESS_LANES
+    }
+    for ix, (lane, hnd_name) in enumerate(queue_keys):
+        queue_len = queue_res[2 * ix]
+        heads = queue_res[2 * ix + 1]
+        lane_stats = lanes[lane]
+        lane_stats["queue"] += queue_len
+        if queue_len:
+            lane_stats["handlers"][hnd_name] = queue_len
+        if heads:
+            enqueued = get_process_entry_json(heads[0]).get("enqueued")
+            if enqueued is not None:
+                lane_stats["wait"] = max(lane_stats["wait"], now - enqueued)
     return {
-        "queue": queue_len,
-        "active": [get_process_entry_json(active) for active in actives],
+        "queue": sum(lane_stats["queue"] for lane_stats in lanes.values()),
+        "active": [
+            get_process_entry_json(active)
+            for worker_actives in actives
+            for active in worker_actives
+        ],
         "error": error_len,
+        "lanes": lanes,
     }
 
 
@@ -142,7 +340,11 @@ def register_process_queue(
         name: str,
         convert_to_json: Callable[[PL], dict[str, str]],
         convert_from_json: Callable[[dict[str, str]], PL],
-        compute: Callable[[PL], Any]) -> ProcessEnqueue[PL]:
+        compute: Callable[[PL], Any],
+        *,
+        max_workers: int | None = None,
+        weight: float = 1.0,
+        exclusive: bool = False) -> ProcessEnqueue[PL]:
     """
     Register a processing queue.
 
@@ -153,6 +355,18 @@ def register_process_queue(
         convert_from_json (Callable[[dict[str, str]], PL]): Converting a JSON
             to payload.
         compute (Callable[[PL], Any]): Processing a task.
+        max_workers (int | None, optional): The maximum number of workers of a
+            process that can compute tasks of this queue at the same time. If
+            None, the number is only limited by the number of workers of the
+            process. Defaults to None.
+        weight (float, optional): The share of tasks of this queue compared
+            to the other queues when tasks of multiple queues are waiting in
+            the same lane. A queue with weight 2 gets twice as many tasks
+            processed as a queue with weight 1. Defaults to 1.0.
+        exclusive (bool, optional): Whether at most one worker across all
+            processes can compute tasks of this queue at the same time. Unlike
+            `max_workers` this also holds when multiple replicas share the
+            same processing queue redis. Defaults to False.
 
     Returns:
         ProcessEnqueue[PL]: Function to enqueue elements to the queue.
@@ -160,24 +374,32 @@ def register_process_queue(
     hnd_name = f"{name}-{uuid.uuid5(NS_HND, name).hex}"
     if hnd_name in PROCESS_HND_LOOKUP:
         raise ValueError(f"cannot register {name} twice!")
+    if weight <= 0.0:
+        raise ValueError(f"weight must be positive got {weight}")
     PROCESS_HND_LOOKUP[hnd_name] = {
         "compute": compute,
         "convert_to_json": convert_to_json,
         "convert_from_json": convert_from_json,
+        "max_workers": max_workers,
+        "weight": weight,
+        "exclusive": exclusive,
     }
 
     def process_enqueue(
             process_queue_redis: Redis,
-            payload: PL) -> None:
-        process_queue_key = PROCESS_QUEUE_KEY
+            payload: PL,
+            *,
+            lane: ProcessLane = DEFAULT_LANE) -> None:
         process_hnd = PROCESS_HND_LOOKUP[hnd_name]
 
         entry = process_entry_to_json(process_hnd, {
             "payload": payload,
             "process": hnd_name,
         })
+        entry["lane"] = lane
+        entry["enqueued"] = time.time()
         process_queue_redis.rpush(
-            process_queue_key,
+            get_entry_queue_key(entry),
             process_entry_to_redis(entry))
         maybe_process_thread(process_queue_redis)
 
@@ -304,7 +526,6 @@ def requeue_errors(process_queue_redis: Redis) -> bool:
     Returns:
         bool: Whether any errors were requeued.
     """
-    process_queue_key = PROCESS_QUEUE_KEY
     process_error_key = PROCESS_ERROR_KEY
 
     any_enqueued = False
@@ -313,12 +534,14 @@ def requeue_errors(process_queue_redis: Redis) -> bool:
         if obj_str is None:
             break
         error = get_process_error(obj_str)
+        entry: ProcessEntryJSON = {
+            "payload": error["payload"],
+            "process": error["process"],
+            "lane": error.get("lane", DEFAULT_LANE),
+            "enqueued": time.time(),
+        }
         process_queue_redis.rpush(
-            process_queue_key,
-            process_entry_to_redis({
-                "payload": error["payload"],
-                "process": error["process"],
-            }))
+            get_entry_queue_key(entry), process_entry_to_redis(entry))
         any_enqueued = True
     if any_enqueued:
         maybe_process_thread(process_queue_redis)
@@ -335,53 +558,221 @@ def log_process(msg: str) -> None:
     print(f"{get_time_str()} QUEUE: {msg}")
 
 
+CLAIM_SCRIPTS: dict[int, ExecFunction] = {}
+"""The claim script for each processing queue redis (by object id)."""
+RELEASE_SCRIPTS: dict[int, ExecFunction] = {}
+"""The lease release script for each processing queue redis (by object
+id)."""
+
+
+def get_claim_script(process_queue_redis: Redis) -> ExecFunction:
+    """
+    Gets the script that atomically moves the first task of a queue to the
+    active list of a worker.
+
+    Args:
+        process_queue_redis (Redis): The processing queue redis.
+
+    Returns:
+        ExecFunction: The script. The keys are `queue` and `active` and it
+            returns the claimed task or None if the queue was empty.
+    """
+    key = id(process_queue_redis)
+    res = CLAIM_SCRIPTS.get(key)
+    if res is None:
+        ctx = FnContext()
+        queue = RedisList(ctx.add_key("queue"))
+        active = RedisList(ctx.add_key("active"))
+        entry = ctx.add_local(queue.lpop())
+        b_then, _ = ctx.if_(entry.ne_(None))
+        b_then.add(active.rpush(entry))
+        ctx.set_return_value(entry)
+        res = process_queue_redis.register_script(ctx)
+        CLAIM_SCRIPTS[key] = res
+    return res
+
+
+def get_release_script(process_queue_redis: Redis) -> ExecFunction:
+    """
+    Gets the script that atomically removes the lease of a handler if it is
+    still held by the given worker.
+
+    Args:
+        process_queue_redis (Redis): The processing queue redis.
+
+    Returns:
+        ExecFunction: The script. The key is `lease` and the argument is
+            `worker`.
+    """
+    key = id(process_queue_redis)
+    res = RELEASE_SCRIPTS.get(key)
+    if res is None:
+        ctx = FnContext()
+        lease = RedisVar(ctx.add_key("lease"))
+        worker = ctx.add_arg("worker")
+        b_then, _ = ctx.if_(lease.get_value().eq_(worker))
+        b_then.add(lease.delete())
+        ctx.set_return_value(None)
+        res = process_queue_redis.register_script(ctx)
+        RELEASE_SCRIPTS[key] = res
+    return res
+
+
+def recover_stale(process_queue_redis: Redis) -> int:
+    """
+    Puts tasks of workers that stopped sending heartbeats back to the front of
+    their queues. This happens when a process crashes or gets killed while
+    computing a task. Tasks from the legacy single queue and active list are
+    moved to their handler queues as well.
+
+    Args:
+        process_queue_redis (Redis): The processing queue redis.
+
+    Returns:
+        int: The number of tasks that were put back into a queue.
+    """
+
+    def requeue(key: str, *, front: bool) -> int:
+        # NOTE: tasks put back to the front are taken from the back to keep
+        # their order
+        count = 0
+        while True:
+            if front:
+                obj_str = process_queue_redis.rpop(key)
+            else:
+                obj_str = process_queue_redis.lpop(key)
+            if obj_str is None:
+                return count
+            queue_key = get_entry_queue_key(get_process_entry_json(obj_str))
+            if front:
+                process_queue_redis.lpush(queue_key, obj_str)
+            else:
+                process_queue_redis.rpush(queue_key, obj_str)
+            count += 1
+
+    total = 0
+    for worker_id in process_queue_redis.smembers(PROCESS_WORKERS_KEY):
+        if process_queue_redis.exists(get_heartbeat_key(worker_id)):
+            continue
+        total += requeue(get_active_key(worker_id), front=True)
+        process_queue_redis.srem(PROCESS_WORKERS_KEY, worker_id)
+        log_process(f"removed stale worker {worker_id}")
+    total += requeue(PROCESS_ACTIVE_KEY, front=True)
+    total += requeue(PROCESS_QUEUE_KEY, front=False)
+    if total:
+        log_process(f"requeued {total} tasks")
+    return total
+
+
 def maybe_process_thread(process_queue_redis: Redis) -> None:
     """
-    Start the processing queue processing thread if needed.
+    Start the processing queue worker threads if needed. Each worker claims
+    tasks into its own active list. Workers of all processes periodically
+    refresh their heartbeat. If the heartbeat of a worker times out its active
+    tasks are put back into the queue by any of the remaining processes.
 
     Args:
         process_queue_redis (Redis): The processing queue redis.
     """
-    global PROCESS_THREAD  # pylint: disable=global-statement
+    global PROCESS_HB_THREAD  # pylint: disable=global-statement
 
-    process_queue_key = PROCESS_QUEUE_KEY
-    process_active_key = PROCESS_ACTIVE_KEY
     process_error_key = PROCESS_ERROR_KEY
-    process_lock_key = PROCESS_LOCK_KEY
     process_hnd_lookup = PROCESS_HND_LOOKUP
     hb_timeout = HB_TIMEOUT
-
-    def get_item() -> ProcessEntryJSON | None:
-        while True:
-            lock_value = process_queue_redis.get_value(process_lock_key)
-            if lock_value != process_id:
-                return None
-            actives = process_queue_redis.lrange(process_active_key, 0, 0)
-            if actives:
-                return get_process_entry_json(actives[0])
-            res = process_queue_redis.lpop(process_queue_key)
-            if res is None:
-                return None
-            process_queue_redis.rpush(process_active_key, res)
-
-    def complete_item() -> None:
-        process_queue_redis.lpop(process_active_key)
+    visibility_timeout = VISIBILITY_TIMEOUT
+    claim = get_claim_script(process_queue_redis)
+    release = get_release_script(process_queue_redis)
+
+    def set_heartbeat(worker_id: str) -> None:
+        process_queue_redis.set_value(
+            get_heartbeat_key(worker_id),
+            get_time_str(),
+            expire_in=visibility_timeout)
+
+    def acquire_lease(worker_id: str, hnd_name: ProcessHandlerId) -> bool:
+        if not process_queue_redis.set_value(
+                get_lease_key(hnd_name),
+                worker_id,
+                mode="if_missing",
+                expire_in=visibility_timeout):
+            return False
+        PROCESS_LEASES[worker_id] = hnd_name
+        return True
+
+    def release_lease(worker_id: str, hnd_name: ProcessHandlerId) -> None:
+        release(
+            keys={"lease": get_lease_key(hnd_name)},
+            args={"worker": worker_id})
+        PROCESS_LEASES.pop(worker_id, None)
+
+    def get_item(worker_id: str) -> ProcessEntryJSON | None:
+        global PROCESS_CUR_VTIME  # pylint: disable=global-statement
+
+        if PROCESS_THREADS.get(worker_id) is not threading.current_thread():
+            return None
+        hnd_names = [
+            hnd_name
+            for hnd_name, process_hnd in process_hnd_lookup.items()
+            if process_hnd["max_workers"] is None
+            or PROCESS_RUNNING.get(hnd_name, 0) < process_hnd["max_workers"]
+        ]
+        hnd_names.sort(
+            key=lambda hnd_name: (PROCESS_VTIME.get(hnd_name, 0.0), hnd_name))
+        for lane in PROCESS_LANES:
+            for hnd_name in hnd_names:
+                exclusive = process_hnd_lookup[hnd_name]["exclusive"]
+                if exclusive and not acquire_lease(worker_id, hnd_name):
+                    continue
+                res = claim(
+                    keys={
+                        "queue": get_queue_key(hnd_name, lane),
+                        "active": get_active_key(worker_id),
+                    },
+                    args={})
+                if res is None:
+                    if exclusive:
+                        release_lease(worker_id, hnd_name)
+                    continue
+                vtime = max(
+                    PROCESS_VTIME.get(hnd_name, 0.0), PROCESS_CUR_VTIME)
+                weight = process_hnd_lookup[hnd_name]["weight"]
+                PROCESS_CUR_VTIME = vtime
+                PROCESS_VTIME[hnd_name] = vtime + 1.0 / weight
+                PROCESS_RUNNING[hnd_name] = (
+                    PROCESS_RUNNING.get(hnd_name, 0) + 1)
+                return get_process_entry_json(f"{res}")
+        return None
+
+    def complete_item(worker_id: str, entry: ProcessEntryJSON) -> None:
+        process_queue_redis.lpop(get_active_key(worker_id))
+        with PROCESS_LOCK:
+            hnd_name = entry["process"]
+            if process_hnd_lookup[hnd_name]["exclusive"]:
+                release_lease(worker_id, hnd_name)
+            PROCESS_RUNNING[hnd_name] = PROCESS_RUNNING.get(hnd_name, 1) - 1
+            PROCESS_COND.notify_all()
 
     def process(
             process_hnd: ProcessHandler[PL], entry: ProcessEntryJSON) -> None:
-        log_process(f"processing {entry['process']}: {entry['payload']}")
+        enqueued = entry.get("enqueued")
+        wait_str = "" if enqueued is None else (
+            f" after {time.time() - enqueued:.2f}s")
+        log_process(
+            f"processing {entry['process']} "
+            f"({entry.get('lane', DEFAULT_LANE)}{wait_str}): "
+            f"{entry['payload']}")
         entry_full = process_entry_from_json(process_hnd, entry)
         compute = process_hnd["compute"]
         info = compute(entry_full["payload"])
         log_process(f"done {entry['payload']}: {info}")
 
-    def run() -> None:
-        global PROCESS_THREAD  # pylint: disable=global-statement
-
+    def run(worker_id: str) -> None:
+        th = threading.current_thread()
         try:
-            while th is PROCESS_THREAD:
+            while PROCESS_THREADS.get(worker_id) is th:
                 with PROCESS_LOCK:
-                    entry = PROCESS_COND.wait_for(get_item, hb_timeout)
+                    entry = PROCESS_COND.wait_for(
+                        lambda: get_item(worker_id), hb_timeout)
                 if entry is None:
                     continue
                 try:
@@ -392,6 +783,7 @@ def maybe_process_thread(process_queue_redis: Redis) -> None:
                         error: ProcessError = {
                             "payload": entry["payload"],
                             "process": entry["process"],
+                            "lane": entry.get("lane", DEFAULT_LANE),
                             "error": error_str,
                         }
                         process_queue_redis.rpush(
@@ -399,28 +791,45 @@ def maybe_process_thread(process_queue_redis: Redis) -> None:
                             process_error_to_redis(error))
                         log_process(f"error {entry['payload']}")
                 finally:
-                    complete_item()
+                    complete_item(worker_id, entry)
         finally:
             with PROCESS_LOCK:
-                if th is PROCESS_THREAD:
-                    PROCESS_THREAD = None
+                if PROCESS_THREADS.get(worker_id) is th:
+                    PROCESS_THREADS.pop(worker_id, None)
 
     def heartbeat() -> None:
-        while th is PROCESS_THREAD:
-            process_queue_redis.set_value(
-                process_lock_key,
-                process_id,
-                mode=RSM_MISSING,
-                expire_in=hb_timeout * 2)
+        th = threading.current_thread()
+        while PROCESS_HB_THREAD is th:
+            with PROCESS_LOCK:
+                worker_ids = list(PROCESS_THREADS.keys())
+                leases = list(PROCESS_LEASES.values())
+            try:
+                for worker_id in worker_ids:
+                    set_heartbeat(worker_id)
+                for hnd_name in leases:
+                    process_queue_redis.expire(
+                        get_lease_key(hnd_name),
+                        expire_in=visibility_timeout)
+                if recover_stale(process_queue_redis):
+                    with PROCESS_LOCK:
+                        PROCESS_COND.notify_all()
+            except Exception:  # pylint: disable=broad-exception-caught
+                print(traceback.format_exc())
             time.sleep(hb_timeout)
 
     with PROCESS_LOCK:
-        if PROCESS_THREAD is not None and PROCESS_THREAD.is_alive():
-            PROCESS_COND.notify_all()
-            return
-        process_id = uuid.uuid4().hex
-        hb = threading.Thread(target=heartbeat, daemon=True)
-        th = threading.Thread(target=run, daemon=True)
-        PROCESS_THREAD = th
-        hb.start()
-        th.start()
+        for worker_id, cur_th in list(PROCESS_THREADS.items()):
+            if not cur_th.is_alive():
+                PROCESS_THREADS.pop(worker_id, None)
+        while len(PROCESS_THREADS) < PROCESS_WORKERS:
+            worker_id = uuid.uuid4().hex
+            set_heartbeat(worker_id)
+            process_queue_redis.sadd(PROCESS_WORKERS_KEY, worker_id)
+            th = threading.Thread(target=run, args=(worker_id,), daemon=True)
+            PROCESS_THREADS[worker_id] = th
+            th.start()
+        if PROCESS_HB_THREAD is None or not PROCESS_HB_THREAD.is_alive():
+            hb = threading.Thread(target=heartbeat, daemon=True)
+            PROCESS_HB_THREAD = hb
+            hb.start()
+        PROCESS_COND.notify_all()
@@ -14,10 +14,14 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """Convenience functions for llama_cpp_py interactions."""
+import collections
+import hashlib
 import os
 import pickle
+import threading
 from typing import Literal, TypedDict
 
+import llama_cpp
 from llama_cpp import ChatCompletionRequestMessage, Llama, LlamaState
 from scattermind.system.io import open_readb, open_reads, open_writeb
 
@@ -53,6 +57,10 @@ MSGS_FILE = "msgs.json"
 """File to store the messages in. Unused."""
 SYS_PROMPT_FILE = "system_prompt.txt"
 """File to store the system prompt. Unused."""
+PREFIX_STATE_PREFIX = "prefix_"
+"""File prefix of stored prompt prefix states."""
+PREFIX_STATE_EXT = ".pkl"
+"""File extension of stored prompt prefix states."""
 
 
 def load_state(model: Llama, cache_dir: str) -> bool:
@@ -154,3 +162,183 @@ def load_system_prompt(
         },
     ]
     return messages
+
+
+def get_prefix_key(system_prompt: str) -> str:
+    """
+    Computes the key of a prompt prefix state.
+
+    Args:
+        system_prompt (str): The system prompt that makes up the prefix.
+
+    Returns:
+        str: The key.
+    """
+    blake = hashlib.blake2b(digest_size=32)
+    blake.update(system_prompt.encode("utf-8"))
+    return blake.hexdigest()
+
+
+def get_model_key(model: Llama, *, model_path: str, n_ctx: int) -> str:
+    """
+    Computes a key identifying everything that affects the model state of a
+    prompt prefix besides the prefix itself. Prefix states must only be
+    reused for the same key.
+
+    Args:
+        model (Llama): The model.
+        model_path (str): The path of the model weights.
+        n_ctx (int): The context size.
+
+    Returns:
+        str: The key.
+    """
+    blake = hashlib.blake2b(digest_size=16)
+    for part in (
+            model_path,
+            f"{n_ctx}",
+            f"{llama_cpp.__version__}",
+            f"{model.chat_format}",
+            f"{model.metadata.get('tokenizer.chat_template', '')}"):
+        part_bytes = part.encode("utf-8")
+        blake.update(f"{len(part_bytes)}:".encode("utf-8"))
+        blake.update(part_bytes)
+    return blake.hexdigest()
+
+
+class PrefixStateCache:
+    """A bounded cache of model states after evaluating a prompt prefix.
+    Recently used states are kept in memory and all states are stored on
+    disk."""
+    def __init__(
+            self,
+            cache_dir: str | None,
+            *,
+            max_memory: int,
+            max_disk: int) -> None:
+        """
+        Creates a prefix state cache.
+
+        Args:
+            cache_dir (str | None): The folder to store states in. If None,
+                states are only kept in memory.
+            max_memory (int): The maximum number of states in memory.
+            max_disk (int): The maximum number of states on disk.
+        """
+        self._lock = threading.RLock()
+        self._cache_dir = cache_dir
+        self._max_memory = max(1, max_memory)
+        self._max_disk = max(1, max_disk)
+        self._states: collections.OrderedDict[str, LlamaState] = \
+            collections.OrderedDict()
+
+    def _get_file(self, key: str) -> str | None:
+        if self._cache_dir is None:
+            return None
+        return os.path.join(
+            self._cache_dir, f"{PREFIX_STATE_PREFIX}{key}{PREFIX_STATE_EXT}")
+
+    def _put_memory(self, key: str, state: LlamaState) -> None:
+        self._states[key] = state
+        self._states.move_to_end(key)
+        while len(self._states) > self._max_memory:
+            self._states.popitem(last=False)
+
+    def _trim_disk(self) -> None:
+        cache_dir = self._cache_dir
+        if cache_dir is None:
+            return
+        files = [
+            os.path.join(cache_dir, fname)
+            for fname in os.listdir(cache_dir)
+            if fname.startswith(PREFIX_STATE_PREFIX)
+            and fname.endswith(PREFIX_STATE_EXT)
+        ]
+        if len(files) <= self._max_disk:
+            return
+        files.sort(key=os.path.getmtime)
+        for fname in files[:-self._max_disk]:
+            try:
+                os.remove(fname)
+            except FileNotFoundError:
+                pass
+
+    def get(self, key: str) -> LlamaState | None:
+        """
+        Retrieves a prefix state.
+
+        Args:
+            key (str): The key. See `get_prefix_key`.
+
+        Returns:
+            LlamaState | None: The state or None if it is not cached.
+        """
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None:
+                self._states.move_to_end(key)
+                return state
+            state_file = self._get_file(key)
+            if state_file is None or not os.path.exists(state_file):
+                return None
+            try:
+                with open_readb(state_file) as state_in:
+                    state = pickle.load(state_in)
+            except (EOFError, pickle.UnpicklingError):
+                print(f"invalid prefix state {state_file}")
+                return None
+            os.utime(state_file)
+            self._put_memory(key, state)
+            return state
+
+    def put(self, key: str, state: LlamaState) -> None:
+        """
+        Stores a prefix state.
+
+        Args:
+            key (str): The key. See `get_prefix_key`.
+            state (LlamaState): The state.
+        """
+        with self._lock:
+            self._put_memory(key, state)
+            state_file = self._get_file(key)
+            if state_file is None:
+                return
+            with open_writeb(state_file) as state_out:
+                pickle.dump(state, state_out)
+            self._trim_disk()
+
+
+def load_prefix_state(
+        model: Llama,
+        cache: PrefixStateCache,
+        *,
+        system_prompt: str) -> str:
+    """
+    Puts the model into a state where the given system prompt has already
+    been evaluated. If the state is not cached yet the system prompt is
+    evaluated and the state is stored in the cache. Subsequent chat
+    completions starting with the system prompt only need to evaluate the
+    tokens after the prefix since llama_cpp reuses the longest matching
+    prefix of the current state.
+
+    Args:
+        model (Llama): The model.
+        cache (PrefixStateCache): The prefix state cache.
+        system_prompt (str): The system prompt.
+
+    Returns:
+        str: The key of the prefix state.
+    """
+    key = get_prefix_key(system_prompt)
+    state = cache.get(key)
+    if state is not None:
+        model.load_state(state)
+        return key
+    model.reset()
+    messages: list[ChatCompletionRequestMessage] = []
+    append_new_message(messages, text=system_prompt, role=ROLE_SYSTEM)
+    # NOTE: evaluates the prefix (the generated token is discarded later)
+    model.create_chat_completion(messages, max_tokens=1)
+    cache.put(key, model.save_state())
+    return key
@@ -34,6 +34,10 @@ from scattermind.system.torch_util import str_to_tensor, tensor_to_str
 
 from nlpapi.llama import (
     append_new_message,
+    get_model_key,
+    get_prefix_key,
+    load_prefix_state,
+    PrefixStateCache,
     ROLE_ASSISTANT,
     ROLE_SYSTEM,
     ROLE_USER,
@@ -46,6 +50,8 @@ class LlamaNode(Node):
         super().__init__(kind, graph, node_id)
         self._model: Llama | None = None
         self._cache_dir: str | None = None
+        self._prefix_cache: PrefixStateCache | None = None
+        self._prefix_key: str | None = None
 
     def do_is_pure(
             self,
@@ -84,9 +90,11 @@ class LlamaNode(Node):
         lib = os.getenv("LLAMA_CPP_LIB")
         lib_exists = False if lib is None else os.path.exists(lib)
         print(f"LLAMA_CPP_LIB is {lib} {lib_exists=}")
+        model_path = self.get_arg("model_path").get("str")
+        n_ctx = self.get_arg("n_ctx").get("int", 30000)
         self._model = Llama(
-            model_path=self.get_arg("model_path").get("str"),
-            n_ctx=self.get_arg("n_ctx").get("int", 30000),
+            model_path=model_path,
+            n_ctx=n_ctx,
             n_gpu_layers=self.get_arg("n_gpu_layers").get("int", -1),
             # n_threads=6,
             # n_batch=521,
@@ -94,10 +102,20 @@ class LlamaNode(Node):
             # flash_attn=True,
             verbose=True)
         self._cache_dir = roa.get_scratchspace(self)
+        # NOTE: states are only valid for the exact model configuration
+        model_key = get_model_key(
+            self._model, model_path=model_path, n_ctx=n_ctx)
+        self._prefix_cache = PrefixStateCache(
+            os.path.join(self._cache_dir, "prefix", model_key),
+            max_memory=self.get_arg("prefix_memory").get("int", 2),
+            max_disk=self.get_arg("prefix_disk").get("int", 8))
+        self._prefix_key = None
 
     def do_unload(self) -> None:
         self._model = None
         self._cache_dir = None
+        self._prefix_cache = None
+        self._prefix_key = None
 
     def expected_output_meta(
             self, state: ComputeState) -> dict[str, tuple[float, int]]:
@@ -117,10 +135,10 @@ class LlamaNode(Node):
             task: ComputeTask) -> str:
         if not task.is_valid():
             return ""
-        # FIXME: maybe use state
-        # if not load_state(model, cache_dir):
         set_seed = True
         add_reminder = True
+        if main_prompt:
+            self._restore_prefix(model, main_prompt)
         if set_seed:
             model.set_seed(123)
         messages: list[ChatCompletionRequestMessage] = []
@@ -160,10 +178,20 @@ class LlamaNode(Node):
                 "content": full_response,
             })
 
-        # FIXME: use state
-        # save_state(model, cache_dir)
         return full_response
 
+    def _restore_prefix(self, model: Llama, main_prompt: str) -> None:
+        prefix_cache = self._prefix_cache
+        assert prefix_cache is not None
+        prefix_key = self._prefix_key
+        if prefix_key is not None and prefix_key == get_prefix_key(
+                main_prompt):
+            # NOTE: the current state already starts with the prefix
+            return
+        self._prefix_key = None
+        self._prefix_key = load_prefix_state(
+            model, prefix_cache, system_prompt=main_prompt)
+
     def execute_tasks(self, state: ComputeState) -> None:
         assert self._model is not None
         assert self._cache_dir is not None
@@ -16,16 +16,17 @@
 """Tagging model using KeyBERT."""
 import re
 import threading
+from collections import OrderedDict
 
 # FIXME: the types are there, though...
 from keybert import KeyBERT  # type: ignore
 
 
 try:
-    from nltk import pos_tag, word_tokenize  # type: ignore
+    from nltk import pos_tag_sents, word_tokenize  # type: ignore
 except ModuleNotFoundError:
     # NOTE: need to make sure the symbols are there
-    pos_tag = None  # pylint: disable=invalid-name
+    pos_tag_sents = None  # pylint: disable=invalid-name
     word_tokenize = None  # pylint: disable=invalid-name
 from scattermind.system.base import GraphId, NodeId
 from scattermind.system.client.client import ComputeTask
@@ -48,6 +49,8 @@ REMOVE_NUMS = re.compile(r"\d+")
 EMAIL = re.compile(r"\S+@\S+")
 FULL_URL = re.compile(r"http[s]?\S+", flags=re.IGNORECASE)
 EXCLUDE_TAGS = {"NNP", "NNPS"}
+PREP_CACHE_SIZE = 10000
+"""The number of preprocessed texts to keep in memory."""
 
 
 def remove_numbers(text: str) -> str:
@@ -63,9 +66,9 @@ def remove_numbers(text: str) -> str:
     return REMOVE_NUMS.sub("", text)
 
 
-def remove_proper_nouns(text: str) -> str:
+def remove_emails_and_hyperlinks(text: str) -> str:
     """
-    Remove nouns.
+    Remove emails and links.
 
     Args:
         text (str): The text.
@@ -73,27 +76,47 @@ def remove_proper_nouns(text: str) -> str:
     Returns:
         str: The transformed text.
     """
-    pos_tags = pos_tag(word_tokenize(text))
-    return " ".join((
-        word
-        for word, pos in pos_tags
-        if pos not in EXCLUDE_TAGS))
+    return FULL_URL.sub("", EMAIL.sub("", text))
 
 
-def remove_emails_and_hyperlinks(text: str) -> str:
+LOCK = threading.RLock()
+PREP_CACHE: OrderedDict[str, str] = OrderedDict()
+"""Cache of preprocessed texts. The cache is accessed while holding `LOCK`."""
+
+
+def prep_texts(texts: list[str]) -> list[str]:
     """
-    Remove emails and links.
+    Prepares multiple texts for keyword extraction. Part of speech tagging
+    is performed on all texts at once. Results are cached.
 
     Args:
-        text (str): The text.
+        texts (list[str]): The texts.
 
     Returns:
-        str: The transformed text.
+        list[str]: The transformed texts.
     """
-    return FULL_URL.sub("", EMAIL.sub("", text))
-
-
-LOCK = threading.RLock()
+    res: dict[str, str] = {}
+    with LOCK:
+        for text in texts:
+            cached = PREP_CACHE.get(text)
+            if cached is not None:
+                PREP_CACHE.move_to_end(text)
+                res[text] = cached
+    missing = sorted({text for text in texts if text not in res})
+    if missing:
+        cleaned = [remove_emails_and_hyperlinks(text) for text in missing]
+        all_tags = pos_tag_sents([word_tokenize(text) for text in cleaned])
+        with LOCK:
+            for text, pos_tags in zip(missing, all_tags):
+                prepped = remove_numbers(" ".join((
+                    word
+                    for word, pos in pos_tags
+                    if pos not in EXCLUDE_TAGS)))
+                res[text] = prepped
+                PREP_CACHE[text] = prepped
+            while len(PREP_CACHE) > PREP_CACHE_SIZE:
+                PREP_CACHE.popitem(last=False)
+    return [res[text] for text in texts]
 
 
 class TagModelNode(Node):
@@ -158,19 +181,22 @@ class TagModelNode(Node):
         inputs = state.get_values()
         model = self._model
 
-        def prep(text: str) -> str:
-            text = remove_emails_and_hyperlinks(text)
-            text = remove_proper_nouns(text)
-            text = remove_numbers(text)
-            return text
-
-        texts = [
-            prep(tensor_to_str(val))
+        tasks = list(inputs.get_current_tasks())
+        texts = prep_texts([
+            tensor_to_str(val)
             for val in inputs.get_data("text").iter_values()
-        ]
-        for task_ix, task in enumerate(inputs.get_current_tasks()):
-            keyword_scores = model.extract_keywords(
-                texts[task_ix], top_n=top_n)
+        ])
+        doc_ixs = [ix for ix, text in enumerate(texts) if text.strip()]
+        all_keyword_scores: list[list[tuple[str, float]]] = [[] for _ in tasks]
+        if doc_ixs:
+            extracted = model.extract_keywords(
+                [texts[ix] for ix in doc_ixs], top_n=top_n)
+            if len(doc_ixs) == 1:
+                # NOTE: KeyBERT unwraps the result for a single document
+                extracted = [extracted]
+            for ix, keyword_scores in zip(doc_ixs, extracted):
+                all_keyword_scores[ix] = keyword_scores
+        for task, keyword_scores in zip(tasks, all_keyword_scores):
             keywords: list[str] = []
             scores: list[float] = []
             print(keyword_scores)
@@ -0,0 +1,162 @@
+# NLP-API provides useful Natural Language Processing capabilities as API.
+# Copyright (C) 2024 UNDP Accelerator Labs, Josua Krause
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Test the session cache."""
+import collections
+import time
+import uuid
+from typing import cast
+
+import pytest
+
+from app.system import auth
+from app.system.auth import (
+    evict_session,
+    get_session,
+    get_session_cache_stats,
+    SessionInfo,
+)
+from app.system.db.db import DBConnector
+
+
+PLATFORM_DB = cast(DBConnector, None)
+"""Stand-in for the login database. Sessions are read via `setup_sessions`."""
+
+
+def setup_sessions(
+        monkeypatch: pytest.MonkeyPatch,
+        sessions: dict[str, SessionInfo],
+        *,
+        ttl: float,
+        negative_ttl: float,
+        size: int) -> list[str]:
+    """
+    Sets up a fresh session cache reading from the given sessions.
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): Restores the state after the test.
+        sessions (dict[str, SessionInfo]): The valid sessions by session id.
+        ttl (float): The time in seconds a valid session is cached.
+        negative_ttl (float): The time in seconds an invalid session is
+            cached.
+        size (int): The maximum number of cached sessions.
+
+    Returns:
+        list[str]: The session ids read from the login database.
+    """
+    reads: list[str] = []
+
+    def read_session(
+            _platform_db: DBConnector, sid: str) -> SessionInfo | None:
+        reads.append(sid)
+        return sessions.get(sid)
+
+    monkeypatch.setattr(auth, "read_session", read_session)
+    monkeypatch.setattr(auth, "SESSION_CACHE", collections.OrderedDict())
+    monkeypatch.setattr(auth, "SESSION_STATS", collections.Counter())
+    monkeypatch.setattr(auth, "SESSION_TTL", ttl)
+    monkeypatch.setattr(auth, "SESSION_NEGATIVE_TTL", negative_ttl)
+    monkeypatch.setattr(auth, "SESSION_CACHE_SIZE", size)
+    return reads
+
+
+def create_session(name: str) -> SessionInfo:
+    """
+    Creates session information.
+
+    Args:
+        name (str): The user name.
+
+    Returns:
+        SessionInfo: The session information.
+    """
+    return {
+        "uuid": uuid.uuid5(uuid.NAMESPACE_OID, name),
+        "name": name,
+    }
+
+
+def test_session_ttl(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that valid sessions are cached for a limited time."""
+    info = create_session("a")
+    reads = setup_sessions(
+        monkeypatch, {"a": info}, ttl=0.2, negative_ttl=60.0, size=10)
+    assert get_session(PLATFORM_DB, "s%3Aa.signature") == info
+    assert get_session(PLATFORM_DB, "s:a.other") == info
+    assert reads == ["a"]
+    time.sleep(0.3)
+    assert get_session(PLATFORM_DB, "s:a.signature") == info
+    assert reads == ["a", "a"]
+    stats = get_session_cache_stats()
+    assert stats["size"] == 1
+    assert stats["hits"] == 1
+    assert stats["negative_hits"] == 0
+    assert stats["misses"] == 2
+
+
+def test_session_negative(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that invalid sessions are cached for a shorter time."""
+    sessions: dict[str, SessionInfo] = {}
+    reads = setup_sessions(
+        monkeypatch, sessions, ttl=60.0, negative_ttl=0.2, size=10)
+    assert get_session(PLATFORM_DB, "s:b.signature") is None
+    assert get_session(PLATFORM_DB, "s:b.signature") is None
+    assert reads == ["b"]
+    sessions["b"] = create_session("b")
+    assert get_session(PLATFORM_DB, "s:b.signature") is None
+    time.sleep(0.3)
+    assert get_session(PLATFORM_DB, "s:b.signature") == sessions["b"]
+    assert get_session(PLATFORM_DB, "s:b.signature") == sessions["b"]
+    assert reads == ["b", "b"]
+    stats = get_session_cache_stats()
+    assert stats["hits"] == 1
+    assert stats["negative_hits"] == 2
+    assert stats["misses"] == 2
+
+
+def test_session_lru(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the least recently used session is dropped first."""
+    sessions = {name: create_session(name) for name in ["a", "b", "c"]}
+    reads = setup_sessions(
+        monkeypatch, sessions, ttl=60.0, negative_ttl=60.0, size=2)
+    for name in ["a", "b", "a", "c"]:
+        assert get_session(PLATFORM_DB, f"s:{name}.sig") == sessions[name]
+    assert reads == ["a", "b", "c"]
+    assert get_session_cache_stats()["size"] == 2
+    assert get_session(PLATFORM_DB, "s:a.sig") == sessions["a"]
+    assert reads == ["a", "b", "c"]
+    assert get_session(PLATFORM_DB, "s:b.sig") == sessions["b"]
+    assert reads == ["a", "b", "c", "b"]
+    assert get_session_cache_stats()["size"] == 2
+
+
+def test_evict_session(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that evicted sessions are read again."""
+    sessions = {name: create_session(name) for name in ["a", "b"]}
+    reads = setup_sessions(
+        monkeypatch, sessions, ttl=60.0, negative_ttl=60.0, size=10)
+    for name in ["a", "b"]:
+        get_session(PLATFORM_DB, f"s:{name}.sig")
+    del sessions["a"]
+    assert evict_session("s%3Aa.sig") == 1
+    assert evict_session("s:a.sig") == 0
+    assert get_session(PLATFORM_DB, "s:a.sig") is None
+    assert get_session(PLATFORM_DB, "s:b.sig") == sessions["b"]
+    assert reads == ["a", "b", "a"]
+    assert evict_session(None) == 2
+    assert get_session_cache_stats()["size"] == 0
+    assert get_session(PLATFORM_DB, "s:b.sig") == sessions["b"]
+    assert reads == ["a", "b", "a", "b"]
+    assert get_session_cache_stats()["evictions"] == 3
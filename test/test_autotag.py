@@ -0,0 +1,83 @@
+# NLP-API provides useful Natural Language Processing capabilities as API.
+# Copyright (C) 2024 UNDP Accelerator Labs, Josua Krause
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Test retrieving the tags of documents."""
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.system.autotag.autotag import (
+    get_tags_for_main_id,
+    get_tags_for_tag_group,
+)
+from app.system.db.base import (
+    TagCluster,
+    TagClusterMember,
+    TagGroupTable,
+    TagNamesTable,
+)
+
+
+def test_tags_for_main_id() -> None:
+    """Test that document tags only come from clusters of the tag group."""
+    engine = sa.create_engine("sqlite://")
+    for table in [TagGroupTable, TagNamesTable, TagCluster, TagClusterMember]:
+        table.__table__.create(engine)
+    with Session(engine) as session:
+        session.execute(sa.insert(TagGroupTable).values([
+            {"id": 1, "name": "first"},
+            {"id": 2, "name": "second"},
+        ]))
+        session.execute(sa.insert(TagNamesTable).values([
+            {
+                "main_id": "solution:1",
+                "tag_group_from": 1,
+                "tag_group_to": None,
+                "keyword": "water",
+            },
+            {
+                "main_id": "solution:1",
+                "tag_group_from": 1,
+                "tag_group_to": 2,
+                "keyword": "river",
+            },
+            {
+                "main_id": "solution:2",
+                "tag_group_from": 2,
+                "tag_group_to": None,
+                "keyword": "river",
+            },
+        ]))
+        session.execute(sa.insert(TagCluster).values([
+            {"id": 1, "tag_group": 1, "name": "Water"},
+            {"id": 2, "tag_group": 2, "name": "Hydrology"},
+        ]))
+        session.execute(sa.insert(TagClusterMember).values([
+            {"tag_cluster": 1, "keyword": "water"},
+            {"tag_cluster": 1, "keyword": "river"},
+            {"tag_cluster": 2, "keyword": "water"},
+            {"tag_cluster": 2, "keyword": "river"},
+        ]))
+        session.commit()
+
+        assert get_tags_for_main_id(session, 1, "solution:1") == {"Water"}
+        assert get_tags_for_main_id(session, 2, "solution:1") == {"Hydrology"}
+        assert get_tags_for_main_id(session, 1, "solution:2") == set()
+        assert get_tags_for_main_id(session, 2, "solution:2") == {"Hydrology"}
+        assert get_tags_for_main_id(session, 2, "solution:3") == set()
+        for tag_group in [1, 2]:
+            group_tags = get_tags_for_tag_group(session, tag_group)
+            for main_id in ["solution:1", "solution:2"]:
+                assert group_tags.get(main_id, set()) == get_tags_for_main_id(
+                    session, tag_group, main_id)
@@ -0,0 +1,188 @@
+# NLP-API provides useful Natural Language Processing capabilities as API.
+# Copyright (C) 2024 UNDP Accelerator Labs, Josua Krause
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Test coalescing concurrent model requests."""
+import threading
+import time
+from typing import cast
+
+import pytest
+from scattermind.system.names import GNamespace
+
+from app.system.smind import api
+from app.system.smind.api import GraphProfile, TextBatcher
+
+
+class FakeGraphProfile:  # pylint: disable=too-few-public-methods
+    """Stand-in for a model that only provides the namespace."""
+    def get_ns(self) -> GNamespace:
+        """
+        Get the namespace.
+
+        Returns:
+            GNamespace: The model namespace / graph.
+        """
+        return GNamespace("test")
+
+
+class FakeModel:
+    """Records the batches sent to the model."""
+    def __init__(self, *, fail: bool = False) -> None:
+        """
+        Creates a stand-in model. The output of a text is its length.
+
+        Args:
+            fail (bool, optional): Whether every batch fails. Defaults to
+                False.
+        """
+        self._lock = threading.Lock()
+        self._fail = fail
+        self.batches: list[list[str]] = []
+
+    def compute(
+            self,
+            texts: list[str],
+            *,
+            graph_profile: GraphProfile,
+            output_sample: int) -> list[int | None]:
+        """
+        Stand-in for `get_text_results_immediate`.
+
+        Args:
+            texts (list[str]): The input texts.
+            graph_profile (GraphProfile): The model.
+            output_sample (int): A sample of the output.
+
+        Raises:
+            ValueError: If the model is set to fail.
+
+        Returns:
+            list[int | None]: The outputs.
+        """
+        assert graph_profile.get_ns().get() == "test"
+        assert output_sample == 0
+        with self._lock:
+            self.batches.append(list(texts))
+        if self._fail:
+            raise ValueError("model failed")
+        return [len(text) for text in texts]
+
+
+def create_batcher(
+        monkeypatch: pytest.MonkeyPatch,
+        model: FakeModel,
+        *,
+        max_batch: int,
+        max_wait: float) -> TextBatcher[int]:
+    """
+    Creates a batcher that sends its batches to the given model.
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): Restores the model after the test.
+        model (FakeModel): The model.
+        max_batch (int): The batch size that triggers sending right away.
+        max_wait (float): The maximum time a batch waits for more texts.
+
+    Returns:
+        TextBatcher[int]: The batcher.
+    """
+    monkeypatch.setattr(api, "get_text_results_immediate", model.compute)
+    return TextBatcher(
+        cast(GraphProfile, FakeGraphProfile()),
+        output_sample=0,
+        max_batch=max_batch,
+        max_wait=max_wait)
+
+
+def test_batcher_concurrent(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that concurrent callers share one batch."""
+    model = FakeModel()
+    batcher = create_batcher(monkeypatch, model, max_batch=1000, max_wait=1.0)
+    callers = 8
+    barrier = threading.Barrier(callers)
+    inputs = [
+        [f"text {ix}", "shared", "x" * (ix + 1), f"text {ix}"]
+        for ix in range(callers)
+    ]
+    results: dict[int, list[int | None]] = {}
+
+    def run(ix: int) -> None:
+        barrier.wait()
+        results[ix] = batcher.compute(inputs[ix])
+
+    ths = [
+        threading.Thread(target=run, args=(ix,)) for ix in range(callers)
+    ]
+    for th in ths:
+        th.start()
+    for th in ths:
+        th.join()
+    assert len(model.batches) == 1
+    batch = model.batches[0]
+    assert len(batch) == len(set(batch))
+    assert set(batch) == {text for texts in inputs for text in texts}
+    for ix, texts in enumerate(inputs):
+        assert results[ix] == [len(text) for text in texts]
+    assert not batcher.compute([])
+
+
+def test_batcher_max_batch(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that a full batch is sent without waiting."""
+    model = FakeModel()
+    batcher = create_batcher(monkeypatch, model, max_batch=3, max_wait=30.0)
+    start = time.monotonic()
+    assert batcher.compute(["a", "bb", "ccc"]) == [1, 2, 3]
+    assert time.monotonic() - start < 10.0
+    assert model.batches == [["a", "bb", "ccc"]]
+
+
+def test_batcher_sequential(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that finished texts are computed again for later callers."""
+    model = FakeModel()
+    batcher = create_batcher(monkeypatch, model, max_batch=100, max_wait=0.01)
+    assert batcher.compute(["a", "bb"]) == [1, 2]
+    assert batcher.compute(["bb", "ccc"]) == [2, 3]
+    assert model.batches == [["a", "bb"], ["bb", "ccc"]]
+
+
+def test_batcher_error(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that model errors are raised for every caller."""
+    model = FakeModel(fail=True)
+    batcher = create_batcher(monkeypatch, model, max_batch=1000, max_wait=0.5)
+    callers = 4
+    barrier = threading.Barrier(callers)
+    errors: dict[int, BaseException] = {}
+
+    def run(ix: int) -> None:
+        barrier.wait()
+        try:
+            batcher.compute([f"text {ix}", "shared"])
+        except ValueError as exc:
+            errors[ix] = exc
+
+    ths = [
+        threading.Thread(target=run, args=(ix,)) for ix in range(callers)
+    ]
+    for th in ths:
+        th.start()
+    for th in ths:
+        th.join()
+    assert len(model.batches) == 1
+    assert sorted(errors.keys()) == list(range(callers))
+    assert all(f"{exc}" == "model failed" for exc in errors.values())
+    # NOTE: failed texts are not kept in flight
+    with pytest.raises(ValueError, match="model failed"):
+        batcher.compute(["shared"])
+    assert len(model.batches) == 2
@@ -0,0 +1,250 @@
+# NLP-API provides useful Natural Language Processing capabilities as API.
+# Copyright (C) 2024 UNDP Accelerator Labs, Josua Krause
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Test the facet index."""
+import random
+from typing import Any
+
+from app.system.smind.facets import FacetField, FacetFilter, FacetIndex
+
+
+STATUSES = ["public", "preview", "private"]
+COUNTRIES = ["FRA", "DEU", "ITA", "ESP", "NUL"]
+FIELDS: list[FacetField] = [
+    {
+        "key": "status",
+        "values": lambda val: [val],
+        "order": None,
+    },
+    {
+        "key": "iso3",
+        "values": lambda val: list(val),
+        "order": None,
+    },
+    {
+        "key": "date",
+        "values": lambda val: [f"day-{val}"],
+        "order": float,
+    },
+]
+FIELD_LOOKUP = {field["key"]: field for field in FIELDS}
+
+
+def random_payload(rng: random.Random) -> dict[str, Any]:
+    """
+    Creates a random payload. Fields can be missing.
+
+    Args:
+        rng (random.Random): The random number generator.
+
+    Returns:
+        dict[str, Any]: The payload.
+    """
+    res: dict[str, Any] = {}
+    if rng.random() < 0.9:
+        res["status"] = rng.choice(STATUSES)
+    if rng.random() < 0.8:
+        # NOTE: duplicate values of a row are counted once
+        res["iso3"] = rng.choices(COUNTRIES, k=rng.randint(0, 3))
+    if rng.random() < 0.8:
+        res["date"] = rng.randint(0, 20)
+    return res
+
+
+def random_filter(rng: random.Random) -> FacetFilter:
+    """
+    Creates a random filter.
+
+    Args:
+        rng (random.Random): The random number generator.
+
+    Returns:
+        FacetFilter: The filter.
+    """
+    values: dict[str, list[str]] = {}
+    ranges: dict[str, tuple[float, float]] = {}
+    if rng.random() < 0.5:
+        values["status"] = rng.sample(STATUSES, k=rng.randint(0, 2))
+    if rng.random() < 0.5:
+        values["iso3"] = rng.sample(COUNTRIES, k=rng.randint(0, 3))
+    if rng.random() < 0.5:
+        low = rng.randint(0, 20)
+        ranges["date"] = (low, low + rng.randint(0, 10))
+    return {
+        "values": values,
+        "ranges": ranges,
+    }
+
+
+def get_row_values(payload: dict[str, Any], key: str) -> set[str]:
+    """
+    Computes the facet values of a payload.
+
+    Args:
+        payload (dict[str, Any]): The payload.
+        key (str): The field.
+
+    Returns:
+        set[str]: The facet values.
+    """
+    raw = payload.get(key)
+    if raw is None:
+        return set()
+    return set(FIELD_LOOKUP[key]["values"](raw))
+
+
+def is_match(payload: dict[str, Any], facet_filter: FacetFilter) -> bool:
+    """
+    Whether a payload matches the filter.
+
+    Args:
+        payload (dict[str, Any]): The payload.
+        facet_filter (FacetFilter): The filter.
+
+    Returns:
+        bool: True, if the payload matches.
+    """
+    for key, field_values in facet_filter["values"].items():
+        if not field_values:
+            continue
+        if not get_row_values(payload, key).intersection(field_values):
+            return False
+    for key, (low, high) in facet_filter["ranges"].items():
+        raw = payload.get(key)
+        order_fn = FIELD_LOOKUP[key]["order"]
+        assert order_fn is not None
+        if raw is None or not low <= order_fn(raw) <= high:
+            return False
+    return True
+
+
+def brute_counts(
+        payloads: dict[str, dict[str, Any]],
+        key: str,
+        facet_filter: FacetFilter) -> dict[str, int]:
+    """
+    Counts the facet values of matching payloads one by one.
+
+    Args:
+        payloads (dict[str, dict[str, Any]]): The payloads by point id.
+        key (str): The field to count.
+        facet_filter (FacetFilter): The filter.
+
+    Returns:
+        dict[str, int]: The counts of each facet value.
+    """
+    res: dict[str, int] = {}
+    for payload in payloads.values():
+        if not is_match(payload, facet_filter):
+            continue
+        for value in get_row_values(payload, key):
+            res[value] = res.get(value, 0) + 1
+    return res
+
+
+def check_index(
+        index: FacetIndex,
+        payloads: dict[str, dict[str, Any]],
+        rng: random.Random) -> None:
+    """
+    Compares the index against counting the payloads one by one.
+
+    Args:
+        index (FacetIndex): The index.
+        payloads (dict[str, dict[str, Any]]): The expected payloads by point
+            id.
+        rng (random.Random): The random number generator.
+    """
+    assert index.size() == len(payloads)
+    for key in FIELD_LOOKUP:
+        assert set(index.get_values(key)) == {
+            value
+            for payload in payloads.values()
+            for value in get_row_values(payload, key)
+        }
+    filters: list[FacetFilter] = [{"values": {}, "ranges": {}}]
+    filters.extend(random_filter(rng) for _ in range(20))
+    for facet_filter in filters:
+        mask = index.get_mask(facet_filter)
+        assert mask.bit_count() == sum(
+            1 for payload in payloads.values()
+            if is_match(payload, facet_filter))
+        for key in FIELD_LOOKUP:
+            assert index.get_counts(key, mask) == brute_counts(
+                payloads, key, facet_filter), (key, facet_filter)
+
+
+def test_facet_build() -> None:
+    """Test counts of a facet index built from scratch."""
+    rng = random.Random(42)
+    points = [(f"p{ix}", random_payload(rng)) for ix in range(300)]
+    # NOTE: the first occurrence of a point wins
+    points.append(("p0", random_payload(rng)))
+    index = FacetIndex.build(FIELDS, points, version="v0")
+    assert index.get_version() == "v0"
+    payloads: dict[str, dict[str, Any]] = {}
+    for point_id, payload in points:
+        payloads.setdefault(point_id, payload)
+    check_index(index, payloads, rng)
+    empty = FacetIndex.build(FIELDS, [], version=None)
+    check_index(empty, {}, rng)
+
+
+def test_facet_updates() -> None:
+    """Test counts of a facet index after incremental updates."""
+    rng = random.Random(23)
+    payloads = {f"p{ix}": random_payload(rng) for ix in range(100)}
+    index = FacetIndex.build(FIELDS, payloads.items(), version="v0")
+    check_index(index, payloads, rng)
+    next_id = len(payloads)
+    for _ in range(10):
+        for _ in range(30):
+            choice = rng.random()
+            if choice < 0.3 and payloads:
+                point_id = rng.choice(sorted(payloads.keys()))
+                index.remove(point_id)
+                payloads.pop(point_id)
+            elif choice < 0.6 and payloads:
+                point_id = rng.choice(sorted(payloads.keys()))
+                payload = random_payload(rng)
+                index.set(point_id, payload)
+                payloads[point_id] = payload
+            else:
+                point_id = f"p{next_id}"
+                next_id += 1
+                payload = random_payload(rng)
+                index.set(point_id, payload)
+                payloads[point_id] = payload
+        # NOTE: removing an unknown point is a no-op
+        index.remove("unknown")
+        check_index(index, payloads, rng)
+    rebuilt = FacetIndex.build(FIELDS, payloads.items(), version="v1")
+    check_index(rebuilt, payloads, rng)
+    facet_filter = random_filter(rng)
+    for key in FIELD_LOOKUP:
+        assert index.get_counts(key, index.get_mask(facet_filter)) == \
+            rebuilt.get_counts(key, rebuilt.get_mask(facet_filter))
+
+
+def test_facet_version() -> None:
+    """Test advancing the version of a facet index."""
+    index = FacetIndex.build(FIELDS, [], version="v0")
+    assert not index.advance_version("v1", "v2")
+    assert index.get_version() == "v0"
+    assert index.advance_version("v0", "v1")
+    assert index.get_version() == "v1"
+    unversioned = FacetIndex(FIELDS, None)
+    assert not unversioned.advance_version(None, "v1")
+    assert unversioned.get_version() is None
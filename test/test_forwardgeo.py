@@ -0,0 +1,232 @@
+# NLP-API provides useful Natural Language Processing capabilities as API.
+# Copyright (C) 2024 UNDP Accelerator Labs, Josua Krause
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Test parallel forward geocoding."""
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import pytest
+from opencage.geocoder import RateLimitExceededError  # type: ignore
+
+from app.system.location import forwardgeo
+from app.system.location.forwardgeo import (
+    geo_results,
+    is_exceeded_for_today,
+    RateLimiter,
+    set_geo,
+    set_geo_limits,
+)
+
+
+class FakeGeocoder:
+    """A stand-in geocoder that records its calls."""
+    def __init__(
+            self,
+            *,
+            block: threading.Event | None = None,
+            errors: list[Exception] | None = None) -> None:
+        """
+        Creates a stand-in geocoder.
+
+        Args:
+            block (threading.Event | None, optional): If set, lookups wait for
+                the event. Defaults to None.
+            errors (list[Exception] | None, optional): Errors to raise for the
+                first lookups. Defaults to None.
+        """
+        self._lock = threading.Lock()
+        self._block = block
+        self._errors = [] if errors is None else list(errors)
+        self.calls: list[tuple[str, float]] = []
+
+    def geocode(self, query: str) -> list[Any] | None:
+        """
+        Looks up the query.
+
+        Args:
+            query (str): The query.
+
+        Returns:
+            list[Any] | None: The results in OpenCage format.
+        """
+        with self._lock:
+            self.calls.append((query, time.monotonic()))
+            error = self._errors.pop(0) if self._errors else None
+        if error is not None:
+            raise error
+        if self._block is not None:
+            self._block.wait()
+        return [
+            {
+                "components": {"ISO_3166-1_alpha-3": "FRA"},
+                "formatted": query,
+                "geometry": {"lat": 1.0, "lng": 2.0},
+            },
+        ]
+
+
+def setup_geo(
+        monkeypatch: pytest.MonkeyPatch,
+        geocoder: FakeGeocoder,
+        *,
+        workers: int,
+        rate: float) -> None:
+    """
+    Sets up a fresh geocoding state with the given geocoder.
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): Restores the state after the test.
+        geocoder (FakeGeocoder): The geocoder.
+        workers (int): The number of parallel requests.
+        rate (float): The maximum number of requests per second.
+    """
+    monkeypatch.setattr(forwardgeo, "GEOCODER", None)
+    monkeypatch.setattr(forwardgeo, "GEO_WORKERS", forwardgeo.GEO_WORKERS)
+    monkeypatch.setattr(forwardgeo, "GEO_RATE", forwardgeo.GEO_RATE)
+    monkeypatch.setattr(forwardgeo, "RATE_LIMITER", RateLimiter(rate))
+    monkeypatch.setattr(forwardgeo, "GEO_EXECUTOR", None)
+    monkeypatch.setattr(forwardgeo, "GEO_INFLIGHT", {})
+    monkeypatch.setattr(forwardgeo, "EXCEEDED_FOR_TODAY", None)
+    set_geo(geocoder)
+    set_geo_limits(workers=workers, rate=rate)
+
+
+def teardown_geo() -> None:
+    """Stops the geocoding executor."""
+    executor = forwardgeo.GEO_EXECUTOR
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def wait_inflight_empty() -> None:
+    """Waits until no query is in flight anymore."""
+    deadline = time.monotonic() + 5.0
+    while forwardgeo.GEO_INFLIGHT and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not forwardgeo.GEO_INFLIGHT
+
+
+def test_geo_rate_limit(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that parallel lookups share the rate limit."""
+    geocoder = FakeGeocoder()
+    setup_geo(monkeypatch, geocoder, workers=4, rate=20.0)
+    try:
+        queries = [f"city {ix}" for ix in range(6)]
+        res = geo_results(queries)
+        assert set(res.keys()) == set(queries)
+        for query in queries:
+            responses, status = res[query]
+            assert status == "ok"
+            assert responses is not None
+            assert responses[0]["formatted"] == query
+            assert responses[0]["country"] == "FRA"
+        assert sorted(query for query, _ in geocoder.calls) == queries
+        times = sorted(call_time for _, call_time in geocoder.calls)
+        # NOTE: the first token is available right away
+        assert times[-1] - times[0] >= 0.9 * (len(queries) - 1) / 20.0
+    finally:
+        teardown_geo()
+
+
+def test_geo_inflight(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that concurrent lookups of the same query are only sent once."""
+    block = threading.Event()
+    geocoder = FakeGeocoder(block=block)
+    setup_geo(monkeypatch, geocoder, workers=4, rate=1000.0)
+    try:
+        results: dict[str, dict] = {}
+
+        def run(name: str, queries: list[str]) -> None:
+            results[name] = geo_results(queries)
+
+        th_a = threading.Thread(target=run, args=("a", ["x", "y"]))
+        th_a.start()
+        deadline = time.monotonic() + 5.0
+        while len(geocoder.calls) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(geocoder.calls) == 2
+        th_b = threading.Thread(target=run, args=("b", ["y", "x", "y"]))
+        th_b.start()
+        time.sleep(0.2)
+        block.set()
+        th_a.join()
+        th_b.join()
+        assert sorted(query for query, _ in geocoder.calls) == ["x", "y"]
+        assert results["a"] == results["b"]
+        assert results["a"]["x"][1] == "ok"
+        wait_inflight_empty()
+        # NOTE: finished lookups are not cached at this level
+        geo_results(["x"])
+        assert len(geocoder.calls) == 3
+    finally:
+        block.set()
+        teardown_geo()
+
+
+def test_geo_exceeded_for_today(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that no lookups happen once the daily quota is reached."""
+    reset_time = datetime.now(timezone.utc) + timedelta(hours=5)
+    geocoder = FakeGeocoder(
+        errors=[RateLimitExceededError(reset_time=reset_time, reset_to=10)])
+    setup_geo(monkeypatch, geocoder, workers=2, rate=1000.0)
+    try:
+        assert geo_results(["x"]) == {"x": (None, "ratelimit")}
+        assert is_exceeded_for_today()
+        assert forwardgeo.EXCEEDED_FOR_TODAY == reset_time
+        assert len(geocoder.calls) == 1
+        wait_inflight_empty()
+        assert geo_results(["y", "z"]) == {
+            "y": (None, "ratelimit"),
+            "z": (None, "ratelimit"),
+        }
+        assert len(geocoder.calls) == 1
+        wait_inflight_empty()
+        monkeypatch.setattr(
+            forwardgeo,
+            "EXCEEDED_FOR_TODAY",
+            datetime.now(timezone.utc) - timedelta(seconds=1))
+        assert not is_exceeded_for_today()
+        assert forwardgeo.EXCEEDED_FOR_TODAY is None
+        assert geo_results(["y"])["y"][1] == "ok"
+        assert len(geocoder.calls) == 2
+    finally:
+        teardown_geo()
+
+
+def test_geo_short_rate_limit(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that a short rate limit pauses the lookups and retries."""
+    reset_time = datetime.now(timezone.utc) + timedelta(seconds=0.3)
+    geocoder = FakeGeocoder(
+        errors=[RateLimitExceededError(reset_time=reset_time, reset_to=10)])
+    setup_geo(monkeypatch, geocoder, workers=2, rate=1000.0)
+    try:
+        assert geo_results(["x"])["x"][1] == "ok"
+        assert not is_exceeded_for_today()
+        assert [query for query, _ in geocoder.calls] == ["x", "x"]
+        (_, first), (_, second) = geocoder.calls
+        assert second - first >= 0.1
+    finally:
+        teardown_geo()
+
+
+def test_geo_limits(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the rate must be positive."""
+    setup_geo(monkeypatch, FakeGeocoder(), workers=2, rate=0.5)
+    for rate in [0.0, -1.0]:
+        with pytest.raises(ValueError, match="must be positive"):
+            set_geo_limits(workers=2, rate=rate)
+    assert forwardgeo.GEO_RATE == 0.5
@@ -0,0 +1,249 @@
+# NLP-API provides useful Natural Language Processing capabilities as API.
+# Copyright (C) 2024 UNDP Accelerator Labs, Josua Krause
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Test caching location results."""
+import atexit
+import collections
+from collections.abc import Callable
+from typing import Any
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.pool import StaticPool
+
+from app.misc.lru import LRU
+from app.system.db.base import Base, LocationCache, LocationEntries
+from app.system.db.db import DBConnector
+from app.system.location import cache as geocache
+from app.system.location.cache import (
+    flush_geo_access,
+    read_geo_cache,
+    write_geo_cache,
+)
+from app.system.location.response import GeoResponse, GeoResult
+
+
+class SQLiteConnector(DBConnector):
+    """An in-memory database with the location cache tables."""
+    def __init__(self) -> None:  # pylint: disable=super-init-not-called
+        """Creates the database."""
+        self._engine = sa.create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool)
+        with self._engine.begin() as conn:
+            # NOTE: sqlite has no sequences so the ids are random instead
+            conn.execute(sa.text(
+                "CREATE TABLE location_cache ("
+                "query TEXT NOT NULL PRIMARY KEY, "
+                "id INTEGER NOT NULL UNIQUE DEFAULT (abs(random())), "
+                "access_last DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+                "access_count INTEGER NOT NULL DEFAULT 1, "
+                "no_cache BOOLEAN NOT NULL)"))
+        LocationEntries.__table__.create(self._engine)
+
+    def upsert(self, table: type[Base]) -> Any:
+        """
+        Create an upsert statement.
+
+        Args:
+            table (type[Base]): The table to upsert.
+
+        Returns:
+            Any: The statement.
+        """
+        return sqlite_insert(table)
+
+    def count_statements(self) -> Callable[[], int]:
+        """
+        Counts the statements executed from now on.
+
+        Returns:
+            Callable[[], int]: Returns the current count.
+        """
+        count = [0]
+
+        def on_execute(*_args: Any) -> None:
+            count[0] += 1
+
+        sa.event.listen(self._engine, "before_cursor_execute", on_execute)
+        return lambda: count[0]
+
+
+def setup_geocache(
+        monkeypatch: pytest.MonkeyPatch,
+        *,
+        lru_size: int) -> SQLiteConnector:
+    """
+    Sets up a fresh location cache state.
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): Restores the state after the test.
+        lru_size (int): The size of the in-process cache.
+
+    Returns:
+        SQLiteConnector: The database.
+    """
+    monkeypatch.setattr(geocache, "GEO_LRU", LRU(lru_size, lru_size))
+    monkeypatch.setattr(geocache, "ACCESS_FLUSH_INTERVAL", 60.0)
+    monkeypatch.setattr(geocache, "ACCESS_PENDING", collections.Counter())
+    monkeypatch.setattr(geocache, "ACCESS_TIMER", None)
+    monkeypatch.setattr(geocache, "ACCESS_AT_EXIT", True)
+    return SQLiteConnector()
+
+
+def teardown_geocache(db: SQLiteConnector) -> None:
+    """
+    Writes the buffered access counts and stops the flush timer.
+
+    Args:
+        db (SQLiteConnector): The database.
+    """
+    flush_geo_access(db)
+
+
+def create_response(query: str, pos: int) -> GeoResponse:
+    """
+    Creates a location response.
+
+    Args:
+        query (str): The query.
+        pos (int): The position of the response.
+
+    Returns:
+        GeoResponse: The response.
+    """
+    return {
+        "lat": float(pos),
+        "lng": -float(pos),
+        "formatted": f"{query} {pos}",
+        "country": "FRA",
+        "relevance": 1.0 / (pos + 1.0),
+    }
+
+
+def get_access_counts(db: SQLiteConnector) -> dict[str, int]:
+    """
+    Reads the access counts of all queries.
+
+    Args:
+        db (SQLiteConnector): The database.
+
+    Returns:
+        dict[str, int]: The access count of each query.
+    """
+    with db.get_session() as session:
+        stmt = sa.select(LocationCache.query, LocationCache.access_count)
+        return {
+            row.query: int(row.access_count)
+            for row in session.execute(stmt)
+        }
+
+
+def test_write_read(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that results are written in bulk and read back."""
+    db = setup_geocache(monkeypatch, lru_size=100)
+    try:
+        results: dict[str, GeoResult] = {
+            "paris": ([create_response("paris", 0)], "ok"),
+            " lyon ": (
+                [create_response("lyon", 0), create_response("lyon", 1)],
+                "ok",
+            ),
+            "nowhere": (None, "invalid"),
+            "cached": ([create_response("cached", 0)], "cache_hit"),
+        }
+        count = db.count_statements()
+        write_geo_cache(db, results)
+        assert count() == 2
+        write_geo_cache(db, {"paris": ([create_response("paris", 0)], "ok")})
+        assert get_access_counts(db) == {"paris": 1, "lyon": 1}
+        geocache.GEO_LRU.clear_keys(lambda _: True)
+        res = read_geo_cache(db, {"paris", "lyon ", "nowhere"})
+        assert res == {
+            "paris": ([create_response("paris", 0)], "cache_hit"),
+            "lyon": (
+                [create_response("lyon", 0), create_response("lyon", 1)],
+                "cache_hit",
+            ),
+            "nowhere": (None, "cache_miss"),
+        }
+    finally:
+        teardown_geocache(db)
+
+
+def test_read_lru(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that repeated reads are answered from the in-process cache."""
+    db = setup_geocache(monkeypatch, lru_size=2)
+    try:
+        write_geo_cache(db, {
+            query: ([create_response(query, 0)], "ok")
+            for query in ["a", "b", "c"]
+        })
+        geocache.GEO_LRU.clear_keys(lambda _: True)
+        count = db.count_statements()
+        first = read_geo_cache(db, {"a", "b"})
+        assert count() == 2
+        assert read_geo_cache(db, {"a", "b"}) == first
+        assert count() == 2
+        assert read_geo_cache(db, {"a"})["a"][1] == "cache_hit"
+        assert read_geo_cache(db, {"c"})["c"][1] == "cache_hit"
+        assert count() == 4
+        # NOTE: "b" is the least recently used entry and got evicted
+        assert read_geo_cache(db, {"a", "c"})["a"][1] == "cache_hit"
+        assert count() == 4
+        assert read_geo_cache(db, {"b"})["b"][1] == "cache_hit"
+        assert count() == 6
+    finally:
+        teardown_geocache(db)
+
+
+def test_flush_access(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that buffered access counts add up."""
+    db = setup_geocache(monkeypatch, lru_size=100)
+    write_geo_cache(db, {
+        query: ([create_response(query, 0)], "ok")
+        for query in ["a", "b", "c"]
+    })
+    for queries in [{"a", "b"}, {"a"}, {"a", "missing"}, {"b"}]:
+        read_geo_cache(db, queries)
+    assert geocache.ACCESS_TIMER is not None
+    assert get_access_counts(db) == {"a": 1, "b": 1, "c": 1}
+    flush_geo_access(db)
+    assert geocache.ACCESS_TIMER is None
+    assert not geocache.ACCESS_PENDING
+    assert get_access_counts(db) == {"a": 4, "b": 3, "c": 1}
+    flush_geo_access(db)
+    assert get_access_counts(db) == {"a": 4, "b": 3, "c": 1}
+
+
+def test_flush_at_exit(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that buffered access counts are written when the process exits."""
+    db = setup_geocache(monkeypatch, lru_size=100)
+    monkeypatch.setattr(geocache, "ACCESS_AT_EXIT", False)
+    handlers: list[tuple[Callable[..., Any], tuple[Any, ...]]] = []
+
+    def register(fn: Callable[..., Any], *args: Any) -> None:
+        handlers.append((fn, args))
+
+    monkeypatch.setattr(atexit, "register", register)
+    write_geo_cache(db, {"a": ([create_response("a", 0)], "ok")})
+    read_geo_cache(db, {"a"})
+    read_geo_cache(db, {"a"})
+    assert len(handlers) == 1
+    for fn, args in handlers:
+        fn(*args)
+    assert get_access_counts(db) == {"a": 3}
@@ -0,0 +1,87 @@
+# NLP-API provides useful Natural Language Processing capabilities as API.
+# Copyright (C) 2024 UNDP Accelerator Labs, Josua Krause
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Test math functions."""
+import numpy as np
+
+from app.misc.math import dot_order, dot_order_np, top_k_np
+
+
+def dot_order_per_group(
+        embed: list[float],
+        sembeds: list[tuple[tuple[int, str], list[float]]],
+        hit_limit: int) -> dict[int, list[str]]:
+    """
+    Orders snippets by computing a separate dot product for each group. This
+    is the reference implementation for `dot_order`.
+
+    Args:
+        embed (list[float]): The reference embedding.
+        sembeds (list[tuple[tuple[int, str], list[float]]]): The candidates.
+        hit_limit (int): The maximum number of hits to return.
+
+    Returns:
+        dict[int, list[str]]: A mapping of the position in the overall result
+            to the ordered list of snippets.
+    """
+    mat_ref = np.array([embed])
+    lookup: dict[int, list[tuple[str, list[float]]]] = {}
+    for ((pos, txt), cur_embed) in sembeds:
+        lookup.setdefault(pos, []).append((txt, cur_embed))
+    res: dict[int, list[str]] = {}
+    for pos, group in lookup.items():
+        cand_embeds = np.array([sembed for (_, sembed) in group])
+        ixs = dot_order_np(mat_ref, cand_embeds)
+        res[pos] = [group[ix][0] for ix in ixs[:hit_limit]]
+    return res
+
+
+def test_top_k_np() -> None:
+    """Test the function `top_k_np`."""
+    rng = np.random.default_rng(42)
+    for size in [0, 1, 2, 5, 17, 100]:
+        scores = rng.normal(size=(size,))
+        expected = list(np.argsort(-scores))
+        for count in [0, 1, 2, 3, 10, 100, 200]:
+            res = top_k_np(scores, count)
+            assert list(res) == expected[:count], (size, count)
+    assert list(top_k_np(np.array([1.0, 2.0]), -1)) == []
+    ties = np.array([1.0, 3.0, 1.0, 3.0, 2.0, 3.0])
+    assert list(top_k_np(ties, 6)) == [1, 3, 5, 4, 0, 2]
+    # NOTE: the order of ties is only stable if all elements are returned
+    top_ties = list(top_k_np(ties, 4))
+    assert sorted(top_ties[:3]) == [1, 3, 5]
+    assert top_ties[3] == 4
+
+
+def test_dot_order() -> None:
+    """Test that `dot_order` matches the per group implementation."""
+    rng = np.random.default_rng(23)
+    assert not dot_order([1.0, 0.0], [], 3)
+    for dim, groups, hit_limit in [(4, 1, 1), (8, 5, 3), (16, 20, 10)]:
+        embed = list(rng.normal(size=(dim,)))
+        sembeds: list[tuple[tuple[int, str], list[float]]] = []
+        for pos in rng.permutation(groups):
+            for ix in range(int(rng.integers(1, 15))):
+                sembeds.append((
+                    (int(pos), f"snippet {pos} {ix}"),
+                    list(rng.normal(size=(dim,))),
+                ))
+        rng.shuffle(sembeds)
+        res = dot_order(embed, sembeds, hit_limit)
+        assert res == dot_order_per_group(embed, sembeds, hit_limit)
+        assert set(res.keys()) == set(range(groups))
+        for snippets in res.values():
+            assert 0 < len(snippets) <= hit_limit
@@ -0,0 +1,316 @@
+# NLP-API provides useful Natural Language Processing capabilities as API.
+# Copyright (C) 2024 UNDP Accelerator Labs, Josua Krause
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Test the processing queue."""
+import threading
+import time
+from collections.abc import Callable
+
+import pytest
+from redipy import Redis
+
+from app.system.workqueues import queue
+from app.system.workqueues.queue import (
+    get_active_key,
+    get_heartbeat_key,
+    get_lease_key,
+    get_queue_key,
+    get_release_script,
+    PROCESS_ACTIVE_KEY,
+    process_entry_to_redis,
+    PROCESS_LANES,
+    process_queue_info,
+    PROCESS_QUEUE_KEY,
+    PROCESS_WORKERS_KEY,
+    ProcessLane,
+    recover_stale,
+    register_process_queue,
+)
+
+
+def setup_queue(monkeypatch: pytest.MonkeyPatch) -> Redis:
+    """
+    Sets up a fresh processing queue state with a single worker.
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): Restores the state after the test.
+
+    Returns:
+        Redis: The processing queue redis.
+    """
+    monkeypatch.setattr(queue, "PROCESS_HND_LOOKUP", {})
+    monkeypatch.setattr(queue, "PROCESS_THREADS", {})
+    monkeypatch.setattr(queue, "PROCESS_HB_THREAD", None)
+    monkeypatch.setattr(queue, "PROCESS_WORKERS", 1)
+    monkeypatch.setattr(queue, "PROCESS_RUNNING", {})
+    monkeypatch.setattr(queue, "PROCESS_VTIME", {})
+    monkeypatch.setattr(queue, "PROCESS_CUR_VTIME", 0.0)
+    monkeypatch.setattr(queue, "PROCESS_LEASES", {})
+    monkeypatch.setattr(queue, "CLAIM_SCRIPTS", {})
+    monkeypatch.setattr(queue, "RELEASE_SCRIPTS", {})
+    monkeypatch.setattr(queue, "HB_TIMEOUT", 0.1)
+    return Redis("memory")
+
+
+def teardown_queue() -> None:
+    """Stops the worker and heartbeat threads."""
+    with queue.PROCESS_LOCK:
+        ths = list(queue.PROCESS_THREADS.values())
+        queue.PROCESS_THREADS.clear()
+        hb_th = queue.PROCESS_HB_THREAD
+        queue.PROCESS_HB_THREAD = None
+        queue.PROCESS_COND.notify_all()
+    if hb_th is not None:
+        ths.append(hb_th)
+    for th in ths:
+        th.join(5.0)
+        assert not th.is_alive()
+
+
+def create_recorder(
+        name: str,
+        order: list[tuple[str, str]],
+        total: int,
+        done: threading.Event) -> Callable[[str], None]:
+    """
+    Creates a compute function that records the processed payloads.
+
+    Args:
+        name (str): The name of the handler.
+        order (list[tuple[str, str]]): The processed handlers and payloads.
+        total (int): The number of tasks after which `done` is set.
+        done (threading.Event): Set once all tasks are processed.
+
+    Returns:
+        Callable[[str], None]: The compute function.
+    """
+
+    def compute(payload: str) -> None:
+        order.append((name, payload))
+        if len(order) >= total:
+            done.set()
+
+    return compute
+
+
+def create_entry(
+        name: str, payload: str, *, lane: ProcessLane | None) -> str:
+    """
+    Creates a processing queue entry as stored in redis.
+
+    Args:
+        name (str): The name of the handler.
+        payload (str): The payload.
+        lane (ProcessLane | None): The lane or None to create an entry as
+            created by older versions.
+
+    Returns:
+        str: The redis value.
+    """
+    if lane is None:
+        return process_entry_to_redis({
+            "payload": {"value": payload},
+            "process": name,
+        })
+    return process_entry_to_redis({
+        "payload": {"value": payload},
+        "process": name,
+        "lane": lane,
+    })
+
+
+def register_recorder(
+        name: str,
+        order: list[tuple[str, str]],
+        total: int,
+        done: threading.Event,
+        *,
+        weight: float) -> queue.ProcessEnqueue[str]:
+    """
+    Registers a processing queue that records the processed payloads.
+
+    Args:
+        name (str): The name of the queue.
+        order (list[tuple[str, str]]): The processed handlers and payloads.
+        total (int): The number of tasks after which `done` is set.
+        done (threading.Event): Set once all tasks are processed.
+        weight (float): The weight of the queue.
+
+    Returns:
+        queue.ProcessEnqueue[str]: Enqueues tasks.
+    """
+    return register_process_queue(
+        name,
+        lambda payload: {"value": payload},
+        lambda obj: obj["value"],
+        create_recorder(name, order, total, done),
+        weight=weight)
+
+
+def test_queue_lanes(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that tasks are processed in lane order."""
+    process_queue_redis = setup_queue(monkeypatch)
+    try:
+        order: list[tuple[str, str]] = []
+        done = threading.Event()
+        enqueue = register_recorder("lanes", order, 6, done, weight=1.0)
+        # NOTE: holding the lock prevents the worker from claiming tasks
+        with queue.PROCESS_LOCK:
+            enqueue(process_queue_redis, "low 0", lane="low")
+            enqueue(process_queue_redis, "normal 0")
+            enqueue(process_queue_redis, "high 0", lane="high")
+            enqueue(process_queue_redis, "low 1", lane="low")
+            enqueue(process_queue_redis, "normal 1", lane="normal")
+            enqueue(process_queue_redis, "high 1", lane="high")
+            info = process_queue_info(process_queue_redis)
+            assert info["queue"] == 6
+            for lane in PROCESS_LANES:
+                assert info["lanes"][lane]["queue"] == 2
+                assert list(info["lanes"][lane]["handlers"].values()) == [2]
+        assert done.wait(10.0)
+        assert [payload for _, payload in order] == [
+            "high 0",
+            "high 1",
+            "normal 0",
+            "normal 1",
+            "low 0",
+            "low 1",
+        ]
+    finally:
+        teardown_queue()
+    assert process_queue_info(process_queue_redis)["queue"] == 0
+
+
+def test_queue_weights(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that handlers get processing time according to their weight."""
+    process_queue_redis = setup_queue(monkeypatch)
+    try:
+        order: list[tuple[str, str]] = []
+        done = threading.Event()
+        total = 24
+        enqueue_heavy = register_recorder(
+            "heavy", order, total, done, weight=2.0)
+        enqueue_light = register_recorder(
+            "light", order, total, done, weight=1.0)
+        with queue.PROCESS_LOCK:
+            enqueue_light(process_queue_redis, "low", lane="low")
+            for ix in range(11):
+                enqueue_light(process_queue_redis, f"{ix}")
+            for ix in range(11):
+                enqueue_heavy(process_queue_redis, f"{ix}")
+            enqueue_heavy(process_queue_redis, "high", lane="high")
+        assert done.wait(10.0)
+        assert order[0] == ("heavy", "high")
+        assert order[-1] == ("light", "low")
+        normal = order[1:-1]
+        for name in ["heavy", "light"]:
+            assert [
+                payload for cur_name, payload in normal if cur_name == name
+            ] == [f"{ix}" for ix in range(11)]
+        # NOTE: the heavy queue gets two thirds of the tasks while both
+        # queues have tasks waiting
+        first = [name for name, _ in normal[:12]]
+        assert first.count("heavy") == 8
+        assert first.count("light") == 4
+    finally:
+        teardown_queue()
+
+
+def test_recover_stale(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that active tasks of workers without heartbeat get requeued."""
+    process_queue_redis = setup_queue(monkeypatch)
+    queue_key = get_queue_key("stale", "normal")
+    process_queue_redis.rpush(
+        queue_key, create_entry("stale", "queued", lane="normal"))
+    process_queue_redis.sadd(PROCESS_WORKERS_KEY, "dead", "alive")
+    process_queue_redis.set_value(
+        get_heartbeat_key("dead"), "now", expire_in=0.1)
+    process_queue_redis.set_value(
+        get_heartbeat_key("alive"), "now", expire_in=60.0)
+    process_queue_redis.rpush(
+        get_active_key("dead"),
+        create_entry("stale", "dead 0", lane="normal"),
+        create_entry("stale", "dead 1", lane="normal"),
+        create_entry("stale", "dead high", lane="high"))
+    process_queue_redis.rpush(
+        get_active_key("alive"),
+        create_entry("stale", "alive", lane="normal"))
+    assert recover_stale(process_queue_redis) == 0
+    time.sleep(0.2)
+    assert recover_stale(process_queue_redis) == 3
+    assert process_queue_redis.lrange(queue_key, 0, -1) == [
+        create_entry("stale", "dead 0", lane="normal"),
+        create_entry("stale", "dead 1", lane="normal"),
+        create_entry("stale", "queued", lane="normal"),
+    ]
+    assert process_queue_redis.lrange(
+        get_queue_key("stale", "high"), 0, -1) == [
+            create_entry("stale", "dead high", lane="high"),
+        ]
+    assert process_queue_redis.llen(get_active_key("dead")) == 0
+    assert process_queue_redis.llen(get_active_key("alive")) == 1
+    assert process_queue_redis.smembers(PROCESS_WORKERS_KEY) == {"alive"}
+    assert recover_stale(process_queue_redis) == 0
+
+
+def test_recover_legacy(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that tasks from the legacy keys get moved and processed."""
+    process_queue_redis = setup_queue(monkeypatch)
+    try:
+        order: list[tuple[str, str]] = []
+        done = threading.Event()
+        enqueue = register_recorder("legacy", order, 5, done, weight=1.0)
+        hnd_name = next(iter(queue.PROCESS_HND_LOOKUP))
+        process_queue_redis.rpush(
+            PROCESS_ACTIVE_KEY, create_entry(hnd_name, "active", lane=None))
+        process_queue_redis.rpush(
+            PROCESS_QUEUE_KEY,
+            create_entry(hnd_name, "queue 0", lane=None),
+            create_entry(hnd_name, "queue 1", lane=None))
+        queue_key = get_queue_key(hnd_name, "normal")
+        process_queue_redis.rpush(
+            queue_key, create_entry(hnd_name, "new", lane="normal"))
+        assert recover_stale(process_queue_redis) == 3
+        assert process_queue_redis.llen(PROCESS_ACTIVE_KEY) == 0
+        assert process_queue_redis.llen(PROCESS_QUEUE_KEY) == 0
+        assert process_queue_redis.lrange(queue_key, 0, -1) == [
+            create_entry(hnd_name, "active", lane=None),
+            create_entry(hnd_name, "new", lane="normal"),
+            create_entry(hnd_name, "queue 0", lane=None),
+            create_entry(hnd_name, "queue 1", lane=None),
+        ]
+        enqueue(process_queue_redis, "enqueued")
+        assert done.wait(10.0)
+        assert [payload for _, payload in order] == [
+            "active",
+            "new",
+            "queue 0",
+            "queue 1",
+            "enqueued",
+        ]
+    finally:
+        teardown_queue()
+
+
+def test_release_lease(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that a lease can only be released by its holder."""
+    process_queue_redis = setup_queue(monkeypatch)
+    lease_key = get_lease_key("exclusive")
+    release = get_release_script(process_queue_redis)
+    process_queue_redis.set_value(lease_key, "worker a")
+    release(keys={"lease": lease_key}, args={"worker": "worker b"})
+    assert process_queue_redis.get_value(lease_key) == "worker a"
+    release(keys={"lease": lease_key}, args={"worker": "worker a"})
+    assert process_queue_redis.get_value(lease_key) is None